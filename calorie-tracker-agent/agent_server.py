@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from contextlib import aclosing
+from typing import Optional
+from aiohttp import web
+from dotenv import load_dotenv
+from simple_agent import CalorieTrackerAgent
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+class AgentServer:
+    """HTTP front end that shares one warm CalorieTrackerAgent across requests.
+
+    The MCP connection and Ollama session are opened once at startup; each
+    request carries the caller's JWT so many users can be served concurrently.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        load_dotenv()
+
+        self.host = host or os.getenv('AGENT_HOST', '127.0.0.1')
+        self.port = port or int(os.getenv('AGENT_PORT', '3003'))
+        max_concurrency = max_concurrency or int(os.getenv('AGENT_MAX_CONCURRENCY', '32'))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.agent = CalorieTrackerAgent()
+        self.runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        """Create the aiohttp application with the agent routes."""
+        app = web.Application()
+        app.router.add_post('/query', self.handle_query)
+        app.router.add_post('/query/stream', self.handle_query_stream)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/metrics', self.handle_metrics)
+        return app
+
+    async def _parse_query(self, request: web.Request):
+        """Validate a ``{"query": str, "jwt": str, "session_id"?: str}`` body.
+
+        Returns ``(query, jwt_token, session_id, None)`` or
+        ``(None, None, None, error_response)``.
+        """
+        try:
+            body = await request.json()
+        except Exception:
+            return None, None, None, web.json_response({'error': 'Bad Request'}, status=400)
+
+        query = body.get('query')
+        jwt_token = body.get('jwt')
+        session_id = body.get('session_id')
+        if not query or not isinstance(query, str):
+            return None, None, None, web.json_response({'error': 'Bad Request'}, status=400)
+        if session_id is not None and not isinstance(session_id, str):
+            return None, None, None, web.json_response({'error': 'Bad Request'}, status=400)
+        if not jwt_token:
+            return None, None, None, web.json_response({'error': 'Unauthorized'}, status=401)
+        return query, jwt_token, session_id, None
+
+    async def handle_query(self, request: web.Request) -> web.Response:
+        """Answer a single chat query: ``{"query": str, "jwt": str, "session_id"?: str}``."""
+        query, jwt_token, session_id, error = await self._parse_query(request)
+        if error:
+            return error
+
+        async with self.semaphore:
+            response = await self.agent.process_query(query, jwt_token=jwt_token, session_id=session_id)
+        return web.json_response({'response': response})
+
+    async def handle_query_stream(self, request: web.Request) -> web.StreamResponse:
+        """Answer a chat query as chunked plain text, flushed as tokens arrive."""
+        query, jwt_token, session_id, error = await self._parse_query(request)
+        if error:
+            return error
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/plain; charset=utf-8'})
+        await response.prepare(request)
+
+        chunks = self.agent.process_query_stream(query, jwt_token=jwt_token, session_id=session_id)
+        try:
+            async with self.semaphore, aclosing(chunks):
+                async for chunk in chunks:
+                    await response.write(chunk.encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client went away; closing the stream above finished its trace
+            logger.info("Client disconnected before the streamed answer was complete")
+        return response
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Report whether the agent's MCP connection is up, plus cache, session and model routing state."""
+        return web.json_response({
+            'status': 'ok',
+            'mcp_connected': self.agent.mcp_client.connected,
+            'prefetch': self.agent.prefetch_stats,
+            'cache': self.agent.cache_stats(),
+            'conversations': self.agent.conversations.get_stats(),
+            'models': self.agent.models.get_stats(),
+            'ollama_backends': self.agent.ollama_client.get_backend_stats(),
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Export stage latencies and Ollama statistics in Prometheus text format."""
+        return web.Response(text=registry.render_prometheus(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self):
+        """Initialize the agent and start listening."""
+        await self.agent.initialize()
+        self.runner = web.AppRunner(self.build_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Agent server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop listening and release the agent's connections."""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        await self.agent.cleanup()
+        logger.info("Agent server stopped")
+
+async def serve(host: Optional[str] = None, port: Optional[int] = None):
+    """Run the agent server until cancelled."""
+    server = AgentServer(host, port)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Run a JSONL file of recorded queries through one shared CalorieTrackerAgent.
+
+Each input line is {"query": ..., "jwt": ...}; other fields (e.g. an id) are
+copied to the matching output line. Results are written as JSONL in
+completion order as each query finishes, and a throughput/failure summary
+goes to stderr.
+
+    python batch_runner.py queries.jsonl --output results.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Dict, Any, Iterable, List, Optional, TextIO
+from metrics import percentile
+from simple_agent import CalorieTrackerAgent, is_error_reply
+
+logger = logging.getLogger(__name__)
+
+async def run_batch(agent: CalorieTrackerAgent, lines: Iterable[str], out: TextIO,
+                    concurrency: int = 8) -> Dict[str, Any]:
+    """Process JSONL ``lines`` with at most ``concurrency`` queries in flight.
+
+    Input is read only as fast as slots free up, so memory stays bounded for
+    arbitrarily large files.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    latencies: List[float] = []
+    counts = {'total': 0, 'failed': 0, 'invalid': 0}
+
+    def write(record: Dict[str, Any]):
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+
+    async def run_one(line_number: int, record: Dict[str, Any]):
+        result = {key: value for key, value in record.items() if key != 'jwt'}
+        result['line'] = line_number
+        try:
+            start = time.perf_counter()
+            response = await agent.process_query(record['query'], jwt_token=record.get('jwt'))
+        except Exception as e:
+            # One broken query must not take the rest of the batch down
+            logger.error(f"Query on line {line_number} failed: {e}")
+            counts['failed'] += 1
+            write({**result, 'ok': False, 'error': f"Query failed: {e}"})
+            return
+        finally:
+            semaphore.release()
+
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        ok = not is_error_reply(response)
+        if not ok:
+            counts['failed'] += 1
+        write({**result, 'response': response, 'ok': ok, 'seconds': round(elapsed, 4)})
+
+    start = time.perf_counter()
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        counts['total'] += 1
+
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict) or not isinstance(record.get('query'), str):
+                raise ValueError('expected an object with a "query" string')
+        except ValueError as e:
+            counts['invalid'] += 1
+            write({'line': line_number, 'ok': False, 'error': f"Invalid record: {e}"})
+            continue
+
+        await semaphore.acquire()
+        task = asyncio.create_task(run_one(line_number, record))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'total': counts['total'],
+        'succeeded': counts['total'] - counts['failed'] - counts['invalid'],
+        'failed': counts['failed'],
+        'invalid': counts['invalid'],
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_qps': round(len(latencies) / elapsed, 3) if elapsed else 0,
+        'latency_p50': round(percentile(latencies, 50), 4),
+        'latency_p95': round(percentile(latencies, 95), 4),
+    }
+
+async def main_async(input_path: str, output_path: Optional[str], concurrency: int, jwt_token: Optional[str]):
+    agent = CalorieTrackerAgent(jwt_token=jwt_token)
+    out = open(output_path, 'w') if output_path else sys.stdout
+    try:
+        await agent.initialize()
+        with open(input_path) as lines:
+            summary = await run_batch(agent, lines, out, concurrency)
+    finally:
+        await agent.cleanup()
+        if output_path:
+            out.close()
+
+    print(f"Processed {summary['total']} queries in {summary['elapsed_seconds']}s "
+          f"({summary['throughput_qps']} q/s): {summary['succeeded']} ok, {summary['failed']} failed, "
+          f"{summary['invalid']} invalid; p50 {summary['latency_p50']}s, p95 {summary['latency_p95']}s",
+          file=sys.stderr)
+    return summary
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='JSONL file of {"query", "jwt"} records')
+    parser.add_argument('--output', help='results JSONL (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--jwt', help='token for records that have none')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    summary = asyncio.run(main_async(args.input, args.output, args.concurrency, args.jwt))
+    sys.exit(1 if summary['failed'] or summary['invalid'] else 0)
+
+if __name__ == "__main__":
+    main()
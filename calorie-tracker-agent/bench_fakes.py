@@ -0,0 +1,510 @@
+"""
+Local stand-ins for Ollama and the MCP server, used by benchmark.py.
+
+FakeOllamaServer speaks enough of the Ollama HTTP API for OllamaClient
+(version, tags, generate, chat; streaming or not) with configurable per-token
+latency and error injection. FakeMCPServer answers the MCP JSON-RPC tools
+over TCP from a seeded SQLite database with the app's schema; NodeMCPServer
+runs the real server on such a database instead, and tests/test_mcp_parity.py
+checks that the two answer alike.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import secrets
+import shutil
+import socket
+import sqlite3
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from aiohttp import web
+from daily_totals import rebuild as rebuild_daily_totals
+from mcp_client import token_user_id
+from schema import DATA_VERSIONS, INDEXES, TABLES
+
+logger = logging.getLogger(__name__)
+
+NODE_SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'calorie-tracker-mcp-server')
+
+def make_token(user_id: str, secret: Optional[str] = None) -> str:
+    """Build a JWT carrying ``userId``.
+
+    Unsigned unless ``secret`` is given (FakeMCPServer doesn't verify); with
+    it the token is signed HS256, as the real server's JWT_SECRET expects.
+    """
+    def encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+    header = {'alg': 'HS256' if secret else 'none', 'typ': 'JWT'}
+    signed = f"{encode(json.dumps(header).encode())}.{encode(json.dumps({'userId': user_id}).encode())}"
+    if not secret:
+        return f"{signed}.bench"
+    return f"{signed}.{encode(hmac.new(secret.encode(), signed.encode(), hashlib.sha256).digest())}"
+
+class FakeOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, token_latency: float = 0.01,
+                 prompt_latency: float = 0.05, answer_tokens: int = 40, error_rate: float = 0.0,
+                 seed: int = 0, failing_models: Sequence[str] = ()):
+        self.host = host
+        self.port = port
+        self.token_latency = token_latency
+        self.prompt_latency = prompt_latency
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        # Requests for these models always fail
+        self.failing_models = set(failing_models)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.in_flight = 0
+        # Bodies of the generate/chat requests, in arrival order
+        self.received: List[Dict[str, Any]] = []
+        self.runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/version', lambda request: web.json_response({'version': 'bench'}))
+        app.router.add_get('/api/tags', lambda request: web.json_response({'models': [{'name': 'bench'}]}))
+        app.router.add_post('/api/generate', self.handle_generate)
+        app.router.add_post('/api/chat', self.handle_chat)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        logger.info(f"Fake Ollama listening on {self.url}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def _answer_tokens(self, prompt: str) -> List[str]:
+        """A JSON intent for analysis prompts, filler text otherwise."""
+        if 'Respond with a JSON object' in prompt or '"intent"' in prompt:
+            today = datetime.now().strftime('%Y-%m-%d')
+            intent = json.dumps({"intent": "get_meals", "user_id": 1, "date": today,
+                                 "needs_tool": True, "response": "Fetching meals"})
+            return [intent[i:i + 4] for i in range(0, len(intent), 4)]
+        return [f"token{i} " for i in range(self.answer_tokens)]
+
+    def _stats(self, prompt: str, tokens: List[str], elapsed: float) -> Dict[str, Any]:
+        return {
+            'done': True,
+            'prompt_eval_count': len(prompt) // 4,
+            'eval_count': len(tokens),
+            'load_duration': 0,
+            'prompt_eval_duration': int(self.prompt_latency * 1e9),
+            'eval_duration': int(len(tokens) * self.token_latency * 1e9),
+            'total_duration': int(elapsed * 1e9),
+        }
+
+    async def _respond(self, request: web.Request, prompt: str, wrap) -> web.StreamResponse:
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            data = await request.json()
+            if data.get('model') in self.failing_models or (self.error_rate and self.random.random() < self.error_rate):
+                return web.json_response({'error': 'injected failure'}, status=500)
+
+            start = asyncio.get_running_loop().time()
+            tokens = self._answer_tokens(prompt)
+            num_predict = (data.get('options') or {}).get('num_predict')
+            if num_predict and num_predict > 0:
+                tokens = tokens[:num_predict]
+            await asyncio.sleep(self.prompt_latency)
+
+            if not data.get('stream', True):
+                await asyncio.sleep(self.token_latency * len(tokens))
+                elapsed = asyncio.get_running_loop().time() - start
+                return web.json_response({**wrap(''.join(tokens)), **self._stats(prompt, tokens, elapsed)})
+
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+            try:
+                for token in tokens:
+                    await asyncio.sleep(self.token_latency)
+                    await response.write((json.dumps({**wrap(token), 'done': False}) + '\n').encode())
+                elapsed = asyncio.get_running_loop().time() - start
+                await response.write((json.dumps({**wrap(''), **self._stats(prompt, tokens, elapsed)}) + '\n').encode())
+                await response.write_eof()
+            except ConnectionResetError:
+                # The client stopped reading: stop generating, as Ollama does
+                pass
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def handle_generate(self, request: web.Request) -> web.StreamResponse:
+        data = await request.json()
+        self.received.append(data)
+        if not data.get('prompt'):
+            # Load-only request, as sent by OllamaClient.warm_up
+            return web.json_response({'model': data.get('model'), 'response': '', 'done': True, 'done_reason': 'load'})
+        return await self._respond(request, data.get('prompt', ''), lambda text: {'response': text})
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        data = await request.json()
+        self.received.append(data)
+        prompt = '\n'.join(message.get('content', '') for message in data.get('messages', []))
+        return await self._respond(request, prompt, lambda text: {'message': {'role': 'assistant', 'content': text}})
+
+# The current time in ms, as the data_versions triggers compute it
+NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+MEAL_NAMES = ['Oatmeal', 'Chicken salad', 'Pasta', 'Greek yogurt', 'Rice bowl', 'Apple', 'Steak', 'Smoothie']
+
+def _meal_rows(rng: random.Random, users: int, meals_per_day: int, days: int, now: datetime):
+    for user in range(1, users + 1):
+        for day in range(days):
+            for slot in range(meals_per_day):
+                created = now - timedelta(days=day, hours=rng.randint(0, 3) + slot * 4)
+                yield (f"{user}-{day}-{slot}", str(user), rng.choice(MEAL_NAMES), rng.randint(80, 900),
+                       round(rng.uniform(0, 50), 1), round(rng.uniform(0, 100), 1), round(rng.uniform(0, 40), 1),
+                       created.strftime('%Y-%m-%dT%H:%M:%S.000Z'), None)
+
+def seed_database(path: str, users: int = 10, meals_per_day: int = 4, days: int = 30, seed: int = 0,
+                  indexes: bool = True):
+    """Create ``path`` with the app schema and deterministic random meals for users 1..N.
+
+    Rows are streamed into SQLite, so multi-million-row databases don't need
+    to fit in memory. The daily_totals rollup and the data versions are built
+    once the meals are in; with ``indexes=False`` the meal index is left out.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TABLE IF EXISTS daily_totals; DROP TABLE IF EXISTS data_versions; "
+                       "DROP TABLE IF EXISTS meals; DROP TABLE IF EXISTS users;" + TABLES)
+    conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?)",
+                     ((str(user), f"user{user}", "x") for user in range(1, users + 1)))
+    conn.executemany("INSERT INTO meals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     _meal_rows(rng, users, meals_per_day, days, datetime.utcnow()))
+    conn.commit()
+    rebuild_daily_totals(conn)
+    conn.executescript(DATA_VERSIONS)
+    with conn:
+        conn.execute(f"INSERT INTO data_versions (user_id, version) SELECT id, {NOW_MS} FROM users")
+    if indexes:
+        conn.executescript(INDEXES)
+    conn.close()
+    logger.info(f"Seeded {path}: {users} users, {users * days * meals_per_day} meals")
+
+def _start_of_day(day: str, zone: Optional[str]) -> str:
+    """The instant ``day`` starts in IANA ``zone`` (UTC if None), formatted like created_at."""
+    start = datetime.combine(date.fromisoformat(day), time(), ZoneInfo(zone) if zone else timezone.utc)
+    return start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def date_range_filter(arguments: Dict[str, Any]) -> Tuple[str, List[str], str]:
+    """``(sql, params, day)`` for the date_from/date_to/timezone tool arguments, as in the real server.
+
+    The dates become a half-open created_at range; ``day`` is the SQL
+    expression for a row's local calendar day. Raises ValueError for bad
+    dates or zones.
+    """
+    date_from, date_to, zone = arguments.get('date_from'), arguments.get('date_to'), arguments.get('timezone')
+    sql, params = '', []
+    if date_from:
+        sql += ' AND created_at >= ?'
+        params.append(_start_of_day(date_from, zone))
+    if date_to:
+        sql += ' AND created_at < ?'
+        params.append(_start_of_day((date.fromisoformat(date_to) + timedelta(days=1)).isoformat(), zone))
+
+    day = 'DATE(created_at)'
+    if zone:
+        at = datetime.strptime(params[-1], '%Y-%m-%dT%H:%M:%S.000Z').replace(tzinfo=timezone.utc) if date_to \
+            else datetime.now(timezone.utc)
+        offset = int(at.astimezone(ZoneInfo(zone)).utcoffset().total_seconds() // 60)
+        if offset:
+            day = f"DATE(created_at, '{offset} minutes')"
+    return sql, params, day
+
+def totals_source(arguments: Dict[str, Any], rollup: bool = True) -> Dict[str, Any]:
+    """Where the totals tools read for these arguments, as in the real server.
+
+    The daily_totals rollup (if ``rollup``) when the window is whole UTC
+    days, otherwise the meal rows. ``meals``/``days`` are the aggregates
+    counting meals and distinct days.
+    """
+    sql, params, day = date_range_filter(arguments)
+    if rollup and day == 'DATE(created_at)' and all(bound.endswith('T00:00:00.000Z') for bound in params):
+        return {'table': 'daily_totals', 'sql': sql.replace('created_at', 'day'), 'params': [bound[:10] for bound in params],
+                'day': 'day', 'meals': 'SUM(meals)', 'days': 'COUNT(*)'}
+    return {'table': 'meals', 'sql': sql, 'params': params, 'day': day,
+            'meals': 'COUNT(*)', 'days': f'COUNT(DISTINCT {day})'}
+
+# get_user_meals page sizes, as in the real server
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(meal: Dict[str, Any]) -> str:
+    """Keyset cursor after ``meal``: its ``[created_at, id]`` as unpadded base64url JSON, as in the real server."""
+    key = json.dumps([meal['created_at'], meal['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+def page_filter(arguments: Dict[str, Any]) -> Tuple[str, List[str], Optional[int]]:
+    """``(sql, params, limit)`` for the limit/cursor tool arguments; limit is None without either.
+
+    Raises ValueError for a bad limit or cursor.
+    """
+    limit, cursor = arguments.get('limit'), arguments.get('cursor')
+    if limit is None and not cursor:
+        return '', [], None
+
+    size = DEFAULT_PAGE_SIZE if limit is None else limit
+    if not isinstance(size, int) or isinstance(size, bool) or not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid limit: {json.dumps(limit)} (1-{MAX_PAGE_SIZE})")
+    if not cursor:
+        return '', [], size
+    try:
+        key = json.loads(base64.urlsafe_b64decode(str(cursor) + '=' * (-len(str(cursor)) % 4)))
+    except ValueError:
+        key = None
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+        raise ValueError("Invalid cursor")
+    return ' AND created_at <= ? AND (created_at < ? OR id < ?)', [key[0], key[0], key[1]], size
+
+# Result encodings a client can ask for in initialize, as in the real server
+RESULT_ENCODINGS = ('columnar',)
+
+def encode_rows(rows: List[Dict[str, Any]], encoding: Optional[str]) -> str:
+    """JSON text of a row tool's result: an array of objects, or one array per column for 'columnar'."""
+    if encoding != 'columnar':
+        return json.dumps(rows, separators=(',', ':'))
+    return json.dumps({name: [row[name] for row in rows] for name in (rows[0] if rows else {})}, separators=(',', ':'))
+
+TOOLS = ('get_user_meals', 'get_daily_totals', 'get_weekly_totals', 'get_user_details', 'get_meal_macros')
+# Tools whose results carry the user's data version and honour if_version
+VERSIONED_TOOLS = ('get_user_meals', 'get_daily_totals', 'get_weekly_totals', 'get_meal_macros')
+# Per-bucket sums for the rollup tools, as in the real server
+TOTALS_COLUMNS = ("SUM(calories) AS calories, ROUND(TOTAL(protein), 1) AS protein, "
+                  "ROUND(TOTAL(carbs), 1) AS carbs, ROUND(TOTAL(fats), 1) AS fats")
+
+class FakeMCPServer:
+    """JSON-RPC over TCP (one message or batch per line) backed by SQLite."""
+
+    def __init__(self, db_path: str, host: str = '127.0.0.1', port: int = 0):
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.schema_version: Optional[int] = None
+        self.has_rollup = self.has_versions = False
+        self.detect_tables()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit=16 * 1024 * 1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Fake MCP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.db.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Per-connection state negotiated in initialize
+        session: Dict[str, Any] = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    response = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+                else:
+                    if isinstance(message, list):
+                        response = [self.handle_message(item, session) for item in message]
+                    else:
+                        response = self.handle_message(message, session)
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def handle_message(self, message: Dict[str, Any], session: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        session = {} if session is None else session
+        self.requests += 1
+        request_id = message.get('id')
+        method = message.get('method')
+
+        def result(value):
+            return {"jsonrpc": "2.0", "id": request_id, "result": value}
+
+        def error(code, text):
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": text}}
+
+        if method == 'initialize':
+            offered = (((message.get('params') or {}).get('capabilities') or {}).get('experimental') or {}).get('resultEncodings')
+            session['encoding'] = next((name for name in offered or [] if name in RESULT_ENCODINGS), None)
+            capabilities = {"tools": {}}
+            if session['encoding']:
+                capabilities["experimental"] = {"resultEncoding": session['encoding']}
+            return result({"protocolVersion": "2024-11-05", "capabilities": capabilities,
+                           "serverInfo": {"name": "calorie-tracker-mcp-bench", "version": "1.0.0"}})
+        if method == 'tools/list':
+            return result({"tools": [{"name": name} for name in TOOLS]})
+        if method != 'tools/call':
+            return error(-32601, 'Method not found')
+
+        authorization = (message.get('headers') or {}).get('authorization', '')
+        user_id = token_user_id(authorization[7:]) if authorization.startswith('Bearer ') else None
+        if not user_id:
+            return error(-32001, 'Authentication required')
+
+        params = message.get('params') or {}
+        name, arguments = params.get('name'), params.get('arguments') or {}
+        try:
+            self.detect_tables()
+            # Read before the tool's query, as in the real server
+            version = self.data_version(user_id) if name in VERSIONED_TOOLS else None
+            if version is not None and arguments.get('if_version') == version:
+                return result({"content": [], "notModified": True, "version": version})
+            value = self.call_tool(name, arguments, user_id, session.get('encoding'))
+        except (ValueError, ZoneInfoNotFoundError) as e:
+            return error(-32602, f"Invalid params: {e}")
+        except KeyError as e:
+            return error(-32601, f"Unknown tool: {e.args[0]}")
+        except sqlite3.Error as e:
+            return error(-32603, f"Database error: {e}")
+        value = value if isinstance(value, dict) else {"content": [{"type": "text", "text": value}]}
+        if version is not None:
+            value["version"] = version
+        return result(value)
+
+    def detect_tables(self):
+        """Look for the optional tables again if the schema changed since the last look, as the real server does."""
+        schema_version = self.db.execute("PRAGMA schema_version").fetchone()[0]
+        if schema_version == self.schema_version:
+            return
+        self.schema_version = schema_version
+        tables = {row[0] for row in self.db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('daily_totals', 'data_versions')")}
+        self.has_rollup = 'daily_totals' in tables
+        self.has_versions = 'data_versions' in tables
+
+    def data_version(self, user_id: str) -> Optional[int]:
+        """The user's data version (0 before their first meal), or None without a data_versions table."""
+        if not self.has_versions:
+            return None
+        row = self.db.execute("SELECT version FROM data_versions WHERE user_id = ?", [user_id]).fetchone()
+        return row[0] if row else 0
+
+    def call_tool(self, name: str, arguments: Dict[str, Any], user_id: str, encoding: Optional[str] = None):
+        """A tool's result text, or the whole MCP result for a page of get_user_meals.
+
+        Row tools answer in ``encoding`` (see ``encode_rows``).
+        """
+        if name == 'get_user_meals':
+            date_filter, params, _ = date_range_filter(arguments)
+            page_sql, page_params, limit = page_filter(arguments)
+            sql = f"SELECT * FROM meals WHERE user_id = ?{date_filter}{page_sql} ORDER BY created_at DESC, id DESC"
+            params = [user_id] + params + page_params
+            if limit is None:
+                return encode_rows([dict(row) for row in self.db.execute(sql, params)], encoding)
+
+            # One row past the page tells whether there is a next one
+            meals = [dict(row) for row in self.db.execute(f"{sql} LIMIT ?", params + [limit + 1])]
+            value = {"content": [{"type": "text", "text": encode_rows(meals[:limit], encoding)}]}
+            if len(meals) > limit:
+                value["nextCursor"] = encode_cursor(meals[limit - 1])
+            return value
+        if name == 'get_user_details':
+            row = self.db.execute("SELECT id, username, created_at FROM users WHERE id = ?", [user_id]).fetchone()
+            return json.dumps(dict(row) if row else None)
+        if name not in ('get_daily_totals', 'get_weekly_totals', 'get_meal_macros'):
+            raise KeyError(name)
+
+        source = totals_source(arguments, self.has_rollup)
+        table, day, params = source['table'], source['day'], [user_id] + source['params']
+        where = f"WHERE user_id = ?{source['sql']}"
+        if name == 'get_daily_totals':
+            rows = self.db.execute(f"SELECT {day} AS day, {source['meals']} AS meals, {TOTALS_COLUMNS} FROM {table} "
+                                   f"{where} GROUP BY day ORDER BY day DESC", params)
+            return encode_rows([dict(row) for row in rows], encoding)
+        if name == 'get_weekly_totals':
+            rows = self.db.execute(f"SELECT DATE({day}, 'weekday 0', '-6 days') AS week_start, "
+                                   f"{source['days']} AS days, MIN({day}) AS first_day, MAX({day}) AS last_day, "
+                                   f"{source['meals']} AS meals, {TOTALS_COLUMNS} FROM {table} "
+                                   f"{where} GROUP BY week_start ORDER BY week_start DESC", params)
+            return encode_rows([dict(row) for row in rows], encoding)
+        row = self.db.execute("SELECT SUM(calories) as total_calories, SUM(protein) as total_protein, "
+                              f"SUM(carbs) as total_carbs, SUM(fats) as total_fats, {source['meals']} as meal_count "
+                              f"FROM {table} {where}", params).fetchone()
+        return json.dumps(dict(row))
+
+class NodeMCPServer:
+    """The real MCP server (calorie-tracker-mcp-server/src/index.js) run with node on ``db_path``.
+
+    It gets a random JWT_SECRET; ``token`` makes tokens it accepts. Needs node
+    and the server's installed node_modules.
+    """
+
+    def __init__(self, db_path: str, host: str = '127.0.0.1', port: int = 0, node: str = 'node'):
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self.node = node
+        self.secret = secrets.token_hex(16)
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    @staticmethod
+    def available(node: str = 'node') -> bool:
+        """Whether ``node`` runs and the server's dependencies are installed."""
+        return bool(shutil.which(node)) and os.path.isdir(os.path.join(NODE_SERVER_DIR, 'node_modules'))
+
+    def token(self, user_id: str) -> str:
+        return make_token(user_id, self.secret)
+
+    async def start(self, timeout: float = 10.0):
+        if not self.port:
+            with socket.socket() as probe:
+                probe.bind((self.host, 0))
+                self.port = probe.getsockname()[1]
+        env = dict(os.environ, MCP_DB_PATH=os.path.abspath(self.db_path), MCP_HOST=self.host,
+                   MCP_PORT=str(self.port), JWT_SECRET=self.secret)
+        self.process = await asyncio.create_subprocess_exec(
+            self.node, os.path.join('src', 'index.js'), cwd=NODE_SERVER_DIR, env=env,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+        # Ready once it accepts connections
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + timeout
+        while True:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"MCP server exited with status {self.process.returncode}")
+            try:
+                _, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                if loop.time() > give_up:
+                    await self.stop()
+                    raise RuntimeError(f"MCP server did not listen on {self.host}:{self.port} within {timeout}s")
+                await asyncio.sleep(0.05)
+                continue
+            writer.close()
+            break
+        logger.info(f"Node MCP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+        self.process = None
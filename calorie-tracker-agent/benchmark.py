@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Benchmark CalorieTrackerAgent at chosen concurrency levels.
+
+By default runs against local stand-ins (bench_fakes) so no Ollama or MCP
+server is needed; --ollama-url / --mcp-port point it at real ones instead,
+and --node-mcp runs the real MCP server on the seeded database.
+Writes a machine-readable JSON report with p50/p95/p99 latency, throughput
+and mean per-stage time for each concurrency level. The agent's caches are
+cleared before each level so every level starts cold (--keep-caches to
+measure a warm agent).
+
+    python benchmark.py --concurrency 1 8 32 --queries 200 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+from bench_fakes import FakeMCPServer, FakeOllamaServer, NodeMCPServer, make_token, seed_database
+from metrics import STAGE_SECONDS, percentile
+from response_cache import ResponseCache
+from simple_agent import CalorieTrackerAgent, is_error_reply
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "What did I eat today?",
+    "Show me my meals from yesterday",
+    "How many calories did I have in the last 7 days?",
+    "What did I have for lunch on monday?",
+    "Give me some tips for a healthier breakfast",
+    "How is my diet going lately?",
+]
+
+def agent_caches(agent: CalorieTrackerAgent) -> Dict[str, ResponseCache]:
+    caches = {'intent': agent.intent_cache, 'answer': agent.answer_cache}
+    if agent.mcp_client.result_cache is not None:
+        caches['mcp_result'] = agent.mcp_client.result_cache
+    return caches
+
+def clear_caches(agent: CalorieTrackerAgent):
+    """Empty the agent's caches, so a level doesn't measure hits left by the one before."""
+    for cache in agent_caches(agent).values():
+        cache.clear()
+
+def cache_hits(agent: CalorieTrackerAgent) -> Dict[str, int]:
+    return {name: cache.stats['hits'] for name, cache in agent_caches(agent).items()}
+
+def stage_snapshot() -> Dict[str, Dict[str, float]]:
+    return {dict(key).get('stage'): {'sum': series['sum'], 'count': series['count']}
+            for key, series in STAGE_SECONDS.series.items()}
+
+def stage_means(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]], queries: int) -> Dict[str, float]:
+    """Mean seconds per query spent in each stage between two snapshots."""
+    means = {}
+    for stage, totals in after.items():
+        spent = totals['sum'] - before.get(stage, {}).get('sum', 0.0)
+        if spent:
+            means[stage] = round(spent / queries, 6)
+    return means
+
+async def run_level(agent: CalorieTrackerAgent, queries: List[Dict[str, str]], concurrency: int) -> Dict[str, Any]:
+    """Run ``queries`` through ``agent`` with at most ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def run_one(item: Dict[str, str]):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            response = await agent.process_query(item['query'], jwt_token=item['jwt'])
+            latencies.append(time.perf_counter() - start)
+            if is_error_reply(response):
+                failures += 1
+
+    before = stage_snapshot()
+    hits_before = cache_hits(agent)
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(item) for item in queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'queries': len(queries),
+        'failures': failures,
+        'elapsed_seconds': round(elapsed, 4),
+        'throughput_qps': round(len(queries) / elapsed, 3) if elapsed else 0,
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 6),
+            'p95': round(percentile(latencies, 95), 6),
+            'p99': round(percentile(latencies, 99), 6),
+            'mean': round(sum(latencies) / len(latencies), 6) if latencies else 0,
+            'max': round(max(latencies), 6) if latencies else 0,
+        },
+        'stage_mean_seconds': stage_means(before, stage_snapshot(), len(queries)),
+        'cache_hits': {name: hits - hits_before.get(name, 0) for name, hits in cache_hits(agent).items()},
+    }
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    fakes = []
+    ollama_url = args.ollama_url
+    mcp_port = args.mcp_port
+    token = make_token
+
+    if not ollama_url:
+        ollama = FakeOllamaServer(token_latency=args.token_latency, prompt_latency=args.prompt_latency,
+                                  answer_tokens=args.answer_tokens, error_rate=args.error_rate, seed=args.seed)
+        await ollama.start()
+        fakes.append(ollama)
+        ollama_url = ollama.url
+
+    if not mcp_port:
+        db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='calorie-bench-'), 'bench.db')
+        if not args.db:
+            seed_database(db_path, users=args.users, meals_per_day=args.meals_per_day, days=args.days, seed=args.seed)
+        mcp = NodeMCPServer(db_path) if args.node_mcp else FakeMCPServer(db_path)
+        await mcp.start()
+        fakes.append(mcp)
+        mcp_port = mcp.port
+        if args.node_mcp:
+            token = mcp.token
+
+    rng = random.Random(args.seed)
+    queries = [
+        {'query': rng.choice(DEFAULT_QUERIES),
+         'jwt': args.jwt or token(str(rng.randint(1, args.users)))}
+        for _ in range(args.queries)
+    ]
+
+    agent = CalorieTrackerAgent(mcp_host=args.mcp_host, mcp_port=mcp_port)
+    agent.ollama_client.base_url = ollama_url
+    report: Dict[str, Any] = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('jwt', 'output')},
+        'levels': [],
+    }
+
+    try:
+        await agent.initialize()
+        if args.warmup:
+            await run_level(agent, queries[:args.warmup], 1)
+        for concurrency in args.concurrency:
+            if not args.keep_caches:
+                clear_caches(agent)
+            result = await run_level(agent, queries, concurrency)
+            report['levels'].append(result)
+            latency = result['latency_seconds']
+            print(f"c={concurrency:<4} qps={result['throughput_qps']:<9} p50={latency['p50']:.4f}s "
+                  f"p95={latency['p95']:.4f}s p99={latency['p99']:.4f}s failures={result['failures']}",
+                  file=sys.stderr)
+    finally:
+        await agent.cleanup()
+        for fake in fakes:
+            await fake.stop()
+
+    return report
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--queries', type=int, default=100, help='queries per concurrency level')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--keep-caches', action='store_true',
+                        help="don't clear the agent's caches between concurrency levels")
+    # Stand-in Ollama
+    parser.add_argument('--ollama-url', help='use a real Ollama instead of the stand-in')
+    parser.add_argument('--token-latency', type=float, default=0.01, help='stand-in seconds per generated token')
+    parser.add_argument('--prompt-latency', type=float, default=0.05, help='stand-in prompt processing seconds')
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stand-in calls that fail')
+    # MCP server
+    parser.add_argument('--mcp-host', default='127.0.0.1')
+    parser.add_argument('--mcp-port', type=int, help='use a real MCP server instead of the stand-in')
+    parser.add_argument('--node-mcp', action='store_true',
+                        help='run the real MCP server (node, calorie-tracker-mcp-server) on the seeded database')
+    parser.add_argument('--jwt', help='token for a real MCP server (stand-in tokens are generated)')
+    parser.add_argument('--db', help='existing SQLite database for the stand-in (or --node-mcp) MCP server')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--meals-per-day', type=int, default=4)
+    parser.add_argument('--days', type=int, default=30)
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(run_benchmark(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
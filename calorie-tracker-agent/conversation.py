@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# (previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) plus per-message overhead."""
+    return len(text) // 4 + 4
+
+class Conversation:
+    """One session's chat memory, kept within a fixed token budget.
+
+    The system prompt stays first and unchanged. Recent turns are sent
+    verbatim, newest first until the budget runs out. Once the verbatim
+    turns outgrow their share of the budget, the older ones are folded into
+    a running summary by a background task, so the next request doesn't wait.
+    """
+
+    def __init__(self, system_prompt: str, summarizer: Summarizer, token_budget: int = 1024, keep_turns: int = 4):
+        self.system_prompt = system_prompt
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        # Share of the budget reserved for the summary
+        self.summary_budget = token_budget // 4
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ''
+        self.last_used = time.monotonic()
+        self._compaction: Optional[asyncio.Task] = None
+
+    def _turn_tokens(self) -> int:
+        return sum(estimate_tokens(turn['content']) for turn in self.turns)
+
+    def messages(self, content: str) -> List[Dict[str, str]]:
+        """Chat messages for a new user message ``content``."""
+        self.last_used = time.monotonic()
+        messages = [{'role': 'system', 'content': self.system_prompt}]
+        budget = self.token_budget
+        if self.summary:
+            messages.append({'role': 'system', 'content': f"Summary of the earlier conversation: {self.summary}"})
+            budget -= estimate_tokens(self.summary)
+
+        window: List[Dict[str, str]] = []
+        for turn in reversed(self.turns):
+            budget -= estimate_tokens(turn['content'])
+            if budget < 0:
+                break
+            window.append(turn)
+        # Never start the window on an assistant reply
+        if window and window[-1]['role'] == 'assistant':
+            window.pop()
+
+        messages.extend(reversed(window))
+        messages.append({'role': 'user', 'content': content})
+        return messages
+
+    def add_turn(self, query: str, response: str):
+        self.turns.append({'role': 'user', 'content': query})
+        self.turns.append({'role': 'assistant', 'content': response})
+        self.last_used = time.monotonic()
+
+        if self._turn_tokens() > self.token_budget - self.summary_budget and len(self.turns) > self.keep_turns:
+            if self._compaction is None or self._compaction.done():
+                # Fresh context: the summary outlives the query, so it must not
+                # inherit that query's deadline or be timed into its trace
+                self._compaction = asyncio.create_task(self._compact(), context=contextvars.Context())
+
+    async def _compact(self):
+        """Fold all but the last ``keep_turns`` messages into the summary."""
+        count = len(self.turns) - self.keep_turns
+        if count <= 0:
+            return
+        old_turns = self.turns[:count]
+        try:
+            summary = await self.summarizer(self.summary, old_turns)
+        except Exception as e:
+            # The rolling window still bounds the prompt; try again next turn
+            logger.error(f"Conversation compaction failed: {e}")
+            return
+
+        # Turns added while summarizing are kept
+        self.summary = summary.strip()
+        del self.turns[:count]
+        logger.info(f"Compacted {count} messages into a {len(self.summary)} char summary")
+
+    def close(self):
+        if self._compaction is not None and not self._compaction.done():
+            self._compaction.cancel()
+
+class ConversationStore:
+    """Sessions by key, evicted least recently used first and after ``idle_ttl`` seconds."""
+
+    def __init__(self, system_prompt: str, summarizer: Summarizer, token_budget: int = 1024,
+                 max_sessions: int = 1000, idle_ttl: float = 1800.0):
+        self.system_prompt = system_prompt
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: 'OrderedDict[str, Conversation]' = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Conversation:
+        self._evict_idle()
+        conversation = self.sessions.get(key)
+        if conversation is None:
+            conversation = Conversation(self.system_prompt, self.summarizer, self.token_budget)
+            self.sessions[key] = conversation
+            while len(self.sessions) > self.max_sessions:
+                self._evict(next(iter(self.sessions)))
+        self.sessions.move_to_end(key)
+        return conversation
+
+    def _evict(self, key: str):
+        self.sessions.pop(key).close()
+        self.evictions += 1
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        # Ordered by last access, so stop at the first live session
+        while self.sessions:
+            key, conversation = next(iter(self.sessions.items()))
+            if conversation.last_used > cutoff:
+                break
+            self._evict(key)
+
+    def close(self):
+        for conversation in self.sessions.values():
+            conversation.close()
+        self.sessions.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'sessions': len(self.sessions), 'evictions': self.evictions}
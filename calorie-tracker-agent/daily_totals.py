@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Rebuild or verify the daily_totals rollup in the calorie tracker database.
+
+daily_totals holds one row per user and UTC day with the meal count and
+calorie/macro sums; triggers on meals (installed by src/lib/db.ts, and by
+``rebuild`` here) keep it current on every insert, delete and update.
+
+    python daily_totals.py verify [--db ../calorie_tracker.db]
+    python daily_totals.py rebuild [--db ../calorie_tracker.db]
+
+``verify`` recomputes the sums from the meal rows and exits non-zero if any
+day differs; ``rebuild`` installs the table and triggers if missing and
+recomputes every row in one transaction.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Any, List
+from schema import DAILY_TOTALS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'calorie_tracker.db')
+
+# daily_totals rows recomputed from scratch (TOTAL() is 0.0 over all-NULL
+# macros, like the triggers' COALESCE)
+RECOMPUTE = """
+SELECT user_id, DATE(created_at) AS day, COUNT(*) AS meals, SUM(calories) AS calories,
+       TOTAL(protein) AS protein, TOTAL(carbs) AS carbs, TOTAL(fats) AS fats
+FROM meals GROUP BY user_id, day
+"""
+
+# Incremental REAL sums drift by rounding error; anything larger is a mismatch
+TOLERANCE = 1e-6
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Install the rollup table and triggers if missing and recompute every row; returns the row count."""
+    conn.executescript(DAILY_TOTALS)
+    with conn:
+        conn.execute("DELETE FROM daily_totals")
+        conn.execute(f"INSERT INTO daily_totals (user_id, day, meals, calories, protein, carbs, fats) {RECOMPUTE}")
+    return conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0]
+
+def verify(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Days whose stored totals differ from the meal rows (missing on either side included)."""
+    columns = ('meals', 'calories', 'protein', 'carbs', 'fats')
+    expected = {(row[0], row[1]): row[2:] for row in conn.execute(RECOMPUTE)}
+    stored = {(row[0], row[1]): row[2:] for row in
+              conn.execute(f"SELECT user_id, day, {', '.join(columns)} FROM daily_totals")}
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key), stored.get(key)
+        if want is not None and have is not None and all(abs(a - b) <= TOLERANCE for a, b in zip(want, have)):
+            continue
+        mismatches.append({
+            'user_id': key[0], 'day': key[1],
+            'expected': dict(zip(columns, want)) if want else None,
+            'stored': dict(zip(columns, have)) if have else None,
+        })
+    return mismatches
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite database (default: the app database)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not os.path.exists(args.db):
+        parser.error(f"database not found: {args.db}")
+    conn = sqlite3.connect(args.db)
+    try:
+        start = time.perf_counter()
+        if args.command == 'rebuild':
+            rows = rebuild(conn)
+            logger.info(f"Rebuilt daily_totals: {rows} days in {time.perf_counter() - start:.2f}s")
+            return
+
+        has_table = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'").fetchone()
+        if not has_table:
+            logger.error("daily_totals table not found; run 'rebuild' to create it")
+            sys.exit(1)
+        mismatches = verify(conn)
+        for mismatch in mismatches[:20]:
+            logger.error(f"Mismatch for user {mismatch['user_id']} on {mismatch['day']}: "
+                         f"stored {mismatch['stored']}, expected {mismatch['expected']}")
+        logger.info(f"Verified daily_totals in {time.perf_counter() - start:.2f}s: {len(mismatches)} mismatched days")
+        if mismatches:
+            sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
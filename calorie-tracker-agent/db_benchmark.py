@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark the meal date-range queries on a large seeded SQLite database.
+
+Seeds a calorie_tracker.db-shaped database (2000 users x 365 days x 4 meals,
+~2.9M rows, by default), then runs the MCP server's lookups with the old
+``DATE(created_at) BETWEEN`` filter and the half-open ``created_at`` range,
+each without and with idx_meals_user_created; the totals queries also run
+against the daily_totals rollup. Prints every query plan and p50/p95/p99
+latency, and writes the same as a JSON report.
+
+    python db_benchmark.py --users 2000 --days 365 --output db-bench.json
+
+--db keeps the database at a given path; an existing file there is reused
+as is (its meal index is dropped for the "no_index" runs and recreated).
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
+from bench_fakes import TOTALS_COLUMNS, seed_database, totals_source
+from schema import INDEXES
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# name -> (days covered, SQL with {table}/{filter}/{day}/{meals}/{days}
+# placeholders, whether daily_totals can answer it), as issued by the MCP
+# server's tools
+QUERIES = {
+    'meals_day': (1, "SELECT * FROM meals WHERE user_id = ?{filter} ORDER BY created_at DESC", False),
+    'meals_week': (7, "SELECT * FROM meals WHERE user_id = ?{filter} ORDER BY created_at DESC", False),
+    'macros_month': (30, "SELECT SUM(calories) as total_calories, SUM(protein) as total_protein, "
+                         "SUM(carbs) as total_carbs, SUM(fats) as total_fats FROM {table} WHERE user_id = ?{filter}", True),
+    'daily_totals_quarter': (90, f"SELECT {{day}} AS day, {{meals}} AS meals, {TOTALS_COLUMNS} FROM {{table}} "
+                                 "WHERE user_id = ?{filter} GROUP BY day ORDER BY day DESC", True),
+    'weekly_totals_year': (365, "SELECT DATE({day}, 'weekday 0', '-6 days') AS week_start, {days} AS days, "
+                                f"{{meals}} AS meals, {TOTALS_COLUMNS} FROM {{table}} "
+                                "WHERE user_id = ?{filter} GROUP BY week_start ORDER BY week_start DESC", True),
+}
+
+def legacy_source(date_from: str, date_to: str) -> Dict[str, Any]:
+    """The filter the tools used before: a function of the column, so no range seek."""
+    return {'table': 'meals', 'sql': ' AND DATE(created_at) BETWEEN ? AND ?', 'params': [date_from, date_to],
+            'day': 'DATE(created_at)', 'meals': 'COUNT(*)', 'days': 'COUNT(DISTINCT DATE(created_at))'}
+
+def half_open_source(date_from: str, date_to: str) -> Dict[str, Any]:
+    return totals_source({'date_from': date_from, 'date_to': date_to}, rollup=False)
+
+def rollup_source(date_from: str, date_to: str) -> Dict[str, Any]:
+    return totals_source({'date_from': date_from, 'date_to': date_to})
+
+SOURCES = {'date_between': legacy_source, 'half_open': half_open_source, 'daily_totals': rollup_source}
+
+def samples(rng: random.Random, count: int, users: int, days: int, span: int) -> List[Tuple[str, str, str]]:
+    """``count`` random ``(user_id, date_from, date_to)`` ranges of ``span`` days within the seeded period."""
+    today = datetime.utcnow().date()
+    result = []
+    for _ in range(count):
+        end = today - timedelta(days=rng.randint(0, max(days - span, 0)))
+        result.append((str(rng.randint(1, users)), (end - timedelta(days=span - 1)).isoformat(), end.isoformat()))
+    return result
+
+def run_case(conn: sqlite3.Connection, template: str, make_source, ranges: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+    """Query plan and latency of one query shape with one source over ``ranges``."""
+    def statement(date_from: str, date_to: str) -> Tuple[str, List[str]]:
+        source = make_source(date_from, date_to)
+        return template.format(filter=source['sql'], **source), source['params']
+
+    sql, params = statement(*ranges[0][1:])
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", [ranges[0][0]] + params)]
+
+    conn.execute(sql, [ranges[0][0]] + params).fetchall()
+    latencies, rows = [], 0
+    for user_id, date_from, date_to in ranges:
+        sql, params = statement(date_from, date_to)
+        start = time.perf_counter()
+        rows += len(conn.execute(sql, [user_id] + params).fetchall())
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'plan': plan,
+        'mean_rows': round(rows / len(ranges), 1),
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 6),
+            'p95': round(percentile(latencies, 95), 6),
+            'p99': round(percentile(latencies, 99), 6),
+            'mean': round(sum(latencies) / len(latencies), 6),
+        },
+    }
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='calorie-db-bench-'), 'calorie_tracker.db')
+    if not os.path.exists(db_path):
+        start = time.perf_counter()
+        seed_database(db_path, users=args.users, meals_per_day=args.meals_per_day, days=args.days,
+                      seed=args.seed, indexes=False)
+        print(f"seeded {db_path} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    conn = sqlite3.connect(db_path)
+    meal_rows = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    report: Dict[str, Any] = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'meal_rows': meal_rows,
+        'cases': [],
+    }
+
+    rng = random.Random(args.seed)
+    ranges = {name: samples(rng, args.queries, users, args.days, span) for name, (span, _, _) in QUERIES.items()}
+
+    try:
+        for phase in ('no_index', 'index'):
+            if phase == 'no_index':
+                conn.execute("DROP INDEX IF EXISTS idx_meals_user_created")
+            else:
+                start = time.perf_counter()
+                conn.executescript(INDEXES)
+                print(f"built idx_meals_user_created in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            conn.execute("ANALYZE")
+
+            for name, (_, template, totals) in QUERIES.items():
+                for source_name, make_source in SOURCES.items():
+                    if source_name == 'daily_totals' and not totals:
+                        continue
+                    result = {'index': phase, 'query': name, 'source': source_name,
+                              **run_case(conn, template, make_source, ranges[name])}
+                    report['cases'].append(result)
+                    latency = result['latency_seconds']
+                    print(f"{phase:<9} {source_name:<13} {name:<21} p50={latency['p50']:.6f}s "
+                          f"p95={latency['p95']:.6f}s p99={latency['p99']:.6f}s rows={result['mean_rows']:<7} "
+                          f"plan: {' / '.join(result['plan'])}", file=sys.stderr)
+    finally:
+        # Leave a reused database with its index
+        conn.executescript(INDEXES)
+        conn.close()
+
+    return report
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='database path (seeded if missing, reused if present)')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--meals-per-day', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=30, help='samples per query, source and index setting')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    return parser.parse_args(argv)
+
+def main(argv: List[str] = None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.WARNING)
+    report = run_benchmark(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+class DeadlineExceeded(Exception):
+    """A call ran out of time: the query's deadline passed or a per-call timeout fired."""
+
+# Monotonic time by which the query being processed in the current task must
+# be answered; the MCP and Ollama clients bound their waits by it
+current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('current_deadline', default=None)
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Run the block with a deadline ``seconds`` from now (no deadline if None).
+
+    An enclosing deadline that is earlier still applies.
+    """
+    with deadline_at(None if seconds is None else time.monotonic() + seconds):
+        yield
+
+@contextmanager
+def deadline_at(expires: Optional[float]):
+    """Run the block with the deadline ``expires``, a ``time.monotonic()`` value (none if None).
+
+    Lets an async generator enter its deadline around each step instead of
+    holding it across a ``yield``.
+    """
+    if expires is None:
+        yield
+        return
+
+    outer = current_deadline.get()
+    token = current_deadline.set(expires if outer is None else min(expires, outer))
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+def remaining() -> float:
+    """Seconds left before the current deadline (``math.inf`` if there is none)."""
+    expires = current_deadline.get()
+    if expires is None:
+        return math.inf
+    return max(expires - time.monotonic(), 0.0)
@@ -0,0 +1,216 @@
+import json
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+# JSON schema for the LLM analysis, passed as Ollama's ``format`` so decoding
+# is constrained to a single object of this shape
+INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": ["get_meals", "other"]},
+        "user_id": {"type": ["integer", "null"]},
+        "date": {"type": ["string", "null"]},
+        "date_from": {"type": ["string", "null"]},
+        "date_to": {"type": ["string", "null"]},
+        "needs_tool": {"type": "boolean"},
+        "response": {"type": "string"},
+    },
+    "required": ["intent", "user_id", "date", "needs_tool", "response"],
+}
+
+MEAL_WORDS = re.compile(
+    r"\b(meals?|ate|eat|eaten|eating|food|foods|calories|kcal|breakfast|lunch|dinner|snacks?|"
+    r"logged|macros?|protein|carbs?|fats?|intake)\b"
+)
+# Signals the question looks up the user's log ("what did I eat", "show my
+# meals") rather than asking for nutrition advice ("should I eat", "is protein
+# good for me"). Generic verbs such as "tell", "give" or "get" only count
+# with a log object ("tell me my calories"), via the second alternative.
+LOOKUP_WORDS = re.compile(
+    r"\b(show|list|display|summari[sz]e|summary|breakdown|totals?|"
+    r"(?:did|have)\s+(?:i|user\s+\d+)|i've|i\s+(?:had|ate|logged)|ate|eaten|had|logged|tracked)\b|"
+    r"\b(?:my|user\s+\d+'s)\s+(?:\w+\s+)?(?:meals?|calories|kcal|macros?|intake|food|protein|carbs|fats|"
+    r"breakfast|lunch|dinner|snacks?|log)\b"
+)
+USER_ID = re.compile(r"\buser\s+(\d+)\b")
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+MONTH_PATTERN = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|" \
+                r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+                'eight': 8, 'nine': 9, 'ten': 10, 'fourteen': 14, 'thirty': 30}
+
+def _month_number(name: str) -> int:
+    return next(i for i, month in enumerate(MONTHS, 1) if month.startswith(name[:3]))
+
+def _explicit_date(text: str, today: date) -> Optional[date]:
+    """Parse ISO (2024-01-31) or month-name ("Jan 31", "31 January 2024") dates."""
+    match = re.search(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b", text)
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        return date(year, month, day)
+
+    match = re.search(MONTH_PATTERN + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b", text)
+    if match:
+        month, day, year = match.groups()
+    else:
+        match = re.search(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + MONTH_PATTERN + r"(?:,?\s+(\d{4}))?\b", text)
+        if not match:
+            return None
+        day, month, year = match.groups()
+
+    parsed = date(int(year) if year else today.year, _month_number(month), int(day))
+    # A bare "Dec 30" asked in January means last year's
+    if not year and parsed > today:
+        parsed = parsed.replace(year=parsed.year - 1)
+    return parsed
+
+def resolve_dates(text: str, today: Optional[date] = None) -> Optional[Tuple[date, date]]:
+    """Resolve a relative or explicit date expression to an inclusive ``(start, end)`` range.
+
+    Returns None when the text contains no date expression.
+    """
+    today = today or datetime.now().date()
+    text = text.lower()
+
+    match = re.search(r"\b(?:last|past|previous)\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\s+days?\b", text)
+    if match:
+        count = match.group(1)
+        days = int(count) if count.isdigit() else NUMBER_WORDS[count]
+        return today - timedelta(days=max(days, 1) - 1), today
+
+    if re.search(r"\b(?:last|past)\s+week\b", text):
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6)
+    if re.search(r"\bthis\s+week\b", text):
+        return today - timedelta(days=today.weekday()), today
+
+    if re.search(r"\bday\s+before\s+yesterday\b", text):
+        day = today - timedelta(days=2)
+        return day, day
+    if re.search(r"\byesterday\b", text):
+        day = today - timedelta(days=1)
+        return day, day
+    if re.search(r"\b(?:today|today's|tonight|this\s+(?:morning|afternoon|evening))\b", text):
+        return today, today
+
+    try:
+        explicit = _explicit_date(text, today)
+    except ValueError:
+        explicit = None
+    if explicit:
+        return explicit, explicit
+
+    for index, name in enumerate(WEEKDAYS):
+        if re.search(r"\b" + name + r"\b", text):
+            # Most recent such day; "last monday" on a Monday means a week ago
+            back = (today.weekday() - index) % 7
+            if back == 0 and re.search(r"\blast\s+" + name, text):
+                back = 7
+            day = today - timedelta(days=back)
+            return day, day
+
+    return None
+
+def parse_intent(query: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """Classify common meal questions without the LLM.
+
+    Returns the same structure the LLM analysis prompt asks for, plus
+    ``date_from``/``date_to`` for ranges, only for a log lookup with a date
+    the rules resolved. Anything else returns None and is left to the LLM.
+    """
+    text = query.lower()
+    if not MEAL_WORDS.search(text) or not LOOKUP_WORDS.search(text):
+        # e.g. "how many calories should I eat" - a nutrition question, not a log lookup
+        return None
+
+    # A period the rules can't resolve ("in March", "3 weeks ago") is left
+    # to the LLM rather than answered for today
+    date_range = resolve_dates(text, today)
+    if not date_range:
+        return None
+
+    user_match = USER_ID.search(text)
+    analysis: Dict[str, Any] = {
+        "intent": "get_meals",
+        "user_id": int(user_match.group(1)) if user_match else 1,
+        "date": None,
+        "date_from": None,
+        "date_to": None,
+        "needs_tool": True,
+        "response": "Fetching your meals",
+    }
+
+    start, end = date_range
+    if start == end:
+        analysis["date"] = start.isoformat()
+    else:
+        analysis["date_from"] = start.isoformat()
+        analysis["date_to"] = end.isoformat()
+    return analysis
+
+def _object_span(text: str) -> Optional[str]:
+    """The first ``{...}`` object in ``text``, closed off if the output was cut short."""
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    depth, in_string, escaped = 0, False, False
+    for i, char in enumerate(text[start:], start):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    # Truncated (e.g. by num_predict): close the open string, drop a dangling
+    # key or comma, then close every open bracket
+    fragment = text[start:] + ('"' if in_string else '')
+    fragment = re.sub(r'(,\s*"[^"]*"\s*:?|,|:)\s*$', '', fragment.rstrip())
+    closers = []
+    for char in re.sub(r'"(?:\\.|[^"\\])*"', '', fragment):
+        if char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]' and closers:
+            closers.pop()
+    return fragment + ''.join(reversed(closers))
+
+def _repair(candidate: str) -> str:
+    """Fix the usual near-JSON slips: Python literals, single quotes, bare keys, trailing commas."""
+    repaired = re.sub(r'\bTrue\b', 'true', candidate)
+    repaired = re.sub(r'\bFalse\b', 'false', repaired)
+    repaired = re.sub(r'\bNone\b', 'null', repaired)
+    if '"' not in repaired:
+        repaired = repaired.replace("'", '"')
+    repaired = re.sub(r'([{,]\s*)([A-Za-z_]\w*)\s*:', r'\1"\2":', repaired)
+    return re.sub(r',\s*([}\]])', r'\1', repaired)
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """Pull a JSON object out of LLM output, tolerating code fences, chatter,
+    truncation and common syntax slips. Returns None if nothing usable is found.
+    """
+    candidate = _object_span(text)
+    if candidate is None:
+        return None
+
+    for attempt in (candidate, _repair(candidate)):
+        try:
+            value = json.loads(attempt)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
@@ -1,8 +1,15 @@
+import base64
 import json
 import asyncio
 import logging
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from contextlib import aclosing
+from deadline import DeadlineExceeded, remaining
+from meal_table import MealTable, decode_table
+from metrics import registry
+from response_cache import ResponseCache, cache_key, digest
 
 # Configure logging
 log_file = os.path.join(os.path.dirname(__file__), '..', 'logs', 'mcp-client.log')
@@ -20,8 +27,66 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Tool results are sent as a single JSON line and can be far larger than
+# asyncio's 64 KiB default line limit
+STREAM_LIMIT = 16 * 1024 * 1024
+
+# Rows per page for iter_tool
+DEFAULT_PAGE_SIZE = 200
+
+# Result encodings this client can decode, offered in initialize
+RESULT_ENCODINGS = ("columnar",)
+
+def token_user_id(token: Optional[str]) -> Optional[str]:
+    """The ``userId`` claim of a JWT, read without verifying it (the MCP server does that)."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return str(json.loads(base64.urlsafe_b64decode(payload))['userId'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+CONDITIONAL_CALLS = registry.counter('mcp_conditional_calls_total',
+                                     'Tool calls sent with if_version, by whether the held result was still current')
+
+def result_cache_from_env() -> Optional[ResponseCache]:
+    """The tool result cache sized by MCP_RESULT_CACHE_SIZE (None when 0) with MCP_RESULT_CACHE_TTL."""
+    size = int(os.getenv('MCP_RESULT_CACHE_SIZE', '256'))
+    if size <= 0:
+        return None
+    return ResponseCache('mcp_result', size, float(os.getenv('MCP_RESULT_CACHE_TTL', '600')))
+
+async def iter_pages(call_page: Callable[..., Awaitable[Tuple[MealTable, Optional[str]]]], tool_name: str,
+                     arguments: Dict[str, Any], jwt_token: Optional[str] = None,
+                     page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[MealTable]:
+    """Yield the pages of a cursor-paginated tool, requesting each only once the previous one is used up.
+
+    ``call_page`` is a ``call_tool_page`` method. A server that doesn't
+    paginate answers the first request in full, without a cursor.
+    """
+    cursor = None
+    while True:
+        page_arguments = {**arguments, "limit": page_size}
+        if cursor:
+            page_arguments["cursor"] = cursor
+        page, cursor = await call_page(tool_name, page_arguments, jwt_token=jwt_token)
+        yield page
+        if not cursor:
+            return
+
+async def iter_rows(pages: AsyncIterator[MealTable]) -> AsyncIterator[Dict[str, Any]]:
+    """The rows of ``iter_pages`` pages, one dict at a time."""
+    async with aclosing(pages):
+        async for page in pages:
+            for row in page.rows():
+                yield row
+
+class MCPConnectionError(Exception):
+    """The connection to the MCP server failed or was dropped."""
+
 class MCPClient:
-    def __init__(self, host: str = '127.0.0.1', port: int = 3001, jwt_token: Optional[str] = None):
+    def __init__(self, host: str = '127.0.0.1', port: int = 3001, jwt_token: Optional[str] = None,
+                 result_cache: Optional[ResponseCache] = None):
         self.host = host
         self.port = port
         self.jwt_token = jwt_token
@@ -29,29 +94,87 @@ class MCPClient:
         self.writer: Optional[asyncio.StreamWriter] = None
         self.request_id = 0
         self.connected = False
+        # In-flight requests keyed by JSON-RPC id; the reader task resolves
+        # them as responses arrive, in whatever order the server answers
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader_task: Optional[asyncio.Task] = None
+        # Concurrent calls that find the connection down reconnect once
+        self._connect_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        # Longest wait for a response; the current query's deadline may cut it shorter
+        self.call_timeout = float(os.getenv('MCP_CALL_TIMEOUT', '30'))
+        # Row tool results are requested columnar (each column name sent
+        # once) unless MCP_RESULT_ENCODING=json; result_encoding is what the
+        # server agreed to in initialize, None for plain arrays of objects
+        self.requested_encoding = os.getenv('MCP_RESULT_ENCODING', 'columnar')
+        self.result_encoding: Optional[str] = None
+        # Set by initialize(); the server forgets the encoding with the
+        # connection, so every reconnect after it repeats the handshake
+        self.initialized = False
+        # Last versioned result per (token, encoding, tool, arguments). Calls it covers
+        # are sent with if_version, and a notModified reply is answered from
+        # here without the server re-running the query or re-sending rows.
+        self.result_cache = result_cache if result_cache is not None else result_cache_from_env()
 
     async def connect(self):
-        """Connect to the MCP server via TCP."""
-        if self.connected:
-            return
+        """Connect to the MCP server via TCP.
 
-        logger.info(f"Connecting to MCP server at {self.host}:{self.port}")
-        try:
-            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
-            self.connected = True
-            logger.info(f"Connected to MCP server at {self.host}:{self.port}")
-        except Exception as e:
-            logger.error(f"Failed to connect to MCP server: {e}")
-            raise
+        Once the client has been initialized, a reconnect runs the
+        ``initialize`` handshake again before any other request is sent.
+        """
+        async with self._connect_lock:
+            if self.connected:
+                return
+            await self._drop_connection()
+
+            logger.info(f"Connecting to MCP server at {self.host}:{self.port}")
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+                self._reader_task = asyncio.create_task(self._read_responses(self.reader))
+                if self.initialized:
+                    await self._handshake()
+                self.connected = True
+                logger.info(f"Connected to MCP server at {self.host}:{self.port}")
+            except Exception as e:
+                logger.error(f"Failed to connect to MCP server: {e}")
+                raise
+
+    async def _drop_connection(self):
+        """Stop the reader and close the socket of a connection that went down.
+
+        Requests still waiting on it can't be answered on a new connection,
+        so they fail now rather than at their timeout.
+        """
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self.reader = None
+        self._fail_pending(MCPConnectionError("MCP connection was replaced"))
 
     async def disconnect(self):
         """Disconnect from the MCP server."""
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
         if self.writer:
             logger.info("Disconnecting from MCP server")
             self.writer.close()
             await self.writer.wait_closed()
+            self.writer = None
             self.connected = False
             logger.info("Disconnected from MCP server")
+        self._fail_pending(MCPConnectionError("MCP client disconnected"))
 
     async def start_server(self):
         """Connect to MCP server (for compatibility with existing code)."""
@@ -61,17 +184,113 @@ class MCPClient:
         """Disconnect from MCP server (for compatibility with existing code)."""
         await self.disconnect()
 
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
-        """Call a tool on the MCP server."""
-        if not self.connected:
-            await self.connect()
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        """Dispatch each response line read from ``reader`` to the future waiting on its id."""
+        try:
+            while True:
+                response_line = await reader.readline()
+                if not response_line:
+                    break
+
+                try:
+                    response = json.loads(response_line.decode().strip())
+                except json.JSONDecodeError as e:
+                    logger.error(f"Invalid response from MCP server: {e}")
+                    continue
+
+                # A batch request is answered with an array of responses
+                for item in response if isinstance(response, list) else [response]:
+                    self._dispatch(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"MCP reader failed: {e}")
 
+        # EOF or read failure: nothing in flight will ever be answered
+        if reader is self.reader:
+            self.connected = False
+            self._fail_pending(MCPConnectionError("No response from MCP server"))
+
+    def _dispatch(self, response: Dict[str, Any]):
+        """Resolve the future waiting on ``response``'s id."""
+        future = self._pending.pop(response.get("id"), None)
+        if future is None:
+            logger.warning(f"Dropping MCP response with unknown id: {response.get('id')}")
+        elif not future.done():
+            future.set_result(response)
+
+    def _fail_pending(self, error: Exception):
+        """Fail every in-flight request with ``error``."""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests awaiting a response on this connection."""
+        return len(self._pending)
+
+    def _next_id(self) -> int:
         request_id = self.request_id
         self.request_id += 1
+        return request_id
+
+    async def _request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one JSON-RPC request and wait for the response with its id."""
+        responses = await self._send([request], request)
+        return responses[0]
+
+    async def _request_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send several requests as one JSON-RPC batch frame.
+
+        Responses are returned in request order, whatever order the server
+        answered in.
+        """
+        return await self._send(requests, requests)
+
+    async def _send(self, requests: List[Dict[str, Any]], payload: Any) -> List[Dict[str, Any]]:
+        """Write ``payload`` as one line and wait for a response to each request.
 
+        Raises ``DeadlineExceeded`` if the responses don't arrive within
+        ``call_timeout`` or the current query's deadline.
+        """
+        if not self.connected:
+            await self.connect()
+        return await self._exchange(requests, payload)
+
+    async def _exchange(self, requests: List[Dict[str, Any]], payload: Any) -> List[Dict[str, Any]]:
+        """``_send`` on the current connection, without connecting first (as ``connect`` needs)."""
+        timeout = min(remaining(), self.call_timeout)
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for request in requests:
+            future = loop.create_future()
+            self._pending[request["id"]] = future
+            futures.append(future)
+        self.last_used = time.monotonic()
+
+        try:
+            request_json = json.dumps(payload) + "\n"
+            self.writer.write(request_json.encode())
+            await self.writer.drain()
+            return list(await asyncio.wait_for(asyncio.gather(*futures), timeout))
+        except asyncio.TimeoutError:
+            # Late responses are dropped by the reader as unknown ids
+            raise DeadlineExceeded(f"No MCP response within {timeout:.1f}s")
+        except (ConnectionError, OSError) as e:
+            self.connected = False
+            raise MCPConnectionError(f"Lost connection to MCP server: {e}")
+        finally:
+            for request in requests:
+                self._pending.pop(request["id"], None)
+            self.last_used = time.monotonic()
+
+    def _tool_request(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str]) -> Dict[str, Any]:
         request = {
             "jsonrpc": "2.0",
-            "id": request_id,
+            "id": self._next_id(),
             "method": "tools/call",
             "params": {
                 "name": tool_name,
@@ -80,55 +299,159 @@ class MCPClient:
         }
 
         # Add JWT authentication header if token is provided
-        if self.jwt_token:
+        token = jwt_token or self.jwt_token
+        if token:
             request["headers"] = {
-                "authorization": f"Bearer {self.jwt_token}"
+                "authorization": f"Bearer {token}"
             }
+        return request
 
-        # Send request
-        request_json = json.dumps(request) + "\n"
-        self.writer.write(request_json.encode())
-        await self.writer.drain()
-
-        # Read response
-        response_line = await self.reader.readline()
-        if not response_line:
-            raise Exception("No response from MCP server")
-
-        response = json.loads(response_line.decode().strip())
-
+    def _tool_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         if "error" in response:
             error_msg = f"MCP Error: {response['error']['message']}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
-        result = response["result"]["content"][0]["text"]
+        return response["result"]
+
+    def _conditional_request(self, tool_name: str, arguments: Dict[str, Any],
+                             jwt_token: Optional[str]) -> Tuple[Dict[str, Any], Optional[str], Optional[Dict[str, Any]]]:
+        """The request for a tool call, its result cache key and the cached result it sends ``if_version`` for."""
+        if self.result_cache is None:
+            return self._tool_request(tool_name, arguments, jwt_token), None, None
+        key = cache_key(digest(jwt_token or self.jwt_token or ''), self.result_encoding, tool_name, arguments)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            arguments = {**arguments, "if_version": cached["version"]}
+        return self._tool_request(tool_name, arguments, jwt_token), key, cached
+
+    def _versioned_result(self, response: Dict[str, Any], key: Optional[str],
+                          cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """The tool result of ``response``: ``cached`` if the server says it's still current, else the new one."""
+        result = self._tool_response(response)
+        if cached is not None:
+            if result.get("notModified"):
+                CONDITIONAL_CALLS.inc(labels={'result': 'not_modified'})
+                return cached
+            CONDITIONAL_CALLS.inc(labels={'result': 'modified'})
+        if key is not None and result.get("version") is not None:
+            self.result_cache.set(key, result)
         return result
 
+    async def _call_tool_result(self, tool_name: str, arguments: Dict[str, Any],
+                                jwt_token: Optional[str]) -> Dict[str, Any]:
+        request, key, cached = self._conditional_request(tool_name, arguments, jwt_token)
+        return self._versioned_result(await self._request(request), key, cached)
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None) -> str:
+        """Call a tool on the MCP server.
+
+        ``jwt_token`` overrides the client's token for this call, which lets a
+        single long-lived connection serve requests for many users. Calls may
+        be issued concurrently; responses are matched by request id.
+        Results of the meal tools come from the result cache when the user's
+        data hasn't changed since they were fetched.
+        """
+        return (await self._call_tool_result(tool_name, arguments, jwt_token))["content"][0]["text"]
+
+    async def call_tool_table(self, tool_name: str, arguments: Dict[str, Any],
+                              jwt_token: Optional[str] = None) -> MealTable:
+        """Call a tool that returns rows and decode them into a ``MealTable``."""
+        return decode_table(await self.call_tool(tool_name, arguments, jwt_token=jwt_token))
+
+    async def call_tool_page(self, tool_name: str, arguments: Dict[str, Any],
+                             jwt_token: Optional[str] = None) -> Tuple[MealTable, Optional[str]]:
+        """Call a paginated tool; returns the page's rows and the cursor of the next page (None on the last)."""
+        result = await self._call_tool_result(tool_name, arguments, jwt_token)
+        return decode_table(result["content"][0]["text"]), result.get("nextCursor")
+
+    def iter_tool_pages(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None,
+                        page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[MealTable]:
+        """Iterate over a paginated tool's pages, ``page_size`` rows per request.
+
+        Pages are fetched on demand, so memory stays bounded by one page and
+        a consumer that stops early never requests the rest. Close the
+        iterator (``contextlib.aclosing``) when breaking out of it.
+        """
+        return iter_pages(self.call_tool_page, tool_name, arguments, jwt_token, page_size)
+
+    def iter_tool(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None,
+                  page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """Like ``iter_tool_pages``, but yield the rows one by one."""
+        return iter_rows(self.iter_tool_pages(tool_name, arguments, jwt_token, page_size))
+
+    async def call_tools(self, calls: List[Tuple[str, Dict[str, Any]]], jwt_token: Optional[str] = None,
+                         return_exceptions: bool = False) -> List[Any]:
+        """Call several tools in a single JSON-RPC batch round trip.
+
+        ``calls`` is a list of ``(tool_name, arguments)`` pairs; results come
+        back in the same order. As with ``asyncio.gather``, a failed call
+        raises unless ``return_exceptions`` is set, in which case its
+        exception is returned in place of the result.
+        """
+        if not calls:
+            return []
+
+        prepared = [self._conditional_request(name, arguments, jwt_token) for name, arguments in calls]
+        responses = await self._request_batch([request for request, _, _ in prepared])
+
+        results = []
+        for response, (_, key, cached) in zip(responses, prepared):
+            try:
+                results.append(self._versioned_result(response, key, cached)["content"][0]["text"])
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    async def ping(self) -> bool:
+        """Cheap liveness probe: a ``tools/list`` round trip."""
+        request = {
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": "tools/list",
+            "params": {}
+        }
+
+        # A probe isn't real use; keep it from resetting the idle clock
+        last_used = self.last_used
+        try:
+            response = await self._request(request)
+        except MCPConnectionError:
+            return False
+        finally:
+            self.last_used = last_used
+        return "error" not in response
+
     async def initialize(self):
-        """Initialize the MCP server."""
+        """Initialize the MCP server, negotiating the result encoding."""
         if not self.connected:
             await self.connect()
+        result = await self._handshake()
+        self.initialized = True
+        return result
 
+    async def _handshake(self) -> Dict[str, Any]:
+        """Send ``initialize`` on the current connection and record the agreed result encoding."""
+        params = {}
+        if self.requested_encoding in RESULT_ENCODINGS:
+            params["capabilities"] = {"experimental": {"resultEncodings": [self.requested_encoding]}}
         request = {
             "jsonrpc": "2.0",
-            "id": self.request_id,
+            "id": self._next_id(),
             "method": "initialize",
-            "params": {}
+            "params": params
         }
-        self.request_id += 1
-
-        request_json = json.dumps(request) + "\n"
-        self.writer.write(request_json.encode())
-        await self.writer.drain()
 
-        response_line = await self.reader.readline()
-        response = json.loads(response_line.decode().strip())
+        response = (await self._exchange([request], request))[0]
 
         if "error" in response:
             error_msg = f"MCP Initialization Error: {response['error']['message']}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
-        logger.info("MCP server initialized")
-        return response["result"]
\ No newline at end of file
+        capabilities = response["result"].get("capabilities") or {}
+        self.result_encoding = (capabilities.get("experimental") or {}).get("resultEncoding")
+        logger.info(f"MCP server initialized (result encoding: {self.result_encoding or 'json'})")
+        return response["result"]
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from mcp_client import DEFAULT_PAGE_SIZE, MCPClient, MCPConnectionError, iter_pages, iter_rows, result_cache_from_env
+from meal_table import MealTable, decode_table
+
+logger = logging.getLogger(__name__)
+
+# Read-only tools that are safe to replay on a fresh connection
+IDEMPOTENT_TOOLS = {"get_user_meals", "get_daily_totals", "get_weekly_totals", "get_user_details", "get_meal_macros"}
+
+class MCPClientPool:
+    """Pool of multiplexed MCP connections with health checks and reconnect.
+
+    Exposes the same ``initialize``/``call_tool``/``iter_tool`` interface as ``MCPClient``.
+    Calls go to the least busy connection, new sockets are opened up to
+    ``max_size`` while every existing one has work in flight, and idle sockets
+    above ``min_size`` are closed after ``idle_timeout`` seconds. Settings not
+    passed in come from the MCP_POOL_* environment variables.
+
+    ``_lock`` only guards the bookkeeping; connecting, probing and closing
+    sockets happen outside it so a slow server never stalls ``_acquire``.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 3001, jwt_token: Optional[str] = None,
+                 min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 idle_timeout: Optional[float] = None, health_interval: Optional[float] = None,
+                 max_retries: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.jwt_token = jwt_token
+        self.min_size = min_size if min_size is not None else int(os.getenv('MCP_POOL_MIN_SIZE', '1'))
+        self.max_size = max_size if max_size is not None else int(os.getenv('MCP_POOL_MAX_SIZE', '4'))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('MCP_POOL_IDLE_TIMEOUT', '60'))
+        self.health_interval = (health_interval if health_interval is not None
+                                else float(os.getenv('MCP_POOL_HEALTH_INTERVAL', '15')))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('MCP_POOL_MAX_RETRIES', '2'))
+        self.clients: List[MCPClient] = []
+        # Connections being opened, counted against max_size
+        self._opening = 0
+        self._lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        # One result cache for every connection, so a call can be answered
+        # notModified whichever connection fetched the result before
+        self.result_cache = result_cache_from_env()
+
+    @property
+    def connected(self) -> bool:
+        return any(client.connected for client in self.clients)
+
+    async def _open_client(self) -> MCPClient:
+        """Open and handshake a connection whose slot the caller reserved in ``_opening``."""
+        try:
+            client = MCPClient(self.host, self.port, self.jwt_token, self.result_cache)
+            await client.initialize()
+        except BaseException:
+            async with self._lock:
+                self._opening -= 1
+            raise
+        async with self._lock:
+            self._opening -= 1
+            self.clients.append(client)
+            logger.info(f"MCP pool opened connection ({len(self.clients)}/{self.max_size})")
+        return client
+
+    def _remove(self, clients: List[MCPClient]) -> List[MCPClient]:
+        """Take ``clients`` out of the pool (under ``_lock``); returns those that were still in it."""
+        removed = [client for client in clients if client in self.clients]
+        for client in removed:
+            self.clients.remove(client)
+        return removed
+
+    async def _close(self, clients: List[MCPClient]):
+        """Disconnect clients already taken out of the pool."""
+        for client in clients:
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.warning(f"Error closing pooled MCP connection: {e}")
+
+    async def _discard(self, client: MCPClient):
+        async with self._lock:
+            removed = self._remove([client])
+        await self._close(removed)
+
+    def _reserve_refill(self) -> int:
+        """Reserve slots (under ``_lock``) for the connections needed to get back to ``min_size``."""
+        missing = max(self.min_size - len(self.clients) - self._opening, 0)
+        self._opening += missing
+        return missing
+
+    async def _acquire(self) -> MCPClient:
+        """Pick the least busy live connection, growing the pool if all are busy."""
+        async with self._lock:
+            dead = self._remove([c for c in self.clients if not c.connected])
+            client = min(self.clients, key=lambda c: c.in_flight, default=None)
+            grow = client is None or (client.in_flight > 0 and len(self.clients) + self._opening < self.max_size)
+            if grow:
+                self._opening += 1
+        await self._close(dead)
+        return await self._open_client() if grow else client
+
+    async def connect(self):
+        """Open ``min_size`` connections and start the health checker."""
+        async with self._lock:
+            missing = self._reserve_refill()
+        await asyncio.gather(*(self._open_client() for _ in range(missing)))
+
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def disconnect(self):
+        """Stop the health checker and close every connection."""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        async with self._lock:
+            clients = self._remove(list(self.clients))
+        await self._close(clients)
+
+    async def start_server(self):
+        """Connect to MCP server (for compatibility with existing code)."""
+        await self.connect()
+
+    async def stop_server(self):
+        """Disconnect from MCP server (for compatibility with existing code)."""
+        await self.disconnect()
+
+    async def initialize(self):
+        """Open the pool; each connection runs its own ``initialize`` handshake."""
+        await self.connect()
+        return {"connections": len(self.clients)}
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None) -> str:
+        """Call a tool on a pooled connection.
+
+        Idempotent tools are replayed on a fresh connection when the one they
+        were sent on drops; other tools surface the connection error.
+        """
+        return await self._call_tool(tool_name, lambda client: client.call_tool(tool_name, arguments, jwt_token=jwt_token))
+
+    async def call_tool_table(self, tool_name: str, arguments: Dict[str, Any],
+                              jwt_token: Optional[str] = None) -> MealTable:
+        """``MCPClient.call_tool_table`` on a pooled connection."""
+        return decode_table(await self.call_tool(tool_name, arguments, jwt_token=jwt_token))
+
+    async def call_tool_page(self, tool_name: str, arguments: Dict[str, Any],
+                             jwt_token: Optional[str] = None) -> Tuple[MealTable, Optional[str]]:
+        """``MCPClient.call_tool_page`` on a pooled connection, replayed like ``call_tool``."""
+        return await self._call_tool(tool_name, lambda client: client.call_tool_page(tool_name, arguments, jwt_token=jwt_token))
+
+    def iter_tool_pages(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None,
+                        page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[MealTable]:
+        """``MCPClient.iter_tool_pages`` over the pool.
+
+        Each page is its own request carrying the cursor, so pages may be
+        served by different connections and a page lost to a dropped
+        connection is retried without starting over.
+        """
+        return iter_pages(self.call_tool_page, tool_name, arguments, jwt_token, page_size)
+
+    def iter_tool(self, tool_name: str, arguments: Dict[str, Any], jwt_token: Optional[str] = None,
+                  page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """``MCPClient.iter_tool`` over the pool."""
+        return iter_rows(self.iter_tool_pages(tool_name, arguments, jwt_token, page_size))
+
+    async def _call_tool(self, tool_name: str, call):
+        """Run ``call(client)`` on a pooled connection, with ``call_tool``'s replay rules."""
+        attempts = self.max_retries + 1 if tool_name in IDEMPOTENT_TOOLS else 1
+
+        for attempt in range(attempts):
+            client = await self._acquire()
+            try:
+                return await call(client)
+            except MCPConnectionError as e:
+                logger.warning(f"MCP connection lost during {tool_name} (attempt {attempt + 1}/{attempts}): {e}")
+                await self._discard(client)
+                if attempt + 1 == attempts:
+                    raise
+
+    async def call_tools(self, calls: List[Tuple[str, Dict[str, Any]]], jwt_token: Optional[str] = None,
+                         return_exceptions: bool = False) -> List[Any]:
+        """Send several tool calls as one batch on a pooled connection.
+
+        The batch is replayed on a fresh connection only if every call in it
+        is idempotent.
+        """
+        idempotent = all(name in IDEMPOTENT_TOOLS for name, _ in calls)
+        attempts = self.max_retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            client = await self._acquire()
+            try:
+                return await client.call_tools(calls, jwt_token=jwt_token, return_exceptions=return_exceptions)
+            except MCPConnectionError as e:
+                logger.warning(f"MCP connection lost during batch of {len(calls)} calls (attempt {attempt + 1}/{attempts}): {e}")
+                await self._discard(client)
+                if attempt + 1 == attempts:
+                    raise
+
+    async def _health_loop(self):
+        """Periodically probe idle connections, evict stale ones, refill to ``min_size``."""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self._check_health()
+            except Exception as e:
+                logger.error(f"MCP pool health check failed: {e}")
+
+    async def _probe(self, client: MCPClient) -> bool:
+        """Whether ``client`` answers a ping; any error (timeout, deadline, broken socket) counts as no."""
+        try:
+            return await asyncio.wait_for(client.ping(), timeout=self.health_interval)
+        except Exception as e:
+            logger.warning(f"MCP pool health probe failed: {e!r}")
+            return False
+
+    async def _check_health(self):
+        # Decide evictions under the lock, probe the remaining idle
+        # connections concurrently outside it, then drop the failures
+        now = time.monotonic()
+        async with self._lock:
+            expired = []
+            for client in [c for c in self.clients if c.in_flight == 0]:
+                if len(self.clients) - len(expired) > self.min_size and now - client.last_used > self.idle_timeout:
+                    expired.append(client)
+            expired = self._remove(expired)
+            idle = [c for c in self.clients if c.in_flight == 0]
+        if expired:
+            logger.info(f"MCP pool evicting {len(expired)} idle connection(s)")
+            await self._close(expired)
+
+        healthy = await asyncio.gather(*(self._probe(client) for client in idle))
+        async with self._lock:
+            unhealthy = self._remove([client for client, ok in zip(idle, healthy) if not ok])
+            missing = self._reserve_refill()
+        if unhealthy:
+            logger.warning(f"MCP pool dropping {len(unhealthy)} unhealthy connection(s)")
+            await self._close(unhealthy)
+
+        await asyncio.gather(*(self._open_client() for _ in range(missing)))
@@ -0,0 +1,229 @@
+import json
+import logging
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, Any, List, Optional, Union
+from meal_table import MealTable, decode_table
+
+logger = logging.getLogger(__name__)
+
+# Bounds that keep the digest (and the prompt built from it) roughly constant
+# in size however long the user's history is
+MAX_DAYS = 14
+MAX_WEEKS = 12
+MAX_SAMPLE_ROWS = 10
+MAX_RAW_CHARS = 2000
+
+MACROS = ('protein', 'carbs', 'fats')
+# kcal per gram, for macro ratios
+KCAL_PER_GRAM = {'protein': 4, 'carbs': 4, 'fats': 9}
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+
+def meal_type(meal: Dict[str, Any], zone: Optional[tzinfo] = None) -> str:
+    """Meal type from the name if it says so, otherwise from the time logged (in ``zone``)."""
+    return _name_type(meal.get('name')) or _time_type(_local_time(meal.get('created_at'), zone))
+
+def _local_time(created_at: Optional[str], zone: Optional[tzinfo]) -> Optional[str]:
+    """UTC ``created_at`` as wall-clock ``YYYY-MM-DDTHH:MM:SS`` in ``zone``.
+
+    Returned as is without a zone or when it doesn't parse.
+    """
+    if zone is None or not created_at:
+        return created_at
+    try:
+        instant = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    except ValueError:
+        return created_at
+    # SQLite's CURRENT_TIMESTAMP has no offset but is UTC
+    if instant.tzinfo is None:
+        instant = instant.replace(tzinfo=timezone.utc)
+    return instant.astimezone(zone).strftime('%Y-%m-%dT%H:%M:%S')
+
+def _name_type(name: Optional[str]) -> Optional[str]:
+    name = (name or '').lower()
+    for kind in MEAL_TYPES:
+        if kind in name:
+            return kind
+    return None
+
+def _time_type(created_at: Optional[str]) -> str:
+    created_at = created_at or ''
+    try:
+        hour = int(created_at[11:13])
+    except ValueError:
+        return 'other'
+    if 4 <= hour < 11:
+        return 'breakfast'
+    if 11 <= hour < 16:
+        return 'lunch'
+    if 16 <= hour < 22:
+        return 'dinner'
+    return 'snack'
+
+def _totals(rows: MealTable) -> Dict[str, float]:
+    """Calorie and macro sums over a table of meals or of rollup rows."""
+    return {key: round(rows.total(key), 1) for key in ('calories', *MACROS)}
+
+def _day(created_at: Optional[str]) -> str:
+    return (created_at or '')[:10] or 'unknown'
+
+def _macro_ratios(totals: Dict[str, float]) -> Dict[str, float]:
+    macro_kcal = {macro: totals[macro] * KCAL_PER_GRAM[macro] for macro in MACROS}
+    macro_total = sum(macro_kcal.values())
+    return {macro: round(kcal / macro_total, 2) for macro, kcal in macro_kcal.items()} if macro_total else {}
+
+def _period(meal_count: int, day_count: int, first_day: Optional[str], last_day: Optional[str],
+            totals: Dict[str, float], range_days: Optional[int] = None) -> Dict[str, Any]:
+    """Digest fields shared by every kind of tool result.
+
+    The daily average is over the ``range_days`` days asked about, days
+    without meals included; without a range, over the days with meals.
+    """
+    per_days = range_days or day_count
+    period = {
+        'meal_count': meal_count,
+        'day_count': day_count,
+        'first_day': first_day,
+        'last_day': last_day,
+        'totals': totals,
+        'daily_average_calories': round(totals['calories'] / per_days, 1) if per_days else 0,
+        'macro_calorie_ratios': _macro_ratios(totals),
+    }
+    if range_days:
+        period['range_days'] = range_days
+    return period
+
+def summarize_meals(meals: MealTable, zone: Optional[tzinfo] = None, range_days: Optional[int] = None) -> Dict[str, Any]:
+    """Aggregate meal rows into a bounded-size digest.
+
+    Includes overall totals, macro calorie ratios, per-day totals for the
+    most recent ``MAX_DAYS`` days, per-meal-type totals and a small sample
+    of the most recent rows with only the fields the answer needs. Days and
+    times of day are those of ``zone`` (UTC if None).
+    """
+    created = meals.values('created_at')
+    local = [_local_time(created_at, zone) for created_at in created] if zone is not None else created
+    local_of = dict(zip(created, local))
+    by_day = meals.spans('created_at', lambda created_at: _day(local_of[created_at]))
+
+    # Names repeat, so the name check runs once per distinct name
+    names = meals.values('name')
+    name_types = {name: _name_type(name) for name in set(names)}
+    by_type: Dict[str, List[int]] = {}
+    for index, (name, local_time) in enumerate(zip(names, local)):
+        by_type.setdefault(name_types[name] or _time_type(local_time), []).append(index)
+
+    days = sorted(by_day, reverse=True)
+    # Already newest first from the server, which makes this sort linear
+    created_keys = [created_at or '' for created_at in created]
+    recent = sorted(range(len(meals)), key=created_keys.__getitem__, reverse=True)[:MAX_SAMPLE_ROWS]
+
+    return {
+        **_period(len(meals), len(days), days[-1] if days else None, days[0] if days else None, _totals(meals),
+                  range_days),
+        'per_day': {day: _totals(meals.select(by_day[day])) for day in days[:MAX_DAYS]},
+        'days_omitted': max(len(days) - MAX_DAYS, 0),
+        'per_meal_type': {kind: {'count': len(rows), **_totals(meals.take(rows))} for kind, rows in by_type.items()},
+        'recent_meals': [
+            {
+                'name': meal.get('name'),
+                'calories': meal.get('calories'),
+                **{macro: meal.get(macro) for macro in MACROS if meal.get(macro) is not None},
+                'logged_at': (local[index] or '')[:16],
+            }
+            for index, meal in ((index, meals.row(index)) for index in recent)
+        ],
+        'meals_omitted': max(len(meals) - len(recent), 0),
+    }
+
+def _newest_first(rows: MealTable, key: str) -> MealTable:
+    values = rows.values(key)
+    return rows.take(sorted(range(len(rows)), key=lambda index: values[index] or '', reverse=True))
+
+def summarize_daily_totals(days: MealTable, zone: Optional[tzinfo] = None, range_days: Optional[int] = None) -> Dict[str, Any]:
+    """Digest of ``get_daily_totals`` rows (one per day with meals, newest first).
+
+    The server already grouped the days in the requested zone.
+    """
+    days = _newest_first(days, 'day')
+    last = len(days) - 1
+    return {
+        **_period(int(days.total('meals')), len(days),
+                  days.get(last, 'day') if len(days) else None, days.get(0, 'day') if len(days) else None, _totals(days),
+                  range_days),
+        'per_day': {days.get(index, 'day'): {'meals': days.get(index, 'meals'), **_totals(days.slice(index, index + 1))}
+                    for index in range(min(len(days), MAX_DAYS))},
+        'days_omitted': max(len(days) - MAX_DAYS, 0),
+        'recent_meals': [],
+    }
+
+def summarize_weekly_totals(weeks: MealTable, zone: Optional[tzinfo] = None, range_days: Optional[int] = None) -> Dict[str, Any]:
+    """Digest of ``get_weekly_totals`` rows (one per week with meals, newest first)."""
+    weeks = _newest_first(weeks, 'week_start')
+    last = len(weeks) - 1
+    return {
+        **_period(int(weeks.total('meals')), int(weeks.total('days')),
+                  weeks.get(last, 'first_day') if len(weeks) else None, weeks.get(0, 'last_day') if len(weeks) else None,
+                  _totals(weeks), range_days),
+        'per_week': {weeks.get(index, 'week_start'): {'meals': weeks.get(index, 'meals'), 'days': weeks.get(index, 'days'),
+                                                      **_totals(weeks.slice(index, index + 1))}
+                     for index in range(min(len(weeks), MAX_WEEKS))},
+        'weeks_omitted': max(len(weeks) - MAX_WEEKS, 0),
+        'recent_meals': [],
+    }
+
+# Digest builder for each tool's list-of-rows output
+SUMMARIZERS = {
+    'get_user_meals': summarize_meals,
+    'get_daily_totals': summarize_daily_totals,
+    'get_weekly_totals': summarize_weekly_totals,
+    # One day's totals, decoded into a daily-totals row by decode_macros
+    'get_meal_macros': summarize_daily_totals,
+}
+
+def digest_meal_data(meal_data: Union[MealTable, str], tool: str = 'get_user_meals', zone: Optional[tzinfo] = None,
+                     range_days: Optional[int] = None) -> str:
+    """Turn the output of a meal ``tool`` into a compact JSON digest for the prompt.
+
+    ``zone`` is the time zone the question's days are in and ``range_days``
+    how many days it asked about (for the daily average). Takes the
+    decoded ``MealTable`` or the raw result text. Text that isn't
+    a table of rows (e.g. an error message) is passed through, truncated to
+    ``MAX_RAW_CHARS``.
+    """
+    rows = meal_data
+    if not isinstance(rows, MealTable):
+        try:
+            rows = decode_table(meal_data)
+        except (json.JSONDecodeError, TypeError):
+            return meal_data[:MAX_RAW_CHARS]
+        except ValueError:
+            return json.dumps(json.loads(meal_data), separators=(',', ':'))[:MAX_RAW_CHARS]
+
+    digest = json.dumps(SUMMARIZERS[tool](rows, zone, range_days), separators=(',', ':'))
+    logger.info(f"Summarized {len(rows)} {tool} rows into {len(digest)} chars")
+    return digest
+
+def render_meal_summary(meal_summary: str) -> str:
+    """Plain-text answer built from a ``digest_meal_data`` digest, for when there's no time for the LLM."""
+    try:
+        digest = json.loads(meal_summary)
+    except (json.JSONDecodeError, TypeError):
+        digest = None
+    if not isinstance(digest, dict) or 'meal_count' not in digest:
+        return "I couldn't load your meals right now. Please try again in a moment."
+    if not digest['meal_count']:
+        return "You have no meals logged for that period."
+
+    totals = digest['totals']
+    period = digest['first_day'] if digest['first_day'] == digest['last_day'] else \
+        f"{digest['first_day']} to {digest['last_day']}"
+    text = (f"You logged {digest['meal_count']} meal{'s' if digest['meal_count'] != 1 else ''} ({period}) "
+            f"totalling {totals['calories']:.0f} kcal: {totals['protein']:.0f} g protein, "
+            f"{totals['carbs']:.0f} g carbs and {totals['fats']:.0f} g fats.")
+    if digest.get('range_days', digest['day_count']) > 1:
+        text += f" That's about {digest['daily_average_calories']:.0f} kcal per day."
+
+    recent = [f"{meal['name']} ({meal['calories']} kcal)" for meal in digest['recent_meals'][:3]]
+    if recent:
+        text += f" Most recent: {', '.join(recent)}."
+    return text
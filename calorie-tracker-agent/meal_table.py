@@ -0,0 +1,213 @@
+import hashlib
+import json
+from array import array
+from itertools import groupby
+from typing import Dict, Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+NAN = float('nan')
+
+def _pack(values: Sequence[Any]):
+    """Store a column compactly.
+
+    All-integer columns become ``array('q')``, other numeric columns
+    ``array('d')`` with NaN for NULL, and anything else a list in which
+    equal values share one object. The ``array`` constructor does the type
+    checks, so a column costs a C loop rather than a Python one.
+    """
+    values = values if isinstance(values, list) else list(values)
+    if not values:
+        return values
+    for typecode in ('q', 'd'):
+        try:
+            return array(typecode, values)
+        except (TypeError, OverflowError):
+            pass
+    if values.count(None) < len(values):
+        try:
+            return array('d', [NAN if value is None else value for value in values])
+        except TypeError:
+            pass
+
+    try:
+        shared = dict(zip(values, values))
+    except TypeError:
+        return values
+    return list(map(shared.__getitem__, values))
+
+def _unpack(value: Any) -> Any:
+    return None if value != value else value
+
+class MealTable:
+    """Rows of a tool result (meals, or per-day/per-week totals) held column by column.
+
+    Numbers live in ``array`` buffers at 8 bytes a value, so totals and
+    per-day sums run over contiguous memory instead of a dict per row. Rows
+    keep the order the server sent them in (newest first).
+    """
+
+    __slots__ = ('columns', 'length')
+
+    def __init__(self, columns: Optional[Dict[str, Sequence[Any]]] = None):
+        self.columns = {name: _pack(values) for name, values in (columns or {}).items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns differ in length: {sorted(lengths)}")
+        self.length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> 'MealTable':
+        """Table of a list of row objects (the default, non-columnar result encoding)."""
+        names: Dict[str, None] = {}
+        for row in rows:
+            names.update(dict.fromkeys(row))
+        return cls({name: [row.get(name) for row in rows] for name in names})
+
+    def __len__(self) -> int:
+        return self.length
+
+    def values(self, name: str) -> List[Any]:
+        """Column ``name`` as Python values (None for NULL or a missing column)."""
+        column = self.columns.get(name)
+        if column is None:
+            return [None] * self.length
+        if isinstance(column, array) and column.typecode == 'd':
+            return [_unpack(value) for value in column]
+        return list(column)
+
+    def get(self, index: int, name: str) -> Any:
+        column = self.columns.get(name)
+        return None if column is None else _unpack(column[index])
+
+    def row(self, index: int) -> Dict[str, Any]:
+        return {name: _unpack(column[index]) for name, column in self.columns.items()}
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        return (self.row(index) for index in range(self.length))
+
+    @classmethod
+    def _packed(cls, columns: Dict[str, Sequence[Any]], length: int) -> 'MealTable':
+        """Table of columns that are already packed."""
+        table = cls.__new__(cls)
+        table.columns, table.length = columns, length
+        return table
+
+    def take(self, indices: Sequence[int]) -> 'MealTable':
+        """Table of the rows at ``indices``, in that order."""
+        return MealTable._packed({
+            name: array(column.typecode, map(column.__getitem__, indices)) if isinstance(column, array)
+            else list(map(column.__getitem__, indices))
+            for name, column in self.columns.items()
+        }, len(indices))
+
+    def slice(self, start: int, stop: int) -> 'MealTable':
+        return MealTable._packed({name: column[start:stop] for name, column in self.columns.items()},
+                                 len(range(self.length)[start:stop]))
+
+    def extend(self, other: 'MealTable'):
+        """Append ``other``'s rows (e.g. the next page of a tool result)."""
+        if not other.length:
+            return
+        if not self.length:
+            self.columns = {name: column[:] for name, column in other.columns.items()}
+            self.length = other.length
+            return
+        for name in self.columns.keys() | other.columns.keys():
+            mine, theirs = self.columns.get(name), other.columns.get(name)
+            if isinstance(mine, array) and isinstance(theirs, array) and mine.typecode == theirs.typecode:
+                mine.extend(theirs)
+            else:
+                self.columns[name] = _pack(self.values(name) + other.values(name))
+        self.length += other.length
+
+    def truncate(self, length: int):
+        """Drop every row after the first ``length``."""
+        for column in self.columns.values():
+            del column[length:]
+        self.length = min(self.length, length)
+
+    def total(self, name: str) -> float:
+        """Sum of a column, counting NULL and non-numeric values as 0."""
+        column = self.columns.get(name)
+        if column is None:
+            return 0.0
+        if isinstance(column, array):
+            total = sum(column)
+            # NaN marks NULLs; skip them only when there are any
+            return float(total) if total == total else float(sum(value for value in column if value == value))
+        return float(sum(value for value in column if type(value) in (int, float)))
+
+    def totals(self, names: Sequence[str]) -> Dict[str, float]:
+        return {name: self.total(name) for name in names}
+
+    def runs(self, name: str, key: Callable[[Any], Any] = lambda value: value) -> List[Tuple[Any, int, int]]:
+        """``(key, start, stop)`` for each run of consecutive rows with the same ``key(value)``.
+
+        Rows arrive sorted by time, so grouping by day is a single pass that
+        yields one slice per day.
+        """
+        runs, start = [], 0
+        for group_key, group in groupby(self.values(name), key):
+            stop = start + len(list(group))
+            runs.append((group_key, start, stop))
+            start = stop
+        return runs
+
+    def spans(self, name: str, key: Callable[[Any], Any] = lambda value: value) -> Dict[Any, List[Tuple[int, int]]]:
+        """Row ranges grouped by ``key(value)`` of column ``name``, groups in order of first appearance.
+
+        Pass a group to ``select`` for its rows; only the groups used are copied.
+        """
+        spans: Dict[Any, List[Tuple[int, int]]] = {}
+        for group_key, start, stop in self.runs(name, key):
+            spans.setdefault(group_key, []).append((start, stop))
+        return spans
+
+    def select(self, spans: List[Tuple[int, int]]) -> 'MealTable':
+        """Table of the rows in ``spans`` (``(start, stop)`` ranges, as from ``spans``)."""
+        if len(spans) == 1:
+            return self.slice(*spans[0])
+        return self.take([index for start, stop in spans for index in range(start, stop)])
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """Columnar JSON-ready form: one list of values per column."""
+        return {name: self.values(name) for name in self.columns}
+
+    def fingerprint(self) -> str:
+        """Hash of the table's contents, for cache keys."""
+        h = hashlib.sha256()
+        for name, column in self.columns.items():
+            h.update(name.encode() + b'\0')
+            if isinstance(column, array):
+                h.update(column.typecode.encode() + column.tobytes())
+            else:
+                h.update(json.dumps(column, separators=(',', ':')).encode())
+        return h.hexdigest()
+
+def decode_table(text: str) -> MealTable:
+    """Table of a row tool's result text, columnar (``{column: [values]}``) or an array of objects.
+
+    Raises ValueError for anything else, e.g. an error message.
+    """
+    data = json.loads(text)
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return MealTable.from_rows(data)
+    if isinstance(data, dict) and all(isinstance(values, list) for values in data.values()):
+        return MealTable(data)
+    raise ValueError("Tool result is not a table of rows")
+
+def decode_macros(text: str, day: str) -> MealTable:
+    """``get_meal_macros`` totals for ``day`` as a one-row table shaped like ``get_daily_totals`` rows.
+
+    No rows if nothing was logged. Raises ValueError for anything else, e.g.
+    an error message.
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict) or 'total_calories' not in data:
+        raise ValueError("Tool result is not meal macros")
+    if not data.get('meal_count'):
+        return MealTable.from_rows([])
+    return MealTable.from_rows([{
+        'day': day,
+        'meals': data['meal_count'],
+        **{key: data[f'total_{key}'] or 0 for key in ('calories', 'protein', 'carbs', 'fats')},
+    }])
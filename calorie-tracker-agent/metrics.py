@@ -0,0 +1,221 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast local stages to slow CPU generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series: Dict[LabelKey, Dict[str, Any]] = {}
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None):
+        series = self.series.setdefault(_label_key(labels), {
+            'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0
+        })
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['counts'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series['counts']):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.series: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
+        key = _label_key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics with Prometheus text-format export."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {}
+
+    def histogram(self, name: str, help_text: str) -> Histogram:
+        with self._lock:
+            return self.metrics.setdefault(name, Histogram(name, help_text))
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self.metrics.setdefault(name, Counter(name, help_text))
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for metric in self.metrics.values():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('agent_stage_seconds', 'Time spent in each process_query stage')
+QUERY_SECONDS = registry.histogram('agent_query_seconds', 'End-to-end process_query latency')
+QUERIES = registry.counter('agent_queries_total', 'Queries processed, by outcome')
+OLLAMA_SECONDS = registry.histogram('ollama_duration_seconds', 'Durations reported by Ollama, by kind')
+OLLAMA_TOKENS = registry.counter('ollama_tokens_total', 'Tokens processed by Ollama, by kind')
+OLLAMA_BACKEND_REQUESTS = registry.counter('ollama_backend_requests_total', 'Ollama HTTP requests by backend and result')
+OLLAMA_HEDGES = registry.counter('ollama_hedged_requests_total', 'Hedged Ollama requests, by which copy answered first')
+
+class QueryTrace:
+    """Per-request record of stage timings and Ollama statistics."""
+
+    def __init__(self, query: str):
+        self.trace_id = uuid.uuid4().hex
+        self.query = query
+        self.started = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.ollama: List[Dict[str, Any]] = []
+        self.outcome: Optional[str] = None
+        self.duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'query': self.query,
+            'started': self.started,
+            'duration': self.duration,
+            'outcome': self.outcome,
+            'spans': self.spans,
+            'ollama': self.ollama,
+        }
+
+# The trace of the query being processed in the current task, so clients
+# deep in the call stack can attach their statistics to it
+current_trace: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar('current_trace', default=None)
+# The stage currently running, used to label Ollama statistics
+current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_stage', default=None)
+
+@contextmanager
+def span(stage: str):
+    """Time a block as ``stage`` in the stage histogram and the current trace."""
+    stage_token = current_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_stage.reset(stage_token)
+        record_span(stage, time.perf_counter() - start)
+
+def record_span(stage: str, elapsed: float):
+    """Record ``elapsed`` seconds of ``stage`` in the stage histogram and the current trace."""
+    STAGE_SECONDS.observe(elapsed, {'stage': stage})
+    trace = current_trace.get()
+    if trace is not None:
+        trace.spans.append({'stage': stage, 'seconds': round(elapsed, 6)})
+
+@contextmanager
+def traced(trace: QueryTrace, stage: Optional[str] = None):
+    """Make ``trace``, and ``stage`` if given, current for the block.
+
+    For async generators, which must not hold a context variable across a
+    ``yield``: one closed from another context could not reset it.
+    """
+    trace_token = current_trace.set(trace)
+    stage_token = current_stage.set(stage) if stage else None
+    try:
+        yield
+    finally:
+        if stage_token is not None:
+            current_stage.reset(stage_token)
+        current_trace.reset(trace_token)
+
+def start_trace(query: str) -> Tuple[QueryTrace, contextvars.Token]:
+    trace = QueryTrace(query)
+    return trace, current_trace.set(trace)
+
+def finish_trace(trace: QueryTrace, token: contextvars.Token, outcome: str):
+    current_trace.reset(token)
+    record_trace(trace, outcome)
+
+def record_trace(trace: QueryTrace, outcome: str):
+    """Close a trace: record totals and append it to ``AGENT_TRACE_FILE`` if set."""
+    trace.outcome = outcome
+    trace.duration = round(time.time() - trace.started, 6)
+    QUERY_SECONDS.observe(trace.duration)
+    QUERIES.inc(labels={'outcome': outcome})
+
+    trace_file = os.getenv('AGENT_TRACE_FILE')
+    if trace_file:
+        try:
+            with open(trace_file, 'a') as f:
+                f.write(json.dumps(trace.to_dict()) + '\n')
+        except OSError as e:
+            logger.error(f"Failed to write trace: {e}")
+
+# Ollama reports durations in nanoseconds
+OLLAMA_DURATION_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+OLLAMA_COUNT_FIELDS = ('prompt_eval_count', 'eval_count')
+
+def record_ollama_stats(result: Dict[str, Any], model: Optional[str] = None):
+    """Record the timing/token fields of a final Ollama response."""
+    stats = {field: result[field] for field in OLLAMA_DURATION_FIELDS + OLLAMA_COUNT_FIELDS if field in result}
+    if not stats:
+        return
+
+    labels = {'stage': current_stage.get() or 'unknown'}
+    if model:
+        labels['model'] = model
+    for field in OLLAMA_DURATION_FIELDS:
+        if field in stats:
+            OLLAMA_SECONDS.observe(stats[field] / 1e9, {**labels, 'kind': field[:-len('_duration')]})
+    for field in OLLAMA_COUNT_FIELDS:
+        if field in stats:
+            OLLAMA_TOKENS.inc(stats[field], {**labels, 'kind': field[:-len('_count')]})
+
+    trace = current_trace.get()
+    if trace is not None:
+        trace.ollama.append({**labels, **stats})
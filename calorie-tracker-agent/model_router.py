@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+from deadline import DeadlineExceeded
+from metrics import registry
+from ollama_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('analysis', 'answer', 'summary')
+
+MODEL_REQUESTS = registry.counter('agent_model_requests_total', 'LLM calls by stage, model and route')
+MODEL_SECONDS = registry.histogram('agent_model_seconds', 'LLM call latency by stage and model')
+
+class StageRoute:
+    """Model selection for one pipeline stage.
+
+    Calls go to ``model`` unless a ``fallback`` is configured and the primary
+    is overloaded (``max_in_flight`` calls already running) or was slow: a
+    call slower than ``slow_seconds`` sends the stage to the fallback for
+    ``cooldown`` seconds before the primary is tried again. A primary call
+    that fails is retried on the fallback and starts the same cool-down.
+    """
+
+    def __init__(self, model: str, fallback: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                 slow_seconds: Optional[float] = None, max_in_flight: Optional[int] = None, cooldown: float = 30.0):
+        self.model = model
+        self.fallback = fallback
+        self.options = options or {}
+        self.slow_seconds = slow_seconds
+        self.max_in_flight = max_in_flight
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.slow_until = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        if self.fallback is None:
+            return False
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return True
+        return time.monotonic() < self.slow_until
+
+class ModelRouter:
+    """Per-stage model routing over one ``OllamaClient``.
+
+    Routes come from ``AGENT_STAGE_MODELS``, a JSON object keyed by stage,
+    e.g. ``{"analysis": {"model": "llama3.2:1b"}, "answer": {"fallback":
+    "llama3.2:1b", "slow_seconds": 20}}``. Stages without a model use the
+    client's ``OLLAMA_MODEL``.
+    """
+
+    def __init__(self, client: OllamaClient, routes: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.client = client
+        if routes is None:
+            routes = json.loads(os.getenv('AGENT_STAGE_MODELS') or '{}')
+        unknown = set(routes) - set(STAGES)
+        if unknown:
+            raise Exception(f"Unknown stages in model routes: {', '.join(sorted(unknown))}")
+        self.routes = {stage: StageRoute(**{'model': client.model, **routes.get(stage, {})}) for stage in STAGES}
+
+    def select(self, stage: str) -> Tuple[str, bool]:
+        """The model to use for ``stage`` now, and whether it is the fallback."""
+        route = self.routes[stage]
+        if route.degraded:
+            return route.fallback, True
+        return route.model, False
+
+    def _options(self, route: StageRoute, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Configured stage options win over the caller's defaults
+        return {**(options or {}), **route.options}
+
+    def _observe(self, stage: str, route: StageRoute, model: str, fallback: bool, elapsed: float):
+        MODEL_REQUESTS.inc(labels={'stage': stage, 'model': model, 'route': 'fallback' if fallback else 'primary'})
+        MODEL_SECONDS.observe(elapsed, {'stage': stage, 'model': model})
+        if not fallback and route.fallback and route.slow_seconds is not None and elapsed > route.slow_seconds:
+            route.slow_until = time.monotonic() + route.cooldown
+            logger.warning(f"{stage} model {model} took {elapsed:.1f}s, using {route.fallback} for {route.cooldown:.0f}s")
+
+    def _fall_back(self, stage: str, route: StageRoute, model: str, error: Exception) -> bool:
+        """Whether a failed call on ``model`` should be retried on the stage's fallback."""
+        # Out of time: the fallback has no more of it than the primary had
+        if route.fallback is None or model == route.fallback or isinstance(error, DeadlineExceeded):
+            return False
+        route.slow_until = time.monotonic() + route.cooldown
+        logger.warning(f"{stage} model {model} failed ({error}), using {route.fallback} for {route.cooldown:.0f}s")
+        return True
+
+    async def chat(self, stage: str, messages: list, options: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        route = self.routes[stage]
+        model, fallback = self.select(stage)
+        route.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await self.client.chat(messages, options=self._options(route, options), model=model, **kwargs)
+        except Exception as e:
+            if not self._fall_back(stage, route, model, e):
+                raise
+        finally:
+            route.in_flight -= 1
+            self._observe(stage, route, model, fallback, time.perf_counter() - start)
+        return await self.chat(stage, messages, options, **kwargs)
+
+    async def chat_stream(self, stage: str, messages: list, options: Optional[Dict[str, Any]] = None,
+                          **kwargs) -> AsyncIterator[str]:
+        route = self.routes[stage]
+        model, fallback = self.select(stage)
+        route.in_flight += 1
+        start = time.perf_counter()
+        streamed = False
+        try:
+            async for text in self.client.chat_stream(messages, options=self._options(route, options),
+                                                      model=model, **kwargs):
+                streamed = True
+                yield text
+            return
+        except Exception as e:
+            # Once tokens reached the caller the reply can't be restarted
+            if streamed or not self._fall_back(stage, route, model, e):
+                raise
+        finally:
+            route.in_flight -= 1
+            self._observe(stage, route, model, fallback, time.perf_counter() - start)
+        async for text in self.chat_stream(stage, messages, options, **kwargs):
+            yield text
+
+    async def warm_up(self, prefixes: Dict[str, list]):
+        """Load each stage's primary model, prefilling that stage's messages from ``prefixes``.
+
+        Stages are warmed with their own options, since a model loaded with
+        another ``num_ctx`` would be reloaded by the stage's first call;
+        stages sharing a model and options are warmed once.
+        """
+        warmed = set()
+        for stage, messages in prefixes.items():
+            route = self.routes[stage]
+            key = (route.model, json.dumps(route.options, sort_keys=True))
+            if key not in warmed:
+                warmed.add(key)
+                await self.client.warm_up(messages, model=route.model, options=route.options)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            stage: {'model': route.model, 'fallback': route.fallback,
+                    'degraded': route.degraded, 'in_flight': route.in_flight}
+            for stage, route in self.routes.items()
+        }
@@ -1,22 +1,152 @@
 import aiohttp
+import asyncio
 import json
 import logging
 import os
-from typing import Dict, Any, Optional
+import time
+from collections import deque
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
 from dotenv import load_dotenv
+from deadline import DeadlineExceeded, remaining
+from metrics import record_ollama_stats, percentile, OLLAMA_BACKEND_REQUESTS, OLLAMA_HEDGES
 
 logger = logging.getLogger(__name__)
 
+# Recent request latencies kept per backend, and how many are needed before
+# its p95 replaces the configured hedge delay
+LATENCY_WINDOW = 100
+MIN_HEDGE_SAMPLES = 20
+
+class OllamaBackend:
+    """One Ollama server: requests in flight, recent latencies and reachability."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mean_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def hedge_delay(self, default: float) -> float:
+        """How long to wait before hedging: this backend's recent p95 once known."""
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return default
+        return percentile(list(self.latencies), 95)
+
+    def record_success(self, elapsed: float):
+        self.latencies.append(elapsed)
+        self.down_until = 0.0
+        OLLAMA_BACKEND_REQUESTS.inc(labels={'backend': self.url, 'result': 'ok'})
+
+    def record_error(self, down_for: float = 0.0):
+        if down_for:
+            self.down_until = time.monotonic() + down_for
+        OLLAMA_BACKEND_REQUESTS.inc(labels={'backend': self.url, 'result': 'error'})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'url': self.url, 'available': self.available, 'in_flight': self.in_flight,
+                'mean_latency': round(self.mean_latency(), 4)}
+
 class OllamaClient:
+    """Ollama HTTP client over one or more backends.
+
+    ``OLLAMA_URL`` may list several servers separated by commas. Each request
+    goes to the available backend with the fewest requests in flight. With
+    ``OLLAMA_HEDGE`` on, a non-streaming request still running after the
+    backend's recent p95 (``OLLAMA_HEDGE_DELAY`` until enough samples) is
+    duplicated to a second backend; the first answer wins and the other copy
+    is cancelled.
+    """
+
     def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None):
         # Load environment variables
         load_dotenv()
 
+        self.backends: List[OllamaBackend] = []
         self.base_url = base_url or os.getenv('OLLAMA_URL', 'http://localhost:11434')
+        self.hedge = os.getenv('OLLAMA_HEDGE', 'false').lower() in ('1', 'true', 'yes')
+        self.hedge_delay = float(os.getenv('OLLAMA_HEDGE_DELAY', '2'))
+        # Upper bounds for connecting and for a whole request; the current
+        # query's deadline may cut a request shorter
+        self.connect_timeout = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '5'))
+        self.request_timeout = float(os.getenv('OLLAMA_REQUEST_TIMEOUT', '300'))
         self.model = model or os.getenv('OLLAMA_MODEL', 'llama3.2')
         self.session: Optional[aiohttp.ClientSession] = None
 
-        logger.info(f"Ollama client initialized: {self.base_url} with model {self.model}")
+        # Sent with every request: keep_alive stops the model being unloaded
+        # between bursts, and num_ctx must not vary between calls or Ollama
+        # reloads the model
+        keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+        self.keep_alive: Optional[Union[str, int]] = int(keep_alive) if keep_alive.lstrip('-').isdigit() else keep_alive or None
+        num_ctx = os.getenv('OLLAMA_NUM_CTX')
+        self.default_options: Dict[str, Any] = {"num_ctx": int(num_ctx)} if num_ctx else {}
+
+        # Health is tracked from real traffic; an explicit probe only runs
+        # when the cached state is older than health_ttl
+        self.health_ttl = float(os.getenv('OLLAMA_HEALTH_TTL', '30'))
+        self._healthy: Optional[bool] = None
+        self._health_checked_at = 0.0
+
+        # Circuit breaker: after failure_threshold consecutive failures with
+        # every backend down, calls fail fast until reset_timeout has passed,
+        # then a single trial call goes through (others keep failing fast
+        # until it has an outcome). Each backend is also marked down for
+        # reset_timeout on its own errors, so one bad server among several
+        # only diverts traffic.
+        self.failure_threshold = int(os.getenv('OLLAMA_FAILURE_THRESHOLD', '3'))
+        self.reset_timeout = float(os.getenv('OLLAMA_RESET_TIMEOUT', '30'))
+        self._consecutive_failures = 0
+        self._circuit_opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+        logger.info(f"Ollama client initialized: {', '.join(b.url for b in self.backends)} with model {self.model}")
+
+    @property
+    def base_url(self) -> str:
+        return self.backends[0].url
+
+    @base_url.setter
+    def base_url(self, value: str):
+        self.backends = [OllamaBackend(url.strip().rstrip('/')) for url in value.split(',') if url.strip()]
+
+    def _timeout(self) -> aiohttp.ClientTimeout:
+        """Timeout for one request: ``request_timeout`` or whatever is left of the current deadline."""
+        total = min(remaining(), self.request_timeout)
+        # aiohttp treats a zero timeout as no timeout at all
+        if total <= 0:
+            raise DeadlineExceeded("Deadline passed before the Ollama request was sent")
+        return aiohttp.ClientTimeout(total=total, connect=min(total, self.connect_timeout))
+
+    def _timed_out(self, backend: OllamaBackend, what: str) -> Exception:
+        """The error to raise for a request to ``backend`` that timed out.
+
+        If the query's deadline ran out it is ``DeadlineExceeded``, which says
+        nothing about the server. Otherwise the backend stalled past
+        ``connect_timeout``/``request_timeout`` and is marked down like one
+        that errors.
+        """
+        # Timers may fire a hair before the deadline they were set from
+        if remaining() <= 0.01:
+            return DeadlineExceeded(f"{what} to {backend.url} ran out of time")
+        logger.error(f"{what} to {backend.url} timed out")
+        backend.record_error(down_for=self.reset_timeout)
+        return Exception(f"{what} to {backend.url} timed out")
+
+    def _pick(self, exclude: Optional[OllamaBackend] = None) -> Optional[OllamaBackend]:
+        """The least loaded backend, preferring reachable ones."""
+        candidates = [backend for backend in self.backends if backend is not exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (not b.available, b.in_flight, b.mean_latency()))
+
+    def get_backend_stats(self) -> List[Dict[str, Any]]:
+        return [backend.get_stats() for backend in self.backends]
 
     async def __aenter__(self):
         await self.connect()
@@ -28,7 +158,8 @@ class OllamaClient:
     async def connect(self):
         """Initialize HTTP session."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, connect=self.connect_timeout))
             logger.info("Connected to Ollama server")
 
     async def disconnect(self):
@@ -38,71 +169,263 @@ class OllamaClient:
             self.session = None
             logger.info("Disconnected from Ollama server")
 
-    async def generate(self, prompt: str, **kwargs) -> str:
+    def _record_success(self):
+        self._consecutive_failures = 0
+        if self._circuit_opened_at is not None:
+            logger.info("Ollama circuit closed")
+        self._circuit_opened_at = None
+        self._healthy = True
+        self._health_checked_at = time.monotonic()
+
+    def _record_failure(self):
+        # A failing backend is routed around on its own (OllamaBackend.down_until);
+        # the circuit only counts failures while no backend is left to try
+        if any(backend.available for backend in self.backends):
+            return
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.failure_threshold:
+            if self._circuit_opened_at is None:
+                logger.warning(f"Ollama circuit opened after {self._consecutive_failures} consecutive failures")
+            # (Re)start the cool-down, including after a failed half-open trial
+            self._circuit_opened_at = time.monotonic()
+            self._healthy = False
+            self._health_checked_at = time.monotonic()
+        else:
+            # Too few failures to call it an outage: don't cache "unhealthy",
+            # let the next check_health probe again
+            self._health_checked_at = 0.0
+
+    @property
+    def circuit_open(self) -> bool:
+        """True while calls should fail fast (half-open once reset_timeout passes)."""
+        if self._circuit_opened_at is None:
+            return False
+        return time.monotonic() - self._circuit_opened_at < self.reset_timeout
+
+    def _check_circuit(self) -> bool:
+        """Raise while calls should fail fast; True if this call is the half-open trial.
+
+        The caller must clear ``_trial_in_flight`` once a trial call is over.
+        """
+        if self._circuit_opened_at is None:
+            return False
+        if self.circuit_open or self._trial_in_flight:
+            raise Exception("Ollama server unavailable (circuit open)")
+        self._trial_in_flight = True
+        return True
+
+    def _payload(self, data: Dict[str, Any], format: Optional[Union[str, Dict[str, Any]]] = None,
+                 options: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """Add the model, ``keep_alive`` and optional ``format``/``options`` to a request body.
+
+        ``format`` is ``"json"`` or a JSON schema the output is constrained
+        to; ``options`` are model parameters such as ``num_predict``, layered
+        over the client's default options. A ``model`` keyword overrides the
+        client's model for this request.
+        """
+        payload = {"model": self.model, **data, **kwargs}
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        if format is not None:
+            payload["format"] = format
+        merged = {**self.default_options, **payload.get("options", {}), **(options or {})}
+        if merged:
+            payload["options"] = merged
+        return payload
+
+    async def generate(self, prompt: str, format: Optional[Union[str, Dict[str, Any]]] = None,
+                       options: Optional[Dict[str, Any]] = None, **kwargs) -> str:
         """Generate text using Ollama."""
         if not self.session:
             await self.connect()
 
-        url = f"{self.base_url}/api/generate"
+        data = self._payload({"prompt": prompt, "stream": False}, format, options, **kwargs)
+        result = await self._request("/api/generate", data)
+        return result.get('response', '')
+
+    async def chat(self, messages: list, format: Optional[Union[str, Dict[str, Any]]] = None,
+                   options: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        """Chat with Ollama using conversation format."""
+        if not self.session:
+            await self.connect()
 
-        data = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            **kwargs
-        }
+        data = self._payload({"messages": messages, "stream": False}, format, options, **kwargs)
+        result = await self._request("/api/chat", data)
+        return result.get('message', {}).get('content', '')
 
+    async def _post(self, backend: OllamaBackend, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """POST ``data`` to one backend and return the JSON response."""
+        backend.in_flight += 1
+        start = time.perf_counter()
         try:
-            async with self.session.post(url, json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result.get('response', '')
-                else:
+            async with self.session.post(f"{backend.url}{path}", json=data, timeout=self._timeout()) as response:
+                if response.status != 200:
                     error_text = await response.text()
-                    logger.error(f"Ollama API error: {response.status} - {error_text}")
+                    logger.error(f"Ollama API error from {backend.url}: {response.status} - {error_text}")
+                    # A failing server answers fast, so it would keep looking
+                    # idle and quick to _pick; route around it instead
+                    backend.record_error(down_for=self.reset_timeout)
                     raise Exception(f"Ollama API error: {response.status}")
-
+                result = await response.json()
+        except asyncio.TimeoutError:
+            # Also aiohttp's connect and socket read timeouts (ClientErrors too)
+            raise self._timed_out(backend, "Ollama request")
         except aiohttp.ClientError as e:
-            logger.error(f"Network error connecting to Ollama: {e}")
+            logger.error(f"Network error connecting to Ollama at {backend.url}: {e}")
+            # Unreachable: route around it until the circuit reset timeout
+            backend.record_error(down_for=self.reset_timeout)
             raise Exception(f"Failed to connect to Ollama server: {e}")
+        except asyncio.CancelledError:
+            # A losing hedge copy: its time so far is a lower bound on its
+            # latency, and keeps a slow backend from looking idle and fast
+            backend.latencies.append(time.perf_counter() - start)
+            raise
+        finally:
+            backend.in_flight -= 1
 
-    async def chat(self, messages: list, **kwargs) -> str:
-        """Chat with Ollama using conversation format."""
+        backend.record_success(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, primary: OllamaBackend, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Send to ``primary``; if it is slower than usual, race a copy on another backend."""
+        tasks = [asyncio.create_task(self._post(primary, path, data))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=primary.hedge_delay(self.hedge_delay))
+            secondary = self._pick(exclude=primary)
+            if done or secondary is None or not secondary.available:
+                return await tasks[0]
+
+            logger.info(f"Hedging slow Ollama request on {primary.url} with {secondary.url}")
+            tasks.append(asyncio.create_task(self._post(secondary, path, data)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        OLLAMA_HEDGES.inc(labels={'winner': 'primary' if task is tasks[0] else 'hedge'})
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the losing copy (or both, if the caller was cancelled)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _request(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a non-streaming request on the least loaded backend, hedged if enabled."""
         if not self.session:
             await self.connect()
 
-        url = f"{self.base_url}/api/chat"
+        trial = self._check_circuit()
+
+        backend = self._pick()
+        try:
+            if self.hedge and len(self.backends) > 1:
+                result = await self._hedged(backend, path, data)
+            else:
+                result = await self._post(backend, path, data)
+        except DeadlineExceeded:
+            # Out of query time isn't evidence the server is down (a backend
+            # that stalls past request_timeout raises a plain Exception)
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+        self._record_success()
+        record_ollama_stats(result, data["model"])
+        return result
 
-        data = {
-            "model": self.model,
-            "messages": messages,
-            "stream": False,
-            **kwargs
-        }
+    async def _stream(self, path: str, data: Dict[str, Any], extract) -> AsyncIterator[str]:
+        """POST ``data`` with streaming on and yield text from each NDJSON chunk.
 
+        Streams go to the least loaded backend but are never hedged, since
+        tokens may already have reached the caller.
+        """
+        if not self.session:
+            await self.connect()
+
+        trial = self._check_circuit()
+
+        backend = self._pick()
+        backend.in_flight += 1
+        start = time.perf_counter()
         try:
-            async with self.session.post(url, json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result.get('message', {}).get('content', '')
-                else:
+            async with self.session.post(f"{backend.url}{path}", json={**data, "stream": True},
+                                         timeout=self._timeout()) as response:
+                if response.status != 200:
                     error_text = await response.text()
-                    logger.error(f"Ollama chat API error: {response.status} - {error_text}")
-                    raise Exception(f"Ollama chat API error: {response.status}")
+                    logger.error(f"Ollama streaming API error from {backend.url}: {response.status} - {error_text}")
+                    backend.record_error(down_for=self.reset_timeout)
+                    self._record_failure()
+                    raise Exception(f"Ollama API error: {response.status}")
+
+                # One JSON object per line; the last one has "done": true
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        backend.record_error(down_for=self.reset_timeout)
+                        self._record_failure()
+                        raise Exception(f"Ollama API error: {chunk['error']}")
+                    text = extract(chunk)
+                    if text:
+                        yield text
+                    if chunk.get("done"):
+                        # The closing chunk carries the timing and token counts
+                        record_ollama_stats(chunk, data["model"])
+                        break
 
+                backend.record_success(time.perf_counter() - start)
+                self._record_success()
+
+        except asyncio.TimeoutError:
+            error = self._timed_out(backend, "Ollama stream")
+            if not isinstance(error, DeadlineExceeded):
+                self._record_failure()
+            raise error
         except aiohttp.ClientError as e:
-            logger.error(f"Network error in chat: {e}")
+            logger.error(f"Network error streaming from Ollama at {backend.url}: {e}")
+            backend.record_error(down_for=self.reset_timeout)
+            self._record_failure()
             raise Exception(f"Failed to connect to Ollama server: {e}")
+        finally:
+            backend.in_flight -= 1
+            if trial:
+                self._trial_in_flight = False
+
+    async def generate_stream(self, prompt: str, format: Optional[Union[str, Dict[str, Any]]] = None,
+                              options: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncIterator[str]:
+        """Generate text using Ollama, yielding tokens as they arrive."""
+        data = self._payload({"prompt": prompt}, format, options, **kwargs)
+
+        async for text in self._stream("/api/generate", data, lambda chunk: chunk.get('response', '')):
+            yield text
+
+    async def chat_stream(self, messages: list, format: Optional[Union[str, Dict[str, Any]]] = None,
+                          options: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncIterator[str]:
+        """Chat with Ollama, yielding the reply's tokens as they arrive."""
+        data = self._payload({"messages": messages}, format, options, **kwargs)
+
+        async for text in self._stream("/api/chat", data, lambda chunk: chunk.get('message', {}).get('content', '')):
+            yield text
 
     async def list_models(self) -> list:
         """List available models."""
         if not self.session:
             await self.connect()
 
-        url = f"{self.base_url}/api/tags"
+        url = f"{self._pick().url}/api/tags"
 
         try:
-            async with self.session.get(url) as response:
+            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=self.connect_timeout)) as response:
                 if response.status == 200:
                     result = await response.json()
                     return result.get('models', [])
@@ -114,10 +437,67 @@ class OllamaClient:
             logger.error(f"Network error listing models: {e}")
             return []
 
+    async def warm_up(self, messages: Optional[list] = None, model: Optional[str] = None,
+                      options: Optional[Dict[str, Any]] = None) -> bool:
+        """Load ``model`` (default: the client's) ahead of the first real request.
+
+        With ``messages`` (e.g. a stage's system prompt) they are also
+        prefilled so the first call can reuse the cached prefix. ``options``
+        should be those the real requests send: Ollama reloads the model when
+        load-time options such as ``num_ctx`` differ.
+        """
+        model = model or self.model
+        try:
+            if messages:
+                await self.chat(messages, options={**(options or {}), "num_predict": 1}, model=model)
+            else:
+                # An empty prompt only loads the model
+                await self.generate('', options=options, model=model)
+            logger.info(f"Warmed up model {model}")
+            return True
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+            return False
+
+    async def _ping_backend(self, backend: OllamaBackend) -> bool:
+        try:
+            async with self.session.get(f"{backend.url}/api/version",
+                                        timeout=aiohttp.ClientTimeout(total=self.connect_timeout)) as response:
+                reachable = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Network error probing Ollama at {backend.url}: {e}")
+            reachable = False
+        backend.down_until = 0.0 if reachable else time.monotonic() + self.reset_timeout
+        return reachable
+
+    async def ping(self) -> bool:
+        """Lightweight liveness probe (``GET /api/version``) of every backend; True if any answers."""
+        if not self.session:
+            await self.connect()
+
+        results = await asyncio.gather(*(self._ping_backend(backend) for backend in self.backends))
+        return any(results)
+
     async def check_health(self) -> bool:
-        """Check if Ollama server is healthy."""
+        """Check if Ollama server is healthy.
+
+        Answers from the cached state while it is fresher than ``health_ttl``
+        (real generate/chat calls keep it fresh) and returns False without a
+        network call while the circuit is open.
+        """
+        if self.circuit_open:
+            return False
+
+        if self._healthy is not None and time.monotonic() - self._health_checked_at < self.health_ttl:
+            return self._healthy
+
         try:
-            models = await self.list_models()
-            return len(models) > 0
+            healthy = await self.ping()
         except Exception:
-            return False
\ No newline at end of file
+            healthy = False
+
+        if healthy:
+            self._record_success()
+        else:
+            self._record_failure()
+        return healthy
@@ -0,0 +1,66 @@
+"""
+Chat prompts for each LLM stage.
+
+Every stage sends its fixed instructions as a byte-identical system message
+first and puts the per-request content (query, date, meal data) in the last
+user message, so Ollama can reuse the KV cache for the shared prefix instead
+of re-running prefill on the instructions every call.
+"""
+
+from typing import Dict, List
+
+Messages = List[Dict[str, str]]
+
+ANALYSIS_SYSTEM = """You are a calorie tracking assistant. Analyze the user's query and determine what action to take.
+
+Available tools:
+- get_user_meals: Get meals for a specific user (requires user_id, optional date or date range)
+
+Respond with a JSON object containing:
+{
+  "intent": "get_meals" | "other",
+  "user_id": number or null,
+  "date": "YYYY-MM-DD" or null (use today's date if mentioned, yesterday if mentioned),
+  "date_from": "YYYY-MM-DD" or null (first day, when the query covers several days, e.g. "this month"),
+  "date_to": "YYYY-MM-DD" or null (last day of that range),
+  "needs_tool": boolean,
+  "response": "brief explanation of what you'll do"
+}
+
+If the query is about meals, set intent to "get_meals" and extract user_id if mentioned.
+If no user_id is mentioned, use 1 as default.
+If date is mentioned, parse it appropriately, relative to the date given with the query."""
+
+ANSWER_SYSTEM = """You are a calorie tracking assistant. You can get meal information for users, analyze meal patterns and provide insights, and help with calorie tracking questions.
+
+When a message includes a meal summary (totals, per-day or per-week and per-meal-type breakdowns, recent meals), format it into a natural, user-friendly response that summarizes the meal information. If there are no meals, explain that clearly.
+
+Otherwise provide a helpful response. If the question is about meals, suggest they ask about specific users.
+
+Use the earlier conversation, if any, to make sense of follow-up questions."""
+
+SUMMARY_SYSTEM = """Summarize the conversation between a user and a calorie tracking assistant in a few sentences. Keep the dates, meals and numbers the user asked about."""
+
+def analysis_messages(query: str, today: str) -> Messages:
+    return [
+        {'role': 'system', 'content': ANALYSIS_SYSTEM},
+        {'role': 'user', 'content': f'Today is {today}.\nUser query: "{query}"'},
+    ]
+
+def meal_answer_content(query: str, meal_summary: str) -> str:
+    return f'Meal summary: {meal_summary}\n\nUser asked: "{query}"'
+
+def general_answer_content(query: str) -> str:
+    return f'User asked: "{query}"'
+
+def answer_messages(content: str) -> Messages:
+    return [
+        {'role': 'system', 'content': ANSWER_SYSTEM},
+        {'role': 'user', 'content': content},
+    ]
+
+def summary_messages(summary: str, transcript: str) -> Messages:
+    return [
+        {'role': 'system', 'content': SUMMARY_SYSTEM},
+        {'role': 'user', 'content': f'Earlier summary: {summary or "none"}\n\n{transcript}'},
+    ]
@@ -0,0 +1,32 @@
+import re
+from datetime import date
+
+# Questions about what was eaten need the meal rows; totals, averages and
+# trends only need sums, which the rollup tools compute in SQLite
+ITEM_WORDS = re.compile(r"\b(ate|eat|eaten|eating|meals?|foods?|dishes|list|breakfast|lunch|dinner|snacks?)\b")
+# Questions only about calorie or macro totals
+TOTAL_WORDS = re.compile(r"\b(calories|kcal|macros?|protein|carbs|fats?|totals?)\b")
+
+def plan_meal_query(query: str, date_from: str, date_to: str, max_row_days: int = 7,
+                    max_daily_days: int = 62) -> str:
+    """Pick the cheapest MCP tool that answers a meal question over ``date_from``..``date_to``.
+
+    Dates are inclusive ``YYYY-MM-DD`` strings. Returns the tool name:
+
+    - ``get_meal_macros`` for a single day's calorie or macro totals;
+    - ``get_user_meals`` for any other single-day question, or up to
+      ``max_row_days`` days when it is about the meals themselves;
+    - ``get_daily_totals`` for ranges up to ``max_daily_days`` days;
+    - ``get_weekly_totals`` for anything longer.
+    """
+    days = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days + 1
+    query = query.lower()
+    about_items = ITEM_WORDS.search(query)
+
+    if days <= 1 and not about_items and TOTAL_WORDS.search(query):
+        return "get_meal_macros"
+    if days <= 1 or (days <= max_row_days and about_items):
+        return "get_user_meals"
+    if days <= max_daily_days:
+        return "get_daily_totals"
+    return "get_weekly_totals"
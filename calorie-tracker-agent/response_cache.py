@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = registry.counter('agent_cache_requests_total', 'Agent cache lookups, by cache and result')
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share an entry."""
+    return re.sub(r'\s+', ' ', query.lower()).strip().rstrip('?!. ')
+
+def digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+def cache_key(*parts: Any) -> str:
+    return json.dumps(parts, separators=(',', ':'))
+
+class ResponseCache:
+    """Size-bounded LRU cache with per-entry TTL and an optional SQLite tier.
+
+    Values must be JSON-serializable. With ``db_path`` set, entries are also
+    written to a table named after the cache, and memory misses fall back to
+    it so a restarted agent doesn't start cold. Inside an event loop those
+    writes are batched and committed in a worker thread; lookups use their
+    own connection and, with the database in WAL mode, don't wait for them.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 600.0, db_path: Optional[str] = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "persistent_hits": 0, "evictions": 0}
+        self.db: Optional[sqlite3.Connection] = None
+        # Read-only connection for lookups on the loop
+        self._reader: Optional[sqlite3.Connection] = None
+        # Serializes the worker thread's writes with clear() and close()
+        self._db_lock = threading.Lock()
+        # key -> (value JSON, expires) not yet written to the database
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Bumped by clear() so a batch taken before it is dropped, not written
+        self._generation = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS cache_{self.name} "
+                            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            self.db.execute(f"DELETE FROM cache_{self.name} WHERE expires <= ?", (time.time(),))
+            self.db.commit()
+            self._reader = sqlite3.connect(db_path, check_same_thread=False)
+            logger.info(f"Cache {self.name} persisting to {db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Cache {self.name} persistent tier disabled: {e}")
+            self.db = self._reader = None
+
+    def _record(self, result: str):
+        CACHE_REQUESTS.inc(labels={'cache': self.name, 'result': result})
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > now:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self._record('hit')
+                return value
+            del self.entries[key]
+
+        value = self._load(key, now)
+        if value is not None:
+            self.stats["hits"] += 1
+            self.stats["persistent_hits"] += 1
+            self._record('persistent_hit')
+            return value
+
+        self.stats["misses"] += 1
+        self._record('miss')
+        return None
+
+    def _load(self, key: str, now: float) -> Optional[Any]:
+        if self.db is None:
+            return None
+        # Evicted from memory before its batch was written
+        row = self._pending.get(key)
+        try:
+            if row is None:
+                # Sees the last committed batch; a commit in progress doesn't block it
+                row = self._reader.execute(f"SELECT value, expires FROM cache_{self.name} WHERE key = ?",
+                                           (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Cache {self.name} read failed: {e}")
+            return None
+        if row is None or row[1] <= now:
+            return None
+
+        value = json.loads(row[0])
+        self._store(key, row[1], value)
+        return value
+
+    def _store(self, key: str, expires: float, value: Any):
+        self.entries[key] = (expires, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self._store(key, expires, value)
+        if self.db is not None:
+            self._pending[key] = (json.dumps(value), expires)
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        # A running flush picks up entries added while it writes
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take_pending(), self._generation)
+            return
+        self._flush_task = loop.create_task(self._flush())
+
+    def _take_pending(self) -> Dict[str, Tuple[str, float]]:
+        batch, self._pending = self._pending, {}
+        return batch
+
+    async def _flush(self):
+        while self._pending:
+            await asyncio.to_thread(self._write, self._take_pending(), self._generation)
+
+    def _write(self, batch: Dict[str, Tuple[str, float]], generation: int):
+        with self._db_lock:
+            if self.db is None or not batch or generation != self._generation:
+                return
+            try:
+                self.db.executemany(f"INSERT OR REPLACE INTO cache_{self.name} (key, value, expires) VALUES (?, ?, ?)",
+                                    [(key, value, expires) for key, (value, expires) in batch.items()])
+                self.db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Cache {self.name} write of {len(batch)} entries failed: {e}")
+
+    def clear(self):
+        self.entries.clear()
+        self._pending.clear()
+        if self.db is not None:
+            with self._db_lock:
+                self._generation += 1
+                self.db.execute(f"DELETE FROM cache_{self.name}")
+                self.db.commit()
+
+    def close(self):
+        """Write any batched entries and close the database."""
+        if self.db is not None:
+            self._write(self._take_pending(), self._generation)
+            with self._db_lock:
+                self.db.close()
+                self._reader.close()
+                self.db = self._reader = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "size": len(self.entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
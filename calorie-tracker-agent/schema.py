@@ -0,0 +1,23 @@
+"""
+The calorie tracker's SQLite schema, read from src/lib/schema: the same
+files src/lib/db.ts runs, so stand-ins, tools and tests build the app's
+tables, index and triggers rather than a copy of them.
+"""
+
+import os
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'lib', 'schema')
+
+def load_schema(part: str) -> str:
+    """SQL script ``part`` (tables, indexes, daily_totals or data_versions)."""
+    with open(os.path.join(SCHEMA_DIR, f'{part}.sql')) as f:
+        return f.read()
+
+# users and meals
+TABLES = load_schema('tables')
+# idx_meals_user_created
+INDEXES = load_schema('indexes')
+# The daily_totals rollup and the triggers that keep it current
+DAILY_TOTALS = load_schema('daily_totals')
+# Per-user data versions and the triggers that bump them
+DATA_VERSIONS = load_schema('data_versions')
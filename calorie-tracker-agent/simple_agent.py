@@ -1,20 +1,102 @@
 import asyncio
 import logging
-import json
+import os
 import sys
-from mcp_client import MCPClient
+import time
+from contextlib import aclosing
+from mcp_client import token_user_id
+from mcp_pool import MCPClientPool
 from ollama_client import OllamaClient
-from datetime import datetime
+from model_router import ModelRouter
+from intent_parser import parse_intent, extract_json, INTENT_SCHEMA
+from meal_summary import digest_meal_data, render_meal_summary
+from meal_table import MealTable, decode_macros
+from query_planner import plan_meal_query
+from deadline import DeadlineExceeded, deadline, deadline_at, remaining
+from conversation import Conversation, ConversationStore
+from prompts import (ANALYSIS_SYSTEM, ANSWER_SYSTEM, analysis_messages, answer_messages, general_answer_content,
+                     meal_answer_content, summary_messages)
+from response_cache import ResponseCache, cache_key, digest, normalize_query
+from metrics import QueryTrace, record_span, record_trace, span, start_trace, finish_trace, traced
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Union
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Canned replies for queries the agent couldn't answer
+UNAVAILABLE_REPLY = "I'm sorry, but I'm currently unable to process your request. My language model service is not available. Please try again later."
+MISUNDERSTOOD_REPLY = "I'm having trouble understanding your request. Could you please rephrase it?"
+ERROR_REPLY = "I'm experiencing technical difficulties. Please try again in a moment."
+TIMEOUT_REPLY = "Sorry, that took too long to answer. Please try again in a moment."
+# Answer to general questions when there's no time left for the LLM
+GENERAL_FALLBACK_REPLY = ("I can look up the meals you've logged and summarize your calories and macros. "
+                          "Try asking \"What did I eat today?\" or \"How many calories did I have this week?\"")
+
+# Today's lookups started speculatively alongside the intent LLM call
+PREFETCH_TOOLS = ("get_user_meals", "get_meal_macros")
+
+def is_error_reply(response: str) -> bool:
+    """True if ``response`` is one of the agent's failure replies rather than an answer."""
+    return response.startswith((UNAVAILABLE_REPLY, MISUNDERSTOOD_REPLY, ERROR_REPLY, TIMEOUT_REPLY))
+
 class CalorieTrackerAgent:
-    def __init__(self, mcp_host: str = '127.0.0.1', mcp_port: int = 3001, jwt_token: str = None):
-        self.mcp_client = MCPClient(mcp_host, mcp_port, jwt_token)
+    def __init__(self, mcp_host: str = '127.0.0.1', mcp_port: int = 3001, jwt_token: str = None,
+                 speculative_prefetch: Optional[bool] = None):
+        self.mcp_client = MCPClientPool(mcp_host, mcp_port, jwt_token)
         self.ollama_client = OllamaClient()
-        self.conversation_history = []
+        # Which model each LLM stage runs on (AGENT_STAGE_MODELS)
+        self.models = ModelRouter(self.ollama_client)
+        # Multi-turn memory for callers that pass a session_id
+        self.conversations = ConversationStore(
+            ANSWER_SYSTEM, self._summarize_turns,
+            token_budget=int(os.getenv('AGENT_HISTORY_TOKENS', '1024')),
+            max_sessions=int(os.getenv('AGENT_MAX_SESSIONS', '1000')),
+            idle_ttl=float(os.getenv('AGENT_SESSION_TTL', '1800')),
+        )
+
+        # Fetch today's meals and macros for the token's user while the LLM
+        # is still classifying the query; most chatbot traffic ends up
+        # asking for one of them anyway
+        if speculative_prefetch is None:
+            speculative_prefetch = os.getenv('AGENT_SPECULATIVE_PREFETCH', 'false').lower() in ('1', 'true', 'yes')
+        self.speculative_prefetch = speculative_prefetch
+        self.prefetch_stats = {"hits": 0, "misses": 0}
+
+        # Repeated questions skip the LLM: the intent cache holds parsed
+        # analyses per (day, query) and the answer cache final answers per
+        # (user, tool, date range, query, hash of the tool result)
+        cache_size = int(os.getenv('AGENT_CACHE_SIZE', '1024'))
+        cache_db = os.getenv('AGENT_CACHE_DB') or None
+        self.intent_cache = ResponseCache('intent', cache_size, float(os.getenv('AGENT_INTENT_CACHE_TTL', '3600')), cache_db)
+        self.answer_cache = ResponseCache('answer', cache_size, float(os.getenv('AGENT_ANSWER_CACHE_TTL', '600')), cache_db)
+
+        # The intent object is ~60 tokens; the cap stops runaway generations
+        # and the schema makes the model stop once the object closes
+        self.intent_options = {"num_predict": int(os.getenv('AGENT_INTENT_NUM_PREDICT', '128')), "temperature": 0}
+
+        # Every query must be answered within query_timeout seconds; an LLM
+        # stage is skipped in favour of a local answer when less than
+        # min_llm_seconds remain
+        self.query_timeout = float(os.getenv('AGENT_QUERY_TIMEOUT', '60'))
+        self.min_llm_seconds = float(os.getenv('AGENT_MIN_LLM_SECONDS', '3'))
+
+        # Meal questions fetch rows for up to plan_row_days days, per-day
+        # totals up to plan_daily_days and per-week totals beyond that
+        self.plan_row_days = int(os.getenv('AGENT_PLAN_ROW_DAYS', '7'))
+        self.plan_daily_days = int(os.getenv('AGENT_PLAN_DAILY_DAYS', '62'))
+
+        # Meal rows are fetched meal_page_size at a time, newest first, and
+        # no more than max_meal_rows of them per question
+        self.meal_page_size = int(os.getenv('AGENT_MEAL_PAGE_SIZE', '200'))
+        self.max_meal_rows = int(os.getenv('AGENT_MAX_MEAL_ROWS', '2000'))
+
+        # Zone that "today" and every date sent to the MCP tools are in; day
+        # boundaries are the server's UTC days when unset
+        self.timezone = os.getenv('AGENT_TIMEZONE') or None
+        self.zone = ZoneInfo(self.timezone) if self.timezone else None
         logger.info("Calorie Tracker Agent initialized")
 
     async def initialize(self):
@@ -27,134 +109,427 @@ class CalorieTrackerAgent:
             is_healthy = await self.ollama_client.check_health()
             if not is_healthy:
                 logger.warning("Ollama server not healthy, agent will work in limited mode")
+            else:
+                # Load the models and prefill their stage instructions so the
+                # first query pays neither cold-load nor prefill for them
+                with span("warm_up"):
+                    await self.models.warm_up({
+                        "answer": [{'role': 'system', 'content': ANSWER_SYSTEM}],
+                        "analysis": [{'role': 'system', 'content': ANALYSIS_SYSTEM}],
+                    })
 
             logger.info("Calorie Tracker Agent initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize: {e}")
             raise
 
-    async def get_user_meals(self, user_id: str, date: str = None) -> str:
-        """Get meals for a user on a specific date."""
-        if date is None:
-            date = datetime.now().strftime("%Y-%m-%d")
-
-        logger.info(f"Getting meals for user {user_id} on date {date}")
+    async def get_user_meals(self, user_id: str, date: str = None, jwt_token: str = None,
+                             date_from: str = None, date_to: str = None) -> Union[MealTable, str]:
+        """Get meals for a user on a specific date (default today), or between ``date_from`` and ``date_to``."""
+        if not (date_from and date_to):
+            date_from = date_to = date or self._today()
+        return await self.call_meal_tool("get_user_meals", user_id, date_from, date_to, jwt_token)
+
+    async def call_meal_tool(self, tool: str, user_id: str, date_from: str, date_to: str,
+                             jwt_token: str = None) -> Union[MealTable, str]:
+        """Call a meal tool for ``date_from`` to ``date_to`` inclusive.
+
+        Returns the result rows as a ``MealTable``; failures come back as
+        ``Error: ...`` text.
+        """
+        arguments = {"user_id": user_id, "date_from": date_from, "date_to": date_to}
+        if self.timezone:
+            arguments["timezone"] = self.timezone
+        logger.info(f"Calling {tool} for user {user_id} from {date_from} to {date_to}")
 
         try:
-            result = await self.mcp_client.call_tool("get_user_meals", {
-                "user_id": user_id,
-                "date": date
-            })
-            return result
+            if tool == "get_user_meals":
+                return await self._fetch_meals(arguments, jwt_token)
+            if tool == "get_meal_macros":
+                return decode_macros(await self.mcp_client.call_tool(tool, arguments, jwt_token=jwt_token), date_from)
+            return await self.mcp_client.call_tool_table(tool, arguments, jwt_token=jwt_token)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            logger.error(f"Error getting user meals: {e}")
+            logger.error(f"Error calling {tool}: {e}")
             return f"Error: {e}"
 
-    async def process_query(self, query: str) -> str:
-        """Process a user query using LLM for intelligent understanding."""
-        logger.info(f"Processing query: {query}")
+    async def _fetch_meals(self, arguments: Dict[str, Any], jwt_token: str = None) -> MealTable:
+        """get_user_meals rows, read page by page and cut off after ``max_meal_rows``."""
+        meals = MealTable()
+        pages = self.mcp_client.iter_tool_pages("get_user_meals", arguments, jwt_token=jwt_token,
+                                                page_size=self.meal_page_size)
+        async with aclosing(pages):
+            async for page in pages:
+                meals.extend(page)
+                if len(meals) >= self.max_meal_rows:
+                    meals.truncate(self.max_meal_rows)
+                    logger.warning(f"Stopped reading meals at {self.max_meal_rows} rows for "
+                                   f"{arguments['date_from']} to {arguments['date_to']}")
+                    break
+        return meals
+
+    def _today(self) -> str:
+        """Today's date (YYYY-MM-DD) in ``AGENT_TIMEZONE``, or the host's local date."""
+        return datetime.now(self.zone).strftime("%Y-%m-%d")
 
+    def _date_range(self, analysis: Dict[str, Any]) -> Tuple[str, str]:
+        """The inclusive ``(date_from, date_to)`` an analysis asks for: its range, its date, or today."""
+        today = self._today()
+        date_from = analysis.get("date_from") or analysis.get("date") or today
+        date_to = analysis.get("date_to") or analysis.get("date") or date_from
         try:
-            # Check if Ollama is available
+            start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+        except (TypeError, ValueError):
+            # The LLM analysis can return anything in these fields
+            logger.warning(f"Invalid dates in analysis ({date_from!r}, {date_to!r}), using today")
+            return today, today
+        return (date_from, date_to) if start <= end else (date_to, date_from)
+
+    def _user_id(self, jwt_token: str = None, analysis: Optional[Dict[str, Any]] = None) -> str:
+        """User to call the meal tools for: the token's, which the MCP server scopes every call to, else the one the query named."""
+        user_id = token_user_id(jwt_token or self.mcp_client.jwt_token)
+        if user_id is None:
+            user_id = (analysis or {}).get("user_id") or 1
+        return str(user_id)
+
+    def _start_prefetch(self, jwt_token: str = None) -> Optional[Dict[str, asyncio.Task]]:
+        """Speculatively start today's meal and macro lookups for the token's user.
+
+        Issued with the same arguments the get_meals path uses for "today",
+        so whichever of them the plan picks can use its result as is. None
+        when the token names no user.
+        """
+        user_id = token_user_id(jwt_token or self.mcp_client.jwt_token)
+        if user_id is None:
+            return None
+        today = self._today()
+        return {tool: asyncio.create_task(self.call_meal_tool(tool, user_id, today, today, jwt_token))
+                for tool in PREFETCH_TOOLS}
+
+    def _cancel_prefetch(self, prefetch: Dict[str, asyncio.Task], keep: Optional[str] = None):
+        for tool, task in prefetch.items():
+            if tool != keep:
+                task.cancel()
+
+    def _discard_prefetch(self, prefetch: Optional[Dict[str, asyncio.Task]]):
+        if prefetch is None:
+            return
+        self._cancel_prefetch(prefetch)
+        self.prefetch_stats["misses"] += 1
+        logger.info(f"Speculative prefetch miss ({self.prefetch_stats})")
+
+    async def _resolve_prefetch(self, prefetch: Optional[Dict[str, asyncio.Task]], analysis: Dict[str, Any],
+                                query: str) -> Optional[Union[MealTable, str]]:
+        """Return the prefetched result the analysis's plan asks for, cancelling the other lookups."""
+        if prefetch is None:
+            return None
+
+        today = self._today()
+        wants_today = (
+            analysis.get("intent") == "get_meals"
+            and analysis.get("needs_tool", False)
+            and self._date_range(analysis) == (today, today)
+        )
+        tool = plan_meal_query(query, today, today, self.plan_row_days, self.plan_daily_days) if wants_today else None
+        if tool not in prefetch:
+            self._discard_prefetch(prefetch)
+            return None
+
+        self._cancel_prefetch(prefetch, keep=tool)
+        self.prefetch_stats["hits"] += 1
+        logger.info(f"Speculative prefetch hit for {tool} ({self.prefetch_stats})")
+        with span("mcp_tool"):
+            return await prefetch[tool]
+
+    async def _llm_analysis(self, query: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Ask the LLM to classify the query.
+
+        Decoding is constrained to ``INTENT_SCHEMA``; output that still isn't
+        valid JSON (older Ollama, truncation) goes through ``extract_json``.
+        Returns ``(analysis, None)``, or ``(None, reply)`` when nothing usable
+        can be recovered.
+        """
+        messages = analysis_messages(query, self._today())
+
+        with span("analysis_llm"):
+            analysis_response = await self.models.chat("analysis", messages, format=INTENT_SCHEMA,
+                                                       options=self.intent_options)
+        logger.debug(f"LLM analysis raw response: {repr(analysis_response)}")
+
+        with span("analysis_parse"):
+            analysis = extract_json(analysis_response)
+
+        if analysis is None:
+            logger.error(f"Failed to parse analysis: {repr(analysis_response)}")
+            return None, MISUNDERSTOOD_REPLY
+
+        logger.info(f"Successfully parsed analysis: {analysis}")
+        return analysis, None
+
+    def _conversation(self, jwt_token: str = None, session_id: str = None) -> Optional[Conversation]:
+        """The caller's conversation, scoped to their token so sessions can't be shared across users."""
+        if not session_id:
+            return None
+        user = digest(jwt_token or self.mcp_client.jwt_token or '')
+        return self.conversations.get(f"{user}:{session_id}")
+
+    async def _summarize_turns(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold older conversation turns into a short running summary."""
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        return await self.models.chat("summary", summary_messages(summary, transcript),
+                                      options={"num_predict": self.conversations.token_budget // 4})
+
+    def cache_stats(self) -> Dict[str, Any]:
+        stats = {"intent": self.intent_cache.get_stats(), "answer": self.answer_cache.get_stats()}
+        if self.mcp_client.result_cache is not None:
+            stats["mcp_result"] = self.mcp_client.result_cache.get_stats()
+        return stats
+
+    async def _analyze(self, query: str, jwt_token: str = None) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Classify the query via the intent cache or the LLM.
+
+        Returns ``(analysis, prefetched, reply)``; ``prefetched`` holds
+        speculatively fetched meal data when the analysis asked for it.
+        """
+        # Relative dates ("today") resolve differently each day
+        intent_key = cache_key(self._today(), normalize_query(query))
+        analysis = self.intent_cache.get(intent_key)
+        if analysis is not None:
+            logger.info(f"Cached analysis: {analysis}")
+            return analysis, None, None
+
+        if remaining() < self.min_llm_seconds:
+            logger.warning("Not enough time left for LLM analysis, answering generally")
+            return None, None, GENERAL_FALLBACK_REPLY
+
+        prefetch = self._start_prefetch(jwt_token) if self.speculative_prefetch else None
+        try:
+            analysis, reply = await self._llm_analysis(query)
+        except BaseException:
+            self._discard_prefetch(prefetch)
+            raise
+        if reply is not None:
+            self._discard_prefetch(prefetch)
+            return None, None, reply
+
+        self.intent_cache.set(intent_key, analysis)
+        return analysis, await self._resolve_prefetch(prefetch, analysis, query), None
+
+    async def _prepare_answer(self, query: str, jwt_token: str = None) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+        """Run every stage before the final LLM call.
+
+        Returns ``(content, reply, answer_key, fallback)``: the user message
+        for the answer-writing LLM call, or a ready reply when no further LLM
+        call is needed, plus the answer cache key for the result (None if it
+        shouldn't be cached) and a locally built answer to use if there's no
+        time left for the LLM.
+        """
+        # Check if Ollama is available
+        with span("health_check"):
             is_healthy = await self.ollama_client.check_health()
 
-            if not is_healthy:
-                return "I'm sorry, but I'm currently unable to process your request. My language model service is not available. Please try again later."
-
-            # Use LLM to understand the query and determine action
-            analysis_prompt = f"""
-You are a calorie tracking assistant. Analyze this user query and determine what action to take.
-
-Available tools:
-- get_user_meals: Get all meals for a specific user (requires user_id, optional date)
-
-User query: "{query}"
-
-Respond with a JSON object containing:
-{{
-  "intent": "get_meals" | "other",
-  "user_id": number or null,
-  "date": "YYYY-MM-DD" or null (use today's date if mentioned, yesterday if mentioned),
-  "needs_tool": boolean,
-  "response": "brief explanation of what you'll do"
-}}
-
-If the query is about meals, set intent to "get_meals" and extract user_id if mentioned.
-If no user_id is mentioned, use 1 as default.
-If date is mentioned, parse it appropriately.
-"""
-
-            analysis_response = await self.ollama_client.generate(analysis_prompt)
-            logger.info(f"LLM analysis raw response: {repr(analysis_response)}")
-
-            # Clean the response - remove markdown code blocks if present
-            cleaned_response = analysis_response.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-
-            logger.info(f"LLM analysis cleaned: {repr(cleaned_response)}")
+        if not is_healthy:
+            return None, UNAVAILABLE_REPLY, None, None
+
+        # Common phrasings are resolved locally; parse_intent returns None for
+        # anything it can't classify, which goes to the LLM
+        with span("fast_path"):
+            analysis = parse_intent(query, date.fromisoformat(self._today()))
+        prefetched = None
+        if analysis:
+            logger.info(f"Fast-path analysis: {analysis}")
+        else:
+            analysis, prefetched, reply = await self._analyze(query, jwt_token)
+            if reply is not None:
+                return None, reply, None, None
+
+        # Execute the determined action
+        if analysis.get("intent") == "get_meals" and analysis.get("needs_tool", False):
+            user_id = self._user_id(jwt_token, analysis)
+            date_from, date_to = self._date_range(analysis)
+
+            # Only fetch rows when the answer needs them; long periods come
+            # back pre-aggregated per day or week
+            with span("plan"):
+                tool = plan_meal_query(query, date_from, date_to, self.plan_row_days, self.plan_daily_days)
+
+            if prefetched is not None:
+                # Today's result for the same plan, fetched while the intent LLM call ran
+                meal_data = prefetched
+            else:
+                with span("mcp_tool"):
+                    meal_data = await self.call_meal_tool(tool, user_id, date_from, date_to, jwt_token)
+
+            # Answers depend on the user's data, so key them on a hash of the
+            # tool result; failed tool calls aren't cached
+            answer_key = None
+            if isinstance(meal_data, MealTable):
+                user = digest(jwt_token or self.mcp_client.jwt_token or '')
+                answer_key = cache_key(user, tool, date_from, date_to, normalize_query(query), meal_data.fingerprint())
+
+            # Aggregate locally so the prompt stays small however long the history is
+            with span("summarize"):
+                range_days = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days + 1
+                meal_summary = digest_meal_data(meal_data, tool, self.zone, range_days)
+
+            # Use LLM to format the response nicely
+            return meal_answer_content(query, meal_summary), None, answer_key, render_meal_summary(meal_summary)
+
+        else:
+            # For non-meal queries or when no tool is needed
+            return general_answer_content(query), None, cache_key("other", normalize_query(query)), GENERAL_FALLBACK_REPLY
+
+    async def process_query(self, query: str, jwt_token: str = None, session_id: str = None,
+                            timeout: Optional[float] = None) -> str:
+        """Process a user query using LLM for intelligent understanding.
+
+        ``jwt_token`` authenticates this query's tool calls; when omitted the
+        token the agent was constructed with is used. With a ``session_id``
+        the answer is generated as a chat turn that sees the session's
+        earlier questions and answers. Every MCP and Ollama call is bounded
+        by the query's deadline, ``timeout`` (default ``query_timeout``)
+        seconds from now.
+        """
+        logger.info(f"Processing query: {query}")
+        trace, trace_token = start_trace(query)
+        outcome = "error"
 
+        try:
+            with deadline(self.query_timeout if timeout is None else timeout):
+                content, reply, answer_key, fallback = await self._prepare_answer(query, jwt_token)
+                if reply is not None:
+                    outcome = "reply"
+                    return reply
+
+                conversation = self._conversation(jwt_token, session_id)
+                # Earlier turns change the answer, so only a session's first turn can use the cache
+                if conversation is not None and conversation.turns:
+                    answer_key = None
+
+                response = self.answer_cache.get(answer_key) if answer_key else None
+                if response is None:
+                    # Short on time: answer from the local summary rather than risk the deadline
+                    if remaining() < self.min_llm_seconds:
+                        logger.warning("Not enough time left for LLM formatting, using the local summary")
+                        outcome = "fallback"
+                        return fallback
+
+                    messages = conversation.messages(content) if conversation is not None else answer_messages(content)
+                    try:
+                        with span("format_llm"):
+                            response = await self.models.chat("answer", messages)
+                    except DeadlineExceeded as e:
+                        logger.warning(f"LLM formatting timed out, using the local summary: {e}")
+                        outcome = "fallback"
+                        return fallback
+                    logger.debug(f"LLM response: {repr(response)}")
+                    response = response.strip()
+                    if answer_key:
+                        self.answer_cache.set(answer_key, response)
+
+                if conversation is not None:
+                    conversation.add_turn(query, response)
+                outcome = "ok"
+                return response
+
+        except DeadlineExceeded as e:
+            logger.error(f"Query timed out: {e}")
+            outcome = "timeout"
+            return TIMEOUT_REPLY
+        except Exception as e:
+            logger.error(f"Error in LLM processing: {e}")
+            return ERROR_REPLY
+        finally:
+            finish_trace(trace, trace_token, outcome)
+
+    async def process_query_stream(self, query: str, jwt_token: str = None, session_id: str = None,
+                                   timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Like ``process_query``, but yield the final answer as it is generated.
+
+        The query's trace and deadline are made current around each step,
+        never across a ``yield``, so a stream its client abandons can be
+        closed from another context.
+        """
+        logger.info(f"Processing query (streaming): {query}")
+        trace = QueryTrace(query)
+        expires = time.monotonic() + (self.query_timeout if timeout is None else timeout)
+        outcome = "error"
+
+        started = False
+        fallback = None
+        try:
+            with traced(trace), deadline_at(expires):
+                content, reply, answer_key, fallback = await self._prepare_answer(query, jwt_token)
+                short_on_time = remaining() < self.min_llm_seconds
+            if reply is not None:
+                outcome = "reply"
+                yield reply
+                return
+
+            conversation = self._conversation(jwt_token, session_id)
+            if conversation is not None and conversation.turns:
+                answer_key = None
+
+            cached = self.answer_cache.get(answer_key) if answer_key else None
+            if cached is not None:
+                if conversation is not None:
+                    conversation.add_turn(query, cached)
+                outcome = "ok"
+                yield cached
+                return
+
+            if short_on_time:
+                logger.warning("Not enough time left for LLM formatting, using the local summary")
+                outcome = "fallback"
+                yield fallback
+                return
+
+            messages = conversation.messages(content) if conversation is not None else answer_messages(content)
+
+            chunks = []
+            stream = self.models.chat_stream("answer", messages)
+            llm_start = time.perf_counter()
             try:
-                analysis = json.loads(cleaned_response)
-                logger.info(f"Successfully parsed analysis: {analysis}")
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parse error: {e}")
-                logger.error(f"Failed to parse: {repr(cleaned_response)}")
-                return f"I'm having trouble understanding your request. Could you please rephrase it? (Error: {e})"
-
-            # Execute the determined action
-            if analysis.get("intent") == "get_meals" and analysis.get("needs_tool", False):
-                user_id = analysis.get("user_id", 1)
-                date = analysis.get("date")
-
-                if not date:
-                    # Default to today if no date specified
-                    date = datetime.now().strftime("%Y-%m-%d")
-
-                logger.info(f"Calling get_user_meals for user {user_id} on {date}")
-                meal_data = await self.get_user_meals(str(user_id), date)
-
-                # Use LLM to format the response nicely
-                format_prompt = f"""
-Format this meal data into a user-friendly response:
-
-Raw meal data: {meal_data}
-
-User asked: "{query}"
-
-Provide a natural, helpful response that summarizes the meal information.
-If there are no meals, explain that clearly.
-"""
-
-                formatted_response = await self.ollama_client.generate(format_prompt)
-                logger.info(f"LLM format response: {repr(formatted_response)}")
-                return formatted_response.strip()
-
+                while True:
+                    with traced(trace, "format_llm"), deadline_at(expires):
+                        try:
+                            chunk = await anext(stream)
+                        except StopAsyncIteration:
+                            break
+                    # Match process_query's strip() on the leading edge
+                    if not started:
+                        chunk = chunk.lstrip()
+                        if not chunk:
+                            continue
+                        started = True
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                with traced(trace, "format_llm"):
+                    await stream.aclose()
+                    record_span("format_llm", time.perf_counter() - llm_start)
+            response = ''.join(chunks).strip()
+            if answer_key:
+                self.answer_cache.set(answer_key, response)
+            if conversation is not None:
+                conversation.add_turn(query, response)
+            outcome = "ok"
+
+        except DeadlineExceeded as e:
+            # Nothing sent yet: the local summary is still better than nothing
+            logger.error(f"Query timed out: {e}")
+            if not started:
+                outcome = "fallback" if fallback else "timeout"
+                yield fallback or TIMEOUT_REPLY
             else:
-                # For non-meal queries or when no tool is needed
-                general_prompt = f"""
-You are a calorie tracking assistant. The user asked: "{query}"
-
-Available actions:
-- I can help you get meal information for users
-- I can analyze meal patterns and provide insights
-- I can help with calorie tracking questions
-
-Provide a helpful response. If this is about meals, suggest they ask about specific users.
-"""
-
-                response = await self.ollama_client.generate(general_prompt)
-                logger.info(f"LLM general response: {repr(response)}")
-                return response.strip()
-
+                outcome = "timeout"
         except Exception as e:
             logger.error(f"Error in LLM processing: {e}")
-            return "I'm experiencing technical difficulties. Please try again in a moment."
+            if not started:
+                yield ERROR_REPLY
+        finally:
+            record_trace(trace, outcome)
 
     async def run_interactive(self):
         """Run the agent in interactive mode."""
@@ -169,7 +544,7 @@ Provide a helpful response. If this is about meals, suggest they ask about speci
                     break
 
                 if query:
-                    response = await self.process_query(query)
+                    response = await self.process_query(query, session_id="interactive")
                     print(f"Response: {response}")
                     print("-" * 40)
 
@@ -183,9 +558,20 @@ Provide a helpful response. If this is about meals, suggest they ask about speci
         """Clean up resources."""
         await self.mcp_client.stop_server()
         await self.ollama_client.disconnect()
+        self.conversations.close()
+        self.intent_cache.close()
+        self.answer_cache.close()
         logger.info("Calorie Tracker Agent cleanup completed")
 
 async def main():
+    # Long-running service mode: keep MCP/Ollama connections warm and serve
+    # queries over HTTP instead of paying process startup per message
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        from agent_server import serve
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        await serve(port=port)
+        return
+
     # Parse command line arguments
     jwt_token = None
     if len(sys.argv) > 3:
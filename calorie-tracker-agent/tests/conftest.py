@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The agent modules are flat files next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_fakes import FakeMCPServer, make_token, seed_database
+
+@pytest.fixture
+def seeded_db(tmp_path):
+    """A small app-schema database: users 1-3 with 4 meals a day for 10 days."""
+    path = str(tmp_path / 'calorie_tracker.db')
+    seed_database(path, users=3, meals_per_day=4, days=10)
+    return path
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion (the tests don't depend on an asyncio plugin)."""
+    return asyncio.run
+
+def start_fake_mcp(db_path: str):
+    """A started FakeMCPServer (call from inside the test's event loop)."""
+    async def start():
+        server = FakeMCPServer(db_path)
+        await server.start()
+        return server
+    return start()
+
+TOKEN = make_token('1')
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+
+from conftest import TOKEN, start_fake_mcp
+from agent_server import AgentServer
+from bench_fakes import FakeOllamaServer
+from simple_agent import CalorieTrackerAgent
+
+QUERY = "What did I eat today?"
+
+async def read_traces(path, count, timeout=5.0):
+    """The first ``count`` traces written to ``path``, waiting up to ``timeout`` seconds for them."""
+    expires = time.monotonic() + timeout
+    while True:
+        try:
+            with open(path) as f:
+                traces = [json.loads(line) for line in f]
+        except FileNotFoundError:
+            traces = []
+        if len(traces) >= count or time.monotonic() > expires:
+            return traces
+        await asyncio.sleep(0.05)
+
+def test_stream_survives_a_client_disconnect(seeded_db, run, tmp_path, monkeypatch):
+    trace_file = str(tmp_path / 'traces.jsonl')
+    monkeypatch.setenv('AGENT_TRACE_FILE', trace_file)
+    body = json.dumps({'query': QUERY, 'jwt': TOKEN}).encode()
+
+    async def scenario():
+        mcp = await start_fake_mcp(seeded_db)
+        ollama = FakeOllamaServer(token_latency=0.02, prompt_latency=0, answer_tokens=100)
+        await ollama.start()
+        server = AgentServer()
+        server.agent = CalorieTrackerAgent(mcp_port=mcp.port)
+        server.agent.ollama_client.base_url = ollama.url
+        await server.agent.initialize()
+        # A plain runner, as serve() uses: handlers aren't cancelled when the client leaves
+        runner = web.AppRunner(server.build_app())
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        port = runner.addresses[0][1]
+        try:
+            # Hang up as soon as the answer starts arriving
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'POST /query/stream HTTP/1.1\r\nHost: agent\r\nContent-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            received = b''
+            while b'token' not in received:
+                received += await reader.read(1024)
+            writer.close()
+            await writer.wait_closed()
+
+            abandoned = await read_traces(trace_file, 1)
+            assert [trace['query'] for trace in abandoned] == [QUERY]
+            assert 'format_llm' in [span['stage'] for span in abandoned[0]['spans']]
+
+            # The server keeps answering, and an abandoned answer isn't cached
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f'http://127.0.0.1:{port}/query/stream',
+                                        json={'query': QUERY, 'jwt': TOKEN}) as response:
+                    text = await response.text()
+            assert text == ''.join(f'token{i} ' for i in range(100))
+            traces = await read_traces(trace_file, 2)
+            assert traces[1]['outcome'] == 'ok'
+        finally:
+            await runner.cleanup()
+            await server.stop()
+            await ollama.stop()
+            await mcp.stop()
+    run(scenario())
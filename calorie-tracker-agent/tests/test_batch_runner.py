@@ -0,0 +1,84 @@
+import io
+import json
+
+from conftest import start_fake_mcp
+from batch_runner import run_batch
+from bench_fakes import FakeOllamaServer, make_token
+from simple_agent import CalorieTrackerAgent
+
+class RecordingAgent:
+    """Wraps an agent, counting queries in flight; the query 'raise' raises."""
+
+    def __init__(self, agent: CalorieTrackerAgent):
+        self.agent = agent
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def process_query(self, query, jwt_token=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if query == 'raise':
+                raise RuntimeError('agent bug')
+            return await self.agent.process_query(query, jwt_token=jwt_token)
+        finally:
+            self.in_flight -= 1
+
+async def batch(db_path, lines, concurrency):
+    """Run ``lines`` through an agent on the stand-in servers: (summary, results, agent)."""
+    mcp = await start_fake_mcp(db_path)
+    ollama = FakeOllamaServer(token_latency=0.001, prompt_latency=0.01, answer_tokens=5)
+    await ollama.start()
+    agent = CalorieTrackerAgent(mcp_port=mcp.port)
+    agent.ollama_client.base_url = ollama.url
+    recording = RecordingAgent(agent)
+    out = io.StringIO()
+    try:
+        await agent.initialize()
+        summary = await run_batch(recording, lines, out, concurrency)
+    finally:
+        await agent.cleanup()
+        await ollama.stop()
+        await mcp.stop()
+    return summary, [json.loads(line) for line in out.getvalue().splitlines()], recording
+
+def record(**fields) -> str:
+    return json.dumps(fields) + '\n'
+
+def test_every_record_gets_one_result_in_a_bounded_number_of_slots(seeded_db, run):
+    queries = ["What did I eat today?", "How many calories did I have yesterday?", "What did I eat this week?"]
+    lines = [record(id=index, query=queries[index % 3], jwt=make_token(str(index % 3 + 1))) for index in range(12)]
+
+    summary, results, agent = run(batch(seeded_db, lines, concurrency=4))
+
+    assert agent.max_in_flight == 4
+    assert summary['total'] == summary['succeeded'] == 12
+    assert summary['failed'] == summary['invalid'] == 0
+    # Written as they finish; the line number and copied fields say which record each is
+    assert sorted(result['id'] for result in results) == list(range(12))
+    assert all(result['line'] == result['id'] + 1 for result in results)
+    assert all(result['ok'] and result['response'] for result in results)
+    assert all('jwt' not in result for result in results)
+
+def test_a_failing_record_does_not_affect_the_others(seeded_db, run):
+    token = make_token('2')
+    lines = [
+        record(id='ok-1', query="What did I eat today?", jwt=token),
+        'not json\n',
+        '\n',
+        record(id='no-query', jwt=token),
+        record(id='raises', query='raise', jwt=token),
+        record(id='ok-2', query="How many calories did I have yesterday?", jwt=token),
+    ]
+
+    summary, results, _ = run(batch(seeded_db, lines, concurrency=2))
+
+    by_line = {result['line']: result for result in results}
+    # The blank line is skipped, not counted
+    assert sorted(by_line) == [1, 2, 4, 5, 6]
+    assert by_line[1]['ok'] and by_line[6]['ok']
+    assert by_line[1]['id'] == 'ok-1' and by_line[6]['id'] == 'ok-2'
+    assert not by_line[2]['ok'] and by_line[2]['error'].startswith('Invalid record')
+    assert not by_line[4]['ok'] and by_line[4]['error'].startswith('Invalid record')
+    assert not by_line[5]['ok'] and by_line[5]['id'] == 'raises' and 'agent bug' in by_line[5]['error']
+    assert summary == {**summary, 'total': 5, 'succeeded': 2, 'failed': 1, 'invalid': 2}
@@ -0,0 +1,36 @@
+import json
+import sqlite3
+import uuid
+
+from bench_fakes import FakeMCPServer, make_token
+from schema import DATA_VERSIONS, TABLES
+
+def call(server, name, arguments=None, user_id='1'):
+    return server.handle_message({
+        'jsonrpc': '2.0', 'id': 1, 'method': 'tools/call',
+        'params': {'name': name, 'arguments': arguments or {}},
+        'headers': {'authorization': f'Bearer {make_token(user_id)}'},
+    })
+
+def test_tables_created_after_startup_are_picked_up(tmp_path):
+    path = str(tmp_path / 'app.db')
+    user_id = str(uuid.uuid4())
+    conn = sqlite3.connect(path)
+    conn.executescript(TABLES)
+    conn.execute("INSERT INTO users (id, username, password) VALUES (?, 'alice', 'x')", [user_id])
+    conn.commit()
+
+    server = FakeMCPServer(path)
+    assert 'version' not in call(server, 'get_user_meals', user_id=user_id)['result']
+
+    # The app installs the versioning tables while the server is running
+    conn.executescript(DATA_VERSIONS)
+    conn.execute("INSERT INTO meals (id, user_id, name, calories, created_at) "
+                 "VALUES ('m1', ?, 'Soup', 250, '2025-03-01T12:00:00.000Z')", [user_id])
+    conn.commit()
+
+    result = call(server, 'get_user_meals', user_id=user_id)['result']
+    assert result['version'] > 0
+    assert [meal['id'] for meal in json.loads(result['content'][0]['text'])] == ['m1']
+    assert call(server, 'get_user_meals', {'if_version': result['version']}, user_id)['result']['notModified']
+    conn.close()
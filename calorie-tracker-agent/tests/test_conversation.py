@@ -0,0 +1,74 @@
+import asyncio
+import math
+
+from conversation import Conversation, ConversationStore
+from deadline import deadline, remaining
+from metrics import current_trace, finish_trace, start_trace
+
+def test_window_keeps_newest_turns_within_budget():
+    conversation = Conversation('system', summarizer=None, token_budget=40, keep_turns=100)
+    for index in range(10):
+        conversation.turns.append({'role': 'user', 'content': f'question {index} ' * 4})
+        conversation.turns.append({'role': 'assistant', 'content': f'answer {index} ' * 4})
+
+    messages = conversation.messages('new question')
+
+    assert messages[0] == {'role': 'system', 'content': 'system'}
+    assert messages[-1] == {'role': 'user', 'content': 'new question'}
+    window = messages[1:-1]
+    assert window and len(window) < 20
+    assert window[0]['role'] == 'user'
+    assert window[-1]['content'] == 'answer 9 ' * 4
+
+def test_compaction_folds_old_turns_outside_the_query_context(run):
+    seen = {}
+
+    async def summarizer(summary, turns):
+        seen['remaining'] = remaining()
+        seen['trace'] = current_trace.get()
+        return f'{len(turns)} messages'
+
+    async def main():
+        conversation = Conversation('system', summarizer, token_budget=40, keep_turns=2)
+        trace, token = start_trace('question')
+        with deadline(0.05):
+            for index in range(3):
+                conversation.add_turn(f'question {index} ' * 4, f'answer {index} ' * 4)
+        finish_trace(trace, token, 'ok')
+        # Outlives the query's deadline
+        await asyncio.sleep(0.1)
+        await conversation._compaction
+        return conversation
+
+    conversation = run(main())
+    assert seen == {'remaining': math.inf, 'trace': None}
+    assert conversation.summary == '4 messages'
+    assert [turn['content'] for turn in conversation.turns] == ['question 2 ' * 4, 'answer 2 ' * 4]
+
+def test_failed_compaction_keeps_the_turns(run):
+    async def summarizer(summary, turns):
+        raise RuntimeError('model unavailable')
+
+    async def main():
+        conversation = Conversation('system', summarizer, token_budget=40, keep_turns=2)
+        for index in range(3):
+            conversation.add_turn(f'question {index} ' * 4, f'answer {index} ' * 4)
+        await conversation._compaction
+        return conversation
+
+    conversation = run(main())
+    assert conversation.summary == ''
+    assert len(conversation.turns) == 6
+
+def test_store_evicts_least_recently_used_and_idle_sessions():
+    store = ConversationStore('system', summarizer=None, max_sessions=2, idle_ttl=1800)
+    first = store.get('a')
+    store.get('b')
+    assert store.get('a') is first
+    store.get('c')
+    assert list(store.sessions) == ['a', 'c']
+
+    store.sessions['a'].last_used -= 3600
+    store.get('c')
+    assert list(store.sessions) == ['c']
+    assert store.get_stats() == {'sessions': 1, 'evictions': 2}
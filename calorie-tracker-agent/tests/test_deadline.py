@@ -0,0 +1,42 @@
+import asyncio
+import math
+
+import pytest
+
+from deadline import current_deadline, deadline, remaining
+
+def test_no_deadline_by_default():
+    assert remaining() == math.inf
+    with deadline(None):
+        assert remaining() == math.inf
+
+def test_inner_deadline_cannot_extend_the_outer_one():
+    with deadline(1):
+        with deadline(60):
+            assert remaining() <= 1
+        with deadline(0.5):
+            assert remaining() <= 0.5
+        assert 0.5 < remaining() <= 1
+    assert current_deadline.get() is None
+
+def test_remaining_never_goes_negative():
+    with deadline(-5):
+        assert remaining() == 0.0
+
+def test_deadline_is_reset_when_the_block_raises():
+    with pytest.raises(ValueError):
+        with deadline(1):
+            raise ValueError
+    assert remaining() == math.inf
+
+def test_tasks_see_their_own_deadline(run):
+    async def query(seconds):
+        with deadline(seconds):
+            await asyncio.sleep(0)
+            return remaining()
+
+    async def main():
+        return await asyncio.gather(query(1), query(60))
+
+    short, long = run(main())
+    assert short <= 1 < long
@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+from intent_parser import extract_json, parse_intent, resolve_dates
+
+TODAY = date(2025, 3, 12)  # a Wednesday
+
+@pytest.mark.parametrize('query', [
+    "How many calories should I eat to lose weight?",
+    "Is protein good for me?",
+    "can I eat fats at night",
+    "what did I eat in March",
+    "what did I have for lunch 3 weeks ago",
+    "how many calories are in a banana",
+    "should I eat more protein today?",
+    "Show my meals",
+    "tell me what I should eat for dinner today",
+    "give me a healthy lunch idea for today",
+    "where can I get food tonight",
+])
+def test_questions_without_a_resolved_lookup_go_to_the_llm(query):
+    assert parse_intent(query, TODAY) is None
+
+@pytest.mark.parametrize('query, expected', [
+    ("What did I eat yesterday?", {"date": "2025-03-11"}),
+    ("How many calories did I have today", {"date": "2025-03-12"}),
+    ("Show my meals from the last 7 days", {"date_from": "2025-03-06", "date_to": "2025-03-12"}),
+    ("what are my macros this week", {"date_from": "2025-03-10", "date_to": "2025-03-12"}),
+    ("What did user 2 eat on 2025-03-01?", {"date": "2025-03-01", "user_id": 2}),
+    ("what did I have for lunch last monday", {"date": "2025-03-10"}),
+    ("tell me my calories for today", {"date": "2025-03-12"}),
+    ("give me a breakdown of yesterday's meals", {"date": "2025-03-11"}),
+])
+def test_log_lookups_with_a_date_take_the_fast_path(query, expected):
+    analysis = parse_intent(query, TODAY)
+    assert analysis is not None
+    assert analysis["intent"] == "get_meals" and analysis["needs_tool"]
+    for key, value in expected.items():
+        assert analysis[key] == value
+
+@pytest.mark.parametrize('text, expected', [
+    ("past three days", (date(2025, 3, 10), TODAY)),
+    ("last week", (date(2025, 3, 3), date(2025, 3, 9))),
+    ("day before yesterday", (date(2025, 3, 10), date(2025, 3, 10))),
+    ("on Dec 30", (date(2024, 12, 30), date(2024, 12, 30))),
+    ("31st of January 2024", (date(2024, 1, 31), date(2024, 1, 31))),
+    ("last wednesday", (date(2025, 3, 5), date(2025, 3, 5))),
+    ("in March", None),
+    ("2025-02-30", None),
+])
+def test_resolve_dates(text, expected):
+    assert resolve_dates(text, TODAY) == expected
+
+@pytest.mark.parametrize('text, expected', [
+    ('```json\n{"intent": "other", "needs_tool": false}\n```', {"intent": "other", "needs_tool": False}),
+    ("Sure! {'intent': 'get_meals', 'user_id': None, needs_tool: True,}", 
+     {"intent": "get_meals", "user_id": None, "needs_tool": True}),
+    ('{"intent": "get_meals", "response": "Fetch', {"intent": "get_meals", "response": "Fetch"}),
+    ('no json here', None),
+])
+def test_extract_json_tolerates_llm_slips(text, expected):
+    assert extract_json(text) == expected
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+from conftest import TOKEN, start_fake_mcp
+from mcp_client import MCPClient, MCPConnectionError
+from meal_table import decode_table
+
+def test_reconnect_replaces_the_reader_task(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        client = MCPClient('127.0.0.1', server.port, TOKEN)
+        try:
+            await client.initialize()
+            old_task, old_writer = client._reader_task, client.writer
+            # As _send does after a write error, while the old reader still runs
+            client.connected = False
+
+            results = await asyncio.gather(*(client.call_tool('get_user_details', {}) for _ in range(5)))
+            assert {json.loads(result)['id'] for result in results} == {'1'}
+            assert old_task.done() and client._reader_task is not old_task
+            assert old_writer.is_closing()
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_reconnect_renegotiates_the_result_encoding(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        client = MCPClient('127.0.0.1', server.port, TOKEN)
+        try:
+            await client.initialize()
+            assert client.result_encoding == 'columnar'
+            before = await client.call_tool_table('get_user_meals', {'limit': 3})
+
+            # The server dropped the connection; the next call reconnects
+            client.writer.close()
+            await client._reader_task
+            assert not client.connected
+
+            # New arguments, so the answer can't come from the result cache
+            text = await client.call_tool('get_user_meals', {'limit': 4})
+            assert isinstance(json.loads(text), dict)
+            after = decode_table(text)
+            assert len(after) == 4
+            assert [after.row(index) for index in range(3)] == [before.row(index) for index in range(3)]
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_requests_on_a_replaced_connection_fail_fast(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        client = MCPClient('127.0.0.1', server.port, TOKEN)
+        try:
+            await client.connect()
+            orphan = asyncio.get_running_loop().create_future()
+            client._pending[99] = orphan
+            client.connected = False
+            await client.connect()
+            assert isinstance(orphan.exception(), Exception) and 99 not in client._pending
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+async def _start_scripted_server(answer):
+    """A TCP server that reads ``count`` request lines, then hands them to ``answer(requests, writer)``."""
+    async def handle(reader, writer):
+        requests = []
+        while len(requests) < answer.count:
+            line = await reader.readline()
+            if not line:
+                break
+            requests.append(json.loads(line))
+        await answer(requests, writer)
+        writer.close()
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+def test_concurrent_calls_share_one_connection(seeded_db, run):
+    calls = [
+        ('get_user_details', {}),
+        ('get_user_meals', {'limit': 3}),
+        ('get_meal_macros', {}),
+        ('get_daily_totals', {}),
+        ('get_user_meals', {'limit': 1}),
+    ]
+
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        client = MCPClient('127.0.0.1', server.port, TOKEN)
+        try:
+            await client.initialize()
+            reader_task = client._reader_task
+            concurrent = await asyncio.gather(*(client.call_tool(name, dict(args)) for name, args in calls))
+            assert client.in_flight == 0 and client._reader_task is reader_task
+
+            sequential = [await client.call_tool(name, dict(args)) for name, args in calls]
+            assert concurrent == sequential
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_out_of_order_responses_reach_their_callers(run):
+    async def answer(requests, writer):
+        for request in reversed(requests):
+            text = json.dumps(request['params']['arguments'])
+            response = {'jsonrpc': '2.0', 'id': request['id'], 'result': {'content': [{'type': 'text', 'text': text}]}}
+            writer.write((json.dumps(response) + '\n').encode())
+        await writer.drain()
+    answer.count = 4
+
+    async def scenario():
+        server = await _start_scripted_server(answer)
+        port = server.sockets[0].getsockname()[1]
+        client = MCPClient('127.0.0.1', port, TOKEN)
+        try:
+            results = await asyncio.gather(*(client.call_tool('get_user_meals', {'n': n}) for n in range(4)))
+            assert [json.loads(result) for result in results] == [{'n': n} for n in range(4)]
+        finally:
+            await client.disconnect()
+            server.close()
+            await server.wait_closed()
+    run(scenario())
+
+def test_a_dropped_connection_fails_every_call_in_flight(run):
+    async def answer(requests, writer):
+        pass
+    answer.count = 3
+
+    async def scenario():
+        server = await _start_scripted_server(answer)
+        port = server.sockets[0].getsockname()[1]
+        client = MCPClient('127.0.0.1', port, TOKEN)
+        try:
+            results = await asyncio.gather(*(client.call_tool('get_user_details', {}) for _ in range(3)),
+                                           return_exceptions=True)
+            assert all(isinstance(result, MCPConnectionError) for result in results)
+            assert client.in_flight == 0 and not client.connected
+        finally:
+            await client.disconnect()
+            server.close()
+            await server.wait_closed()
+    run(scenario())
+
+def test_batched_calls_come_back_in_call_order(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        client = MCPClient('127.0.0.1', server.port, TOKEN)
+        try:
+            await client.initialize()
+            details, missing, macros = await client.call_tools(
+                [('get_user_details', {}), ('no_such_tool', {}), ('get_meal_macros', {})], return_exceptions=True)
+            assert json.loads(details)['id'] == '1'
+            assert isinstance(missing, Exception)
+            assert json.loads(macros)['meal_count'] == 40
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
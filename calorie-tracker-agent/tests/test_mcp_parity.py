@@ -0,0 +1,144 @@
+"""FakeMCPServer against the real Node MCP server, request for request.
+
+Skipped where node or the server's node_modules are missing.
+"""
+
+import asyncio
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+from bench_fakes import FakeMCPServer, NodeMCPServer
+
+pytestmark = pytest.mark.skipif(not NodeMCPServer.available(), reason='node or MCP server dependencies not installed')
+
+class Connection:
+    """Raw JSON-RPC lines over one TCP connection."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.next_id = 0
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        return self
+
+    async def send(self, payload):
+        self.writer.write((json.dumps(payload) + '\n').encode())
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    def message(self, method, params=None, token=None):
+        self.next_id += 1
+        message = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params or {}}
+        if token:
+            message['headers'] = {'authorization': f'Bearer {token}'}
+        return message
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+def rounded(value):
+    """``value`` with floats rounded: the SQLite builds may sum REAL columns in a different order."""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    return value
+
+def comparable(response):
+    """A response with tool text decoded, leaving out what may differ: error messages and serverInfo."""
+    if isinstance(response, list):
+        return [comparable(item) for item in response]
+    if 'error' in response:
+        return {'id': response['id'], 'error': response['error']['code']}
+    result = dict(response['result'])
+    result.pop('serverInfo', None)
+    if 'content' in result:
+        result['content'] = [rounded(json.loads(part['text'])) for part in result['content']]
+    return {'id': response['id'], 'result': result}
+
+def test_stand_in_answers_like_the_real_server(seeded_db, run):
+    with sqlite3.connect(seeded_db) as conn:
+        first, last = conn.execute("SELECT MIN(DATE(created_at)), MAX(DATE(created_at)) FROM meals").fetchone()
+    middle = str(date.fromisoformat(first) + (date.fromisoformat(last) - date.fromisoformat(first)) / 2)
+
+    async def scenario():
+        node = NodeMCPServer(seeded_db)
+        fake = FakeMCPServer(seeded_db)
+        await node.start()
+        await fake.start()
+        user1, user2 = node.token('1'), node.token('2')
+        mismatches = []
+        try:
+            for encoding in ([], ['columnar']):
+                real, stand_in = await Connection(node.port).open(), await Connection(fake.port).open()
+
+                async def check(build):
+                    """Send ``build(connection)`` to both servers and compare; returns the real response."""
+                    message = build(real)
+                    got_real, got_fake = await real.send(message), await stand_in.send(build(stand_in))
+                    if comparable(got_real) != comparable(got_fake):
+                        mismatches.append((message, comparable(got_real), comparable(got_fake)))
+                    return got_real
+
+                initialize = await check(lambda c: c.message('initialize', {'capabilities': {'experimental': {'resultEncodings': encoding}}}))
+                assert initialize['result']['capabilities'].get('experimental', {}).get('resultEncoding') == (encoding or [None])[0]
+
+                calls = [
+                    ('get_user_meals', {}),
+                    ('get_user_meals', {'date_from': middle, 'date_to': middle}),
+                    ('get_user_meals', {'date_from': middle, 'date_to': last, 'timezone': 'Asia/Tokyo'}),
+                    ('get_user_details', {}),
+                    ('get_daily_totals', {}),
+                    ('get_daily_totals', {'date_from': first, 'date_to': middle}),
+                    ('get_daily_totals', {'date_from': first, 'date_to': middle, 'timezone': 'America/New_York'}),
+                    ('get_weekly_totals', {}),
+                    ('get_weekly_totals', {'date_from': middle, 'timezone': 'Europe/Berlin'}),
+                    ('get_meal_macros', {}),
+                    ('get_meal_macros', {'date_from': middle, 'date_to': middle}),
+                    ('get_meal_macros', {'date_from': middle, 'date_to': middle, 'timezone': 'Asia/Tokyo'}),
+                    # Errors
+                    ('get_user_meals', {'limit': 0}),
+                    ('get_user_meals', {'cursor': 'nope'}),
+                    ('get_daily_totals', {'date_from': '2025-02-30x'}),
+                    ('no_such_tool', {}),
+                ]
+                for name, args in calls:
+                    for token in (user1, user2):
+                        await check(lambda c: c.message('tools/call', {'name': name, 'arguments': args}, token))
+
+                # Pages: follow the real server's cursors (the comparison checks they match)
+                cursor, pages = None, 0
+                while True:
+                    args = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+                    page = await check(lambda c: c.message('tools/call', {'name': 'get_user_meals', 'arguments': args}, user1))
+                    pages += 1
+                    cursor = page['result'].get('nextCursor')
+                    if not cursor:
+                        break
+                assert pages == 6
+
+                # Conditional calls, fresh and stale
+                version = (await check(lambda c: c.message('tools/call', {'name': 'get_daily_totals', 'arguments': {}}, user1)))['result']['version']
+                for if_version in (version, version - 1):
+                    await check(lambda c: c.message('tools/call', {'name': 'get_daily_totals', 'arguments': {'if_version': if_version}}, user1))
+
+                # Authentication, unknown methods and batches
+                await check(lambda c: c.message('tools/call', {'name': 'get_user_meals', 'arguments': {}}))
+                await check(lambda c: c.message('resources/list'))
+                await check(lambda c: [c.message('tools/call', {'name': 'get_meal_macros', 'arguments': {}}, user1),
+                                       c.message('tools/call', {'name': 'get_user_meals', 'arguments': {'limit': 2}}, user2)])
+
+                await real.close()
+                await stand_in.close()
+        finally:
+            await fake.stop()
+            await node.stop()
+        assert mismatches == []
+    run(scenario())
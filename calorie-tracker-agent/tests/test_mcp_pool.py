@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+from conftest import TOKEN, start_fake_mcp
+from deadline import DeadlineExceeded
+from mcp_pool import MCPClientPool
+
+def test_pool_settings_come_from_environment(monkeypatch):
+    monkeypatch.setenv('MCP_POOL_MIN_SIZE', '2')
+    monkeypatch.setenv('MCP_POOL_MAX_SIZE', '6')
+    monkeypatch.setenv('MCP_POOL_HEALTH_INTERVAL', '3')
+    pool = MCPClientPool()
+    assert (pool.min_size, pool.max_size, pool.health_interval) == (2, 6, 3.0)
+    assert MCPClientPool(max_size=1).max_size == 1
+
+def test_slow_health_probe_does_not_block_acquire(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        pool = MCPClientPool('127.0.0.1', server.port, TOKEN, min_size=2, max_size=2, health_interval=60)
+        try:
+            await pool.connect()
+
+            async def slow_ping():
+                await asyncio.sleep(0.5)
+                return True
+            for client in pool.clients:
+                client.ping = slow_ping
+
+            health = asyncio.create_task(pool._check_health())
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            client = await pool._acquire()
+            assert time.perf_counter() - start < 0.2
+            assert client in pool.clients
+            await health
+            assert len(pool.clients) == 2
+        finally:
+            await pool.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_unhealthy_connection_is_replaced(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        pool = MCPClientPool('127.0.0.1', server.port, TOKEN, min_size=1, max_size=2, health_interval=60)
+        try:
+            await pool.connect()
+            bad = pool.clients[0]
+
+            async def failing_ping():
+                return False
+            bad.ping = failing_ping
+
+            await pool._check_health()
+            assert bad not in pool.clients and len(pool.clients) == 1
+            assert json.loads(await pool.call_tool('get_user_details', {}))['username'] == 'user1'
+        finally:
+            await pool.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_concurrent_acquires_respect_max_size(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        pool = MCPClientPool('127.0.0.1', server.port, TOKEN, min_size=1, max_size=3, health_interval=60)
+        try:
+            await pool.connect()
+            results = await asyncio.gather(*(pool.call_tool('get_user_meals', {}) for _ in range(20)))
+            assert len(set(results)) == 1
+            assert len(pool.clients) <= 3 and pool._opening == 0
+        finally:
+            await pool.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_probe_errors_only_drop_their_connection(seeded_db, run):
+    async def scenario():
+        server = await start_fake_mcp(seeded_db)
+        pool = MCPClientPool('127.0.0.1', server.port, TOKEN, min_size=3, max_size=3, health_interval=60)
+        try:
+            await pool.connect()
+            broken, expired, healthy = pool.clients
+
+            async def reset_ping():
+                raise ConnectionResetError('connection reset by peer')
+
+            async def late_ping():
+                raise DeadlineExceeded('no time left')
+            broken.ping, expired.ping = reset_ping, late_ping
+
+            await pool._check_health()
+            assert broken not in pool.clients and expired not in pool.clients
+            assert healthy in pool.clients and len(pool.clients) == 3
+        finally:
+            await pool.disconnect()
+            await server.stop()
+    run(scenario())
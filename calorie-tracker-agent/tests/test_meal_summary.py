@@ -0,0 +1,69 @@
+import json
+from zoneinfo import ZoneInfo
+
+from meal_summary import MAX_DAYS, digest_meal_data, render_meal_summary, summarize_meals
+from meal_table import MealTable
+
+def meal(created_at, name='Food', calories=100, protein=10.0, carbs=10.0, fats=5.0):
+    return {'name': name, 'calories': calories, 'protein': protein, 'carbs': carbs, 'fats': fats,
+            'created_at': created_at}
+
+def test_totals_days_and_meal_types_in_utc():
+    meals = MealTable.from_rows([
+        meal('2025-03-02T19:00:00.000Z', calories=700),
+        meal('2025-03-02T07:30:00.000Z', name='Oatmeal breakfast', calories=300),
+        meal('2025-03-01T12:00:00.000Z', calories=500),
+    ])
+    digest = summarize_meals(meals)
+    assert digest['meal_count'] == 3
+    assert (digest['first_day'], digest['last_day'], digest['day_count']) == ('2025-03-01', '2025-03-02', 2)
+    assert digest['per_day']['2025-03-02']['calories'] == 1000
+    assert {kind: totals['count'] for kind, totals in digest['per_meal_type'].items()} == \
+        {'dinner': 1, 'breakfast': 1, 'lunch': 1}
+    assert digest['daily_average_calories'] == 750
+    assert digest['recent_meals'][0]['logged_at'] == '2025-03-02T19:00'
+
+def test_days_and_meal_types_follow_the_configured_zone():
+    # 23:30 UTC on the 1st is 08:30 on the 2nd in Tokyo; 03:00 UTC is 12:00 there
+    meals = MealTable.from_rows([
+        meal('2025-03-02T03:00:00.000Z', calories=600),
+        meal('2025-03-01T23:30:00.000Z', calories=400),
+    ])
+    digest = summarize_meals(meals, ZoneInfo('Asia/Tokyo'))
+    assert list(digest['per_day']) == ['2025-03-02']
+    assert digest['per_day']['2025-03-02']['calories'] == 1000
+    assert {kind: totals['count'] for kind, totals in digest['per_meal_type'].items()} == {'lunch': 1, 'breakfast': 1}
+    assert digest['recent_meals'][0]['logged_at'] == '2025-03-02T12:00'
+
+    utc = summarize_meals(meals)
+    assert list(utc['per_day']) == ['2025-03-02', '2025-03-01']
+
+def test_sqlite_timestamps_without_offset_are_utc():
+    meals = MealTable.from_rows([meal('2025-03-01 23:30:00')])
+    assert list(summarize_meals(meals, ZoneInfo('Asia/Tokyo'))['per_day']) == ['2025-03-02']
+
+def test_daily_average_is_over_the_requested_range():
+    meals = MealTable.from_rows([meal('2025-03-07T12:00:00.000Z', calories=1400)])
+    digest = json.loads(digest_meal_data(meals, 'get_user_meals', range_days=7))
+    assert digest['day_count'] == 1 and digest['range_days'] == 7
+    assert digest['daily_average_calories'] == 200
+    assert "200 kcal per day" in render_meal_summary(json.dumps(digest))
+
+    totals = MealTable.from_rows([{'day': '2025-03-07', 'meals': 2, 'calories': 3000, 'protein': 1, 'carbs': 1,
+                                   'fats': 1}])
+    assert json.loads(digest_meal_data(totals, 'get_daily_totals', range_days=30))['daily_average_calories'] == 100
+
+def test_digest_size_is_bounded():
+    meals = MealTable.from_rows([meal(f'2025-{month:02d}-{day:02d}T12:00:00.000Z')
+                                 for month in (3, 2, 1) for day in range(28, 0, -1) for _ in range(5)])
+    digest = summarize_meals(meals)
+    assert len(digest['per_day']) == MAX_DAYS
+    assert digest['days_omitted'] == 84 - MAX_DAYS
+    assert len(digest['recent_meals']) == 10
+
+def test_error_text_is_passed_through():
+    assert digest_meal_data('Error: connection refused') == 'Error: connection refused'
+    assert render_meal_summary('Error: connection refused').startswith("I couldn't load your meals")
+
+def test_render_without_meals():
+    assert render_meal_summary(digest_meal_data(MealTable())) == "You have no meals logged for that period."
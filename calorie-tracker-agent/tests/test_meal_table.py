@@ -0,0 +1,60 @@
+import json
+import math
+from array import array
+
+import pytest
+
+from meal_table import MealTable, decode_macros, decode_table
+
+ROWS = [
+    {'id': 'c', 'name': 'Dinner', 'calories': 700, 'protein': 30.5, 'created_at': '2025-03-02T18:00:00.000Z'},
+    {'id': 'b', 'name': 'Lunch', 'calories': 500, 'protein': None, 'created_at': '2025-03-01T12:00:00.000Z'},
+    {'id': 'a', 'name': 'Lunch', 'calories': 400, 'protein': 20.0, 'created_at': '2025-03-01T08:00:00.000Z'},
+]
+
+def test_columnar_and_row_encodings_decode_to_the_same_table():
+    from_rows = decode_table(json.dumps(ROWS))
+    columnar = decode_table(json.dumps({name: [row[name] for row in ROWS] for name in ROWS[0]}))
+    assert from_rows.fingerprint() == columnar.fingerprint()
+    assert list(from_rows.rows()) == ROWS
+
+def test_numbers_are_packed_and_nulls_survive():
+    table = MealTable.from_rows(ROWS)
+    assert isinstance(table.columns['calories'], array) and table.columns['calories'].typecode == 'q'
+    assert table.columns['protein'].typecode == 'd' and math.isnan(table.columns['protein'][1])
+    assert table.get(1, 'protein') is None
+    assert table.total('protein') == 50.5
+    assert table.total('calories') == 1600.0
+    assert table.values('missing') == [None, None, None]
+
+def test_spans_group_rows_by_day():
+    table = MealTable.from_rows(ROWS)
+    spans = table.spans('created_at', lambda created_at: created_at[:10])
+    assert spans == {'2025-03-02': [(0, 1)], '2025-03-01': [(1, 3)]}
+    assert table.select(spans['2025-03-01']).values('id') == ['b', 'a']
+    assert table.take([2, 0]).values('id') == ['a', 'c']
+
+def test_extend_and_truncate():
+    table = MealTable.from_rows(ROWS[:1])
+    table.extend(MealTable.from_rows(ROWS[1:]))
+    assert len(table) == 3 and table.values('calories') == [700, 500, 400]
+    table.truncate(2)
+    assert len(table) == 2 and table.values('id') == ['c', 'b']
+
+def test_columns_of_different_lengths_are_rejected():
+    with pytest.raises(ValueError):
+        MealTable({'a': [1, 2], 'b': [1]})
+
+@pytest.mark.parametrize('text', ['"Error: Unauthorized"', '{"meal_count": 1}', '[1, 2]'])
+def test_non_tables_are_rejected(text):
+    with pytest.raises(ValueError):
+        decode_table(text)
+
+def test_macros_decode_to_one_day_row():
+    table = decode_macros(json.dumps({'total_calories': 1600, 'total_protein': 50.5, 'total_carbs': None,
+                                      'total_fats': 12, 'meal_count': 3}), '2025-03-01')
+    assert list(table.rows()) == [{'day': '2025-03-01', 'meals': 3, 'calories': 1600, 'protein': 50.5,
+                                   'carbs': 0, 'fats': 12}]
+    empty = decode_macros(json.dumps({'total_calories': None, 'total_protein': None, 'total_carbs': None,
+                                      'total_fats': None, 'meal_count': 0}), '2025-03-01')
+    assert len(empty) == 0
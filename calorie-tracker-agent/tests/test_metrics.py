@@ -0,0 +1,29 @@
+from metrics import DEFAULT_BUCKETS, MetricsRegistry
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    seconds = registry.histogram('test_stage_seconds', 'Stage latency')
+    queries = registry.counter('test_queries_total', 'Queries by text')
+    for value in (0.003, 0.2, 100):
+        seconds.observe(value, {'stage': 'plan'})
+    question = 'say "hi"\\now\n'
+    queries.inc(labels={'query': question})
+    queries.inc(2, {'query': question})
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[:2] == ['# HELP test_stage_seconds Stage latency', '# TYPE test_stage_seconds histogram']
+    # Cumulative buckets in order, closed by +Inf holding every observation
+    buckets = [line for line in lines if line.startswith('test_stage_seconds_bucket')]
+    expected = [1 if bound < 0.2 else 2 for bound in DEFAULT_BUCKETS] + [3]
+    assert buckets == [f'test_stage_seconds_bucket{{stage="plan",le="{le}"}} {count}'
+                       for le, count in zip([repr(bound) for bound in DEFAULT_BUCKETS] + ['+Inf'], expected)]
+    assert 'test_stage_seconds_bucket{stage="plan",le="0.25"} 2' in buckets
+    sum_line, count_line = lines[2 + len(buckets):4 + len(buckets)]
+    assert sum_line.startswith('test_stage_seconds_sum{stage="plan"} ')
+    assert abs(float(sum_line.split()[-1]) - 100.203) < 1e-9
+    assert count_line == 'test_stage_seconds_count{stage="plan"} 3'
+
+    # Backslashes, quotes and newlines in label values are escaped
+    assert lines[-3:] == ['# HELP test_queries_total Queries by text', '# TYPE test_queries_total counter',
+                          'test_queries_total{query="say \\"hi\\"\\\\now\\n"} 3']
@@ -0,0 +1,80 @@
+import pytest
+
+from bench_fakes import FakeOllamaServer
+from model_router import ModelRouter
+from ollama_client import OllamaClient
+
+async def start_ollama(**kwargs) -> FakeOllamaServer:
+    server = FakeOllamaServer(token_latency=0, prompt_latency=0, answer_tokens=3, **kwargs)
+    await server.start()
+    return server
+
+def test_warm_up_uses_each_stages_options(run):
+    async def scenario():
+        server = await start_ollama()
+        client = OllamaClient(base_url=server.url, model='big')
+        router = ModelRouter(client, {
+            'answer': {'options': {'num_ctx': 8192}},
+            'analysis': {'model': 'small', 'options': {'num_ctx': 2048}},
+            'summary': {'options': {'num_ctx': 8192}},
+        })
+        try:
+            system = [{'role': 'system', 'content': 'You are helpful.'}]
+            await router.warm_up({'answer': system, 'analysis': system, 'summary': system})
+            warmed = [(data['model'], data['options']['num_ctx']) for data in server.received]
+            # summary shares answer's model and options, so it is warmed once
+            assert warmed == [('big', 8192), ('small', 2048)]
+
+            # The stage's first real call loads the model the same way
+            await router.chat('answer', system + [{'role': 'user', 'content': 'hi'}])
+            assert server.received[-1]['options']['num_ctx'] == 8192
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_failed_primary_falls_back(run):
+    async def scenario():
+        server = await start_ollama(failing_models=['big'])
+        client = OllamaClient(base_url=server.url, model='big')
+        router = ModelRouter(client, {'answer': {'fallback': 'small', 'cooldown': 60}})
+        try:
+            messages = [{'role': 'user', 'content': 'hi'}]
+            assert await router.chat('answer', messages) == 'token0 token1 token2 '
+            assert [data['model'] for data in server.received] == ['big', 'small']
+
+            # The primary stays skipped for the cool-down, streams included
+            assert router.select('answer') == ('small', True)
+            assert ''.join([text async for text in router.chat_stream('answer', messages)]) == 'token0 token1 token2 '
+            assert server.received[-1]['model'] == 'small'
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_failed_stream_falls_back_before_any_token(run):
+    async def scenario():
+        server = await start_ollama(failing_models=['big'])
+        client = OllamaClient(base_url=server.url, model='big')
+        router = ModelRouter(client, {'answer': {'fallback': 'small'}})
+        try:
+            texts = [text async for text in router.chat_stream('answer', [{'role': 'user', 'content': 'hi'}])]
+            assert ''.join(texts) == 'token0 token1 token2 '
+            assert [data['model'] for data in server.received] == ['big', 'small']
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_stages_without_a_fallback_raise(run):
+    async def scenario():
+        server = await start_ollama(failing_models=['big'])
+        client = OllamaClient(base_url=server.url, model='big')
+        router = ModelRouter(client, {})
+        try:
+            with pytest.raises(Exception, match='500'):
+                await router.chat('answer', [{'role': 'user', 'content': 'hi'}])
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+import pytest
+
+from bench_fakes import FakeOllamaServer
+from deadline import DeadlineExceeded, deadline
+from ollama_client import OllamaClient
+
+async def start_ollama(**kwargs) -> FakeOllamaServer:
+    server = FakeOllamaServer(token_latency=0, answer_tokens=3, **kwargs)
+    await server.start()
+    return server
+
+def test_half_open_circuit_admits_one_trial(run):
+    async def scenario():
+        server = await start_ollama(prompt_latency=0.2)
+        client = OllamaClient(base_url=server.url)
+        try:
+            # Opened long enough ago that the cool-down is over
+            client._consecutive_failures = client.failure_threshold
+            client._circuit_opened_at = time.monotonic() - client.reset_timeout - 1
+
+            results = await asyncio.gather(*(client.generate('hi') for _ in range(3)), return_exceptions=True)
+            assert sum(isinstance(result, str) for result in results) == 1
+            assert all('circuit open' in str(result) for result in results if not isinstance(result, str))
+            assert server.requests == 1
+
+            # The trial succeeded, so the circuit is closed again
+            assert not client.circuit_open and not client._trial_in_flight
+            await asyncio.gather(*(client.generate('hi') for _ in range(3)))
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_failed_trial_restarts_the_cool_down(run):
+    async def scenario():
+        server = await start_ollama(prompt_latency=0, error_rate=1.0)
+        client = OllamaClient(base_url=server.url)
+        try:
+            client._consecutive_failures = client.failure_threshold
+            client._circuit_opened_at = time.monotonic() - client.reset_timeout - 1
+            with pytest.raises(Exception, match='500'):
+                await client.generate('hi')
+            with pytest.raises(Exception, match='circuit open'):
+                await client.generate('hi')
+            assert not client._trial_in_flight
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_failing_backend_is_routed_around(run):
+    async def scenario():
+        bad = await start_ollama(prompt_latency=0, error_rate=1.0)
+        good = await start_ollama(prompt_latency=0)
+        client = OllamaClient(base_url=f"{bad.url},{good.url}")
+        try:
+            results = []
+            for _ in range(6):
+                try:
+                    results.append(await client.generate('hi'))
+                except Exception as e:
+                    results.append(e)
+
+            errors = [result for result in results if isinstance(result, Exception)]
+            assert len(errors) <= 1 and all('500' in str(error) for error in errors)
+            assert bad.requests <= 1 and good.requests >= 5
+            assert not client.circuit_open
+            assert [backend['available'] for backend in client.get_backend_stats()] == [False, True]
+        finally:
+            await client.disconnect()
+            await bad.stop()
+            await good.stop()
+    run(scenario())
+
+def test_circuit_opens_once_every_backend_fails(run):
+    async def scenario():
+        servers = [await start_ollama(prompt_latency=0, error_rate=1.0) for _ in range(2)]
+        client = OllamaClient(base_url=','.join(server.url for server in servers))
+        try:
+            for _ in range(client.failure_threshold + 1):
+                with pytest.raises(Exception):
+                    await client.generate('hi')
+            assert client.circuit_open
+        finally:
+            await client.disconnect()
+            for server in servers:
+                await server.stop()
+    run(scenario())
+
+def test_stalled_backend_is_routed_around(run):
+    async def scenario():
+        stalled = await start_ollama(prompt_latency=1)
+        good = await start_ollama(prompt_latency=0)
+        client = OllamaClient(base_url=f"{stalled.url},{good.url}")
+        client.request_timeout = 0.2
+        try:
+            results = []
+            for _ in range(6):
+                try:
+                    results.append(await client.generate('hi'))
+                except Exception as e:
+                    results.append(e)
+
+            errors = [result for result in results if isinstance(result, Exception)]
+            assert len(errors) == 1 and not isinstance(errors[0], DeadlineExceeded)
+            assert 'timed out' in str(errors[0])
+            assert good.requests == 5
+            assert [backend['available'] for backend in client.get_backend_stats()] == [False, True]
+        finally:
+            await client.disconnect()
+            await stalled.stop()
+            await good.stop()
+    run(scenario())
+
+def test_query_deadline_does_not_mark_the_backend_down(run):
+    async def scenario():
+        server = await start_ollama(prompt_latency=1)
+        client = OllamaClient(base_url=server.url)
+        try:
+            with deadline(0.2):
+                with pytest.raises(DeadlineExceeded):
+                    await client.generate('hi')
+            assert client.get_backend_stats()[0]['available']
+            assert client._consecutive_failures == 0
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
+
+def test_one_failure_does_not_cache_unhealthy(run):
+    async def scenario():
+        server = await start_ollama(prompt_latency=0, error_rate=1.0)
+        client = OllamaClient(base_url=server.url)
+        try:
+            assert await client.check_health()
+            with pytest.raises(Exception, match='500'):
+                await client.generate('hi')
+            assert not client.circuit_open
+            # Below the threshold the next check probes again (and /api/version still answers)
+            assert await client.check_health()
+        finally:
+            await client.disconnect()
+            await server.stop()
+    run(scenario())
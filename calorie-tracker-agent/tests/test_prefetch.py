@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from conftest import start_fake_mcp
+from bench_fakes import make_token
+from meal_summary import digest_meal_data
+from meal_table import MealTable
+from simple_agent import CalorieTrackerAgent
+
+TODAY_MEALS = {'intent': 'get_meals', 'needs_tool': True, 'user_id': 1}
+
+async def prefetch_for(db_path, user_id, query, analysis):
+    server = await start_fake_mcp(db_path)
+    agent = CalorieTrackerAgent(mcp_port=server.port, speculative_prefetch=True)
+    token = make_token(user_id)
+    try:
+        await agent.mcp_client.connect()
+        prefetch = agent._start_prefetch(token)
+        result = await agent._resolve_prefetch(prefetch, analysis, query)
+        today = agent._today()
+        tool = 'get_meal_macros' if 'protein' in query else 'get_user_meals'
+        direct = await agent.call_meal_tool(tool, user_id, today, today, token)
+        return agent, prefetch, result, direct
+    finally:
+        await agent.cleanup()
+        await server.stop()
+
+def test_prefetch_is_for_the_token_user(seeded_db, run):
+    agent, prefetch, result, direct = run(prefetch_for(seeded_db, '2', "What did I eat today?", TODAY_MEALS))
+    assert set(prefetch) == {'get_user_meals', 'get_meal_macros'}
+    assert prefetch['get_meal_macros'].cancelled()
+    assert isinstance(result, MealTable) and len(result)
+    assert set(result.values('user_id')) == {'2'}
+    assert result.fingerprint() == direct.fingerprint()
+    assert agent.prefetch_stats == {'hits': 1, 'misses': 0}
+
+def test_prefetched_macros_answer_a_totals_question(seeded_db, run):
+    agent, prefetch, result, direct = run(prefetch_for(seeded_db, '3', "How much protein did I have today?", TODAY_MEALS))
+    assert prefetch['get_user_meals'].cancelled()
+    assert result.fingerprint() == direct.fingerprint()
+    assert len(result) == 1 and result.get(0, 'meals') > 0
+
+    digest = json.loads(digest_meal_data(result, 'get_meal_macros'))
+    assert digest['meal_count'] == result.get(0, 'meals')
+    assert digest['first_day'] == digest['last_day'] == result.get(0, 'day')
+
+def test_other_intents_cancel_the_prefetch(seeded_db, run):
+    agent, prefetch, result, _ = run(prefetch_for(seeded_db, '1', "Tips for breakfast?",
+                                                  {'intent': 'other', 'needs_tool': False}))
+    assert result is None
+    assert all(task.cancelled() for task in prefetch.values())
+    assert agent.prefetch_stats == {'hits': 0, 'misses': 1}
+
+def test_no_prefetch_without_a_user_in_the_token(run):
+    async def main():
+        agent = CalorieTrackerAgent(speculative_prefetch=True)
+        try:
+            return agent._start_prefetch('not-a-jwt')
+        finally:
+            await agent.cleanup()
+    assert run(main()) is None
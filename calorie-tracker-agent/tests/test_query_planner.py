@@ -0,0 +1,21 @@
+import pytest
+
+from query_planner import plan_meal_query
+
+@pytest.mark.parametrize('query, date_from, date_to, tool', [
+    ("What did I eat today?", '2025-03-10', '2025-03-10', 'get_user_meals'),
+    ("How is my diet going?", '2025-03-10', '2025-03-10', 'get_user_meals'),
+    ("How much protein did I have today?", '2025-03-10', '2025-03-10', 'get_meal_macros'),
+    ("What are my macros today", '2025-03-10', '2025-03-10', 'get_meal_macros'),
+    ("How many calories did I eat today?", '2025-03-10', '2025-03-10', 'get_user_meals'),
+    ("What did I eat this week?", '2025-03-04', '2025-03-10', 'get_user_meals'),
+    ("How many calories did I have this week?", '2025-03-04', '2025-03-10', 'get_daily_totals'),
+    ("Show my meals in March", '2025-03-01', '2025-03-31', 'get_daily_totals'),
+    ("How many calories did I have this year?", '2025-01-01', '2025-12-31', 'get_weekly_totals'),
+])
+def test_cheapest_tool_for_the_question(query, date_from, date_to, tool):
+    assert plan_meal_query(query, date_from, date_to) == tool
+
+def test_limits_are_configurable():
+    assert plan_meal_query("What did I eat?", '2025-03-01', '2025-03-10', max_row_days=10) == 'get_user_meals'
+    assert plan_meal_query("Totals please", '2025-03-01', '2025-03-10', max_daily_days=5) == 'get_weekly_totals'
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+
+from response_cache import ResponseCache, cache_key, normalize_query
+
+def test_normalize_query_merges_trivial_variants():
+    assert normalize_query('  What did I   EAT today?! ') == normalize_query('what did i eat today')
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache('test', max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    cache.set('short', 'value', ttl=-1)
+    assert cache.get('short') is None
+    assert cache.get_stats()['evictions'] == 2
+
+def test_persistent_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache('answer', db_path=path)
+    cache.set(cache_key('user', 'question'), {'answer': 42})
+    cache.close()
+
+    restarted = ResponseCache('answer', db_path=path)
+    assert restarted.get(cache_key('user', 'question')) == {'answer': 42}
+    assert restarted.get_stats()['persistent_hits'] == 1
+    restarted.close()
+
+def test_writes_in_an_event_loop_are_batched_off_the_loop(tmp_path, run):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache('answer', db_path=path)
+    writes = []
+    write = cache._write
+
+    def recording_write(batch, generation):
+        writes.append((threading.get_ident(), len(batch)))
+        write(batch, generation)
+
+    cache._write = recording_write
+
+    async def main():
+        for index in range(50):
+            cache.set(f'key{index}', index)
+        # Nothing has touched the database on the loop
+        assert writes == []
+        await cache._flush_task
+        return threading.get_ident()
+
+    loop_thread = run(main())
+    assert sum(count for _, count in writes) == 50
+    assert len(writes) < 50
+    assert all(thread != loop_thread for thread, _ in writes)
+
+    evicted = ResponseCache('answer', max_size=1, db_path=path)
+    assert evicted.get('key7') == 7
+    cache.close()
+    evicted.close()
+
+def test_entries_evicted_before_their_write_are_still_found(tmp_path, run):
+    cache = ResponseCache('answer', max_size=1, db_path=str(tmp_path / 'cache.db'))
+
+    async def main():
+        cache.set('first', 1)
+        cache.set('second', 2)
+        # 'first' has left memory but its batch may not be written yet
+        value = cache.get('first')
+        await cache._flush_task
+        return value
+
+    assert run(main()) == 1
+    cache.close()
+
+def test_clear_drops_a_batch_taken_before_it(tmp_path):
+    cache = ResponseCache('answer', db_path=str(tmp_path / 'cache.db'))
+    cache._pending['stale'] = ('1', time.time() + 60)
+    # As a worker thread holding the batch would see it
+    batch, generation = cache._take_pending(), cache._generation
+    cache.clear()
+    cache._write(batch, generation)
+    assert cache.get('stale') is None
+    cache.close()
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ResponseCache('intent', db_path=str(tmp_path / 'cache.db'))
+    cache.set('key', 'value')
+    cache.clear()
+    assert cache.get('key') is None
+    assert cache.db.execute('SELECT COUNT(*) FROM cache_intent').fetchone() == (0,)
+    cache.close()
+
+def test_lookups_do_not_wait_for_a_commit_in_progress(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache('answer', db_path=path)
+    cache.set('key', 'value')
+    cache.entries.clear()
+
+    # As the worker thread sees it mid-batch: holding the lock with a write open
+    writer = sqlite3.connect(path)
+    writer.execute("INSERT INTO cache_answer VALUES ('other', '1', ?)", (time.time() + 60,))
+    found = []
+    with cache._db_lock:
+        lookup = threading.Thread(target=lambda: found.append(cache.get('key')))
+        lookup.start()
+        lookup.join(timeout=2)
+        blocked = lookup.is_alive()
+    lookup.join()
+    writer.rollback()
+    writer.close()
+    assert not blocked
+    assert found == ['value']
+    cache.close()
@@ -0,0 +1,556 @@
+// JSON-RPC handlers of the MCP server. index.js owns the logger, the
+// database connection, JWT verification and the TCP server; the handlers
+// get those passed in, so they run against any better-sqlite3 database
+// (the tests use an in-memory one).
+
+// get_user_meals page sizes: a cursor without a limit gets the default
+const DEFAULT_PAGE_SIZE = 200;
+const MAX_PAGE_SIZE = 1000;
+
+// Result encodings a client can ask for in initialize. 'columnar' sends the
+// rows of get_user_meals/get_daily_totals/get_weekly_totals as one array of
+// values per column instead of an array of objects repeating every key.
+const RESULT_ENCODINGS = ['columnar'];
+
+// Argument of the meal tools: the version of a result the client already
+// holds (see dataVersion)
+const IF_VERSION = {
+  type: "integer",
+  description: "version of an earlier result; if the user's meals haven't changed since, the reply is notModified with no content"
+};
+
+// Define tools
+export const tools = [
+  {
+    name: "get_user_meals",
+    description: "Get meals for the authenticated user, newest first, optionally filtered by date range. " +
+      "With limit (or cursor) the result is one page; pass the returned nextCursor to get the next one",
+    inputSchema: {
+      type: "object",
+      properties: {
+        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
+        date_to: { type: "string", description: "End date in YYYY-MM-DD format" },
+        timezone: { type: "string", description: "IANA time zone the dates are in, e.g. Europe/Berlin (default UTC)" },
+        limit: { type: "integer", description: `Meals per page, 1-${MAX_PAGE_SIZE}` },
+        cursor: { type: "string", description: "nextCursor of the previous page" },
+        if_version: IF_VERSION
+      },
+      required: []
+    }
+  },
+  {
+    name: "get_user_details",
+    description: "Get details of the authenticated user",
+    inputSchema: {
+      type: "object",
+      properties: {},
+      required: []
+    }
+  },
+  {
+    name: "get_daily_totals",
+    description: "Get the authenticated user's calories and macros summed per day, newest day first, optionally filtered by date range",
+    inputSchema: {
+      type: "object",
+      properties: {
+        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
+        date_to: { type: "string", description: "End date in YYYY-MM-DD format" },
+        timezone: { type: "string", description: "IANA time zone the dates are in, e.g. Europe/Berlin (default UTC)" },
+        if_version: IF_VERSION
+      },
+      required: []
+    }
+  },
+  {
+    name: "get_weekly_totals",
+    description: "Get the authenticated user's calories and macros summed per week (starting Monday), newest week first, optionally filtered by date range",
+    inputSchema: {
+      type: "object",
+      properties: {
+        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
+        date_to: { type: "string", description: "End date in YYYY-MM-DD format" },
+        timezone: { type: "string", description: "IANA time zone the dates are in, e.g. Europe/Berlin (default UTC)" },
+        if_version: IF_VERSION
+      },
+      required: []
+    }
+  },
+  {
+    name: "get_meal_macros",
+    description: "Get aggregated macros (calories, protein, carbs, fats) and the meal count from user's meals, optionally filtered by date range",
+    inputSchema: {
+      type: "object",
+      properties: {
+        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
+        date_to: { type: "string", description: "End date in YYYY-MM-DD format" },
+        timezone: { type: "string", description: "IANA time zone the dates are in, e.g. Europe/Berlin (default UTC)" },
+        if_version: IF_VERSION
+      },
+      required: []
+    }
+  }
+];
+
+function extractTokenFromAuthHeader(authHeader) {
+  if (!authHeader || !authHeader.startsWith('Bearer ')) {
+    return null;
+  }
+  return authHeader.substring(7);
+}
+
+
+const DAY_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+
+// Minutes `timeZone` (IANA name) is ahead of UTC at `instant`; throws a
+// RangeError for unknown zones
+function utcOffsetMinutes(timeZone, instant) {
+  const parts = new Intl.DateTimeFormat('en-US', {
+    timeZone, hourCycle: 'h23', year: 'numeric', month: '2-digit', day: '2-digit',
+    hour: '2-digit', minute: '2-digit', second: '2-digit'
+  }).formatToParts(instant);
+  const field = Object.fromEntries(parts.map(part => [part.type, Number(part.value)]));
+  const wallClock = Date.UTC(field.year, field.month - 1, field.day, field.hour, field.minute, field.second);
+  return Math.round((wallClock - Math.floor(instant.getTime() / 1000) * 1000) / 60000);
+}
+
+// The instant `day` (YYYY-MM-DD) starts in `timeZone`, or in UTC without one,
+// formatted like created_at (toISOString)
+function startOfDay(day, timeZone) {
+  const midnight = Date.parse(`${day}T00:00:00.000Z`);
+  if (!timeZone) {
+    return new Date(midnight).toISOString();
+  }
+  // Correct by the offset at the first guess too, in case a DST change
+  // falls between UTC and local midnight
+  const guess = midnight - utcOffsetMinutes(timeZone, new Date(midnight)) * 60000;
+  return new Date(midnight - utcOffsetMinutes(timeZone, new Date(guess)) * 60000).toISOString();
+}
+
+function nextDay(day) {
+  const date = new Date(`${day}T00:00:00.000Z`);
+  date.setUTCDate(date.getUTCDate() + 1);
+  return date.toISOString().slice(0, 10);
+}
+
+// Filter for the optional date_from/date_to tool arguments, inclusive
+// calendar dates in the IANA `timezone` argument (UTC if omitted). They
+// become a half-open created_at range so SQLite can seek the
+// (user_id, created_at) index instead of evaluating DATE() on every row.
+// `day` is the SQL expression that puts a row on its local calendar day.
+function dateRangeFilter(args) {
+  const { date_from, date_to, timezone } = args || {};
+  for (const day of [date_from, date_to]) {
+    if (day && (!DAY_PATTERN.test(day) || Number.isNaN(Date.parse(day)))) {
+      throw new RangeError(`Invalid date: ${day}`);
+    }
+  }
+
+  let sql = '';
+  const params = [];
+  if (date_from) {
+    sql += ' AND created_at >= ?';
+    params.push(startOfDay(date_from, timezone));
+  }
+  if (date_to) {
+    sql += ' AND created_at < ?';
+    params.push(startOfDay(nextDay(date_to), timezone));
+  }
+
+  // Rows are bucketed at the zone's offset at the end of the range, so days
+  // on the far side of a DST change shift by that hour
+  let day = 'DATE(created_at)';
+  if (timezone) {
+    const offset = utcOffsetMinutes(timezone, date_to ? new Date(params[params.length - 1]) : new Date());
+    if (offset !== 0) {
+      day = `DATE(created_at, '${offset} minutes')`;
+    }
+  }
+
+  // The same window over daily_totals days, when it starts and ends on UTC
+  // midnights and buckets by UTC day
+  let rollup = null;
+  if (day === 'DATE(created_at)' && params.every(bound => bound.endsWith('T00:00:00.000Z'))) {
+    rollup = { sql: '', params: [] };
+    if (date_from) {
+      rollup.sql += ' AND day >= ?';
+      rollup.params.push(params[0].slice(0, 10));
+    }
+    if (date_to) {
+      rollup.sql += ' AND day < ?';
+      rollup.params.push(params[params.length - 1].slice(0, 10));
+    }
+  }
+  return { sql, params, day, rollup };
+}
+
+// Keyset pagination for get_user_meals. A cursor is the (created_at, id) of
+// the last meal on the previous page, base64url-encoded; the next page starts
+// right after it in (created_at DESC, id DESC) order, so each page is a seek
+// on idx_meals_user_created however deep into the history it is.
+function encodeCursor(meal) {
+  return Buffer.from(JSON.stringify([meal.created_at, meal.id])).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+  let key;
+  try {
+    key = JSON.parse(Buffer.from(String(cursor), 'base64url').toString());
+  } catch (error) {
+    key = null;
+  }
+  if (!Array.isArray(key) || key.length !== 2 || !key.every(part => typeof part === 'string')) {
+    throw new RangeError('Invalid cursor');
+  }
+  return key;
+}
+
+// `{ sql, params, limit }` for the limit/cursor arguments; limit is null
+// (every row) when neither is given
+function pageFilter(args) {
+  const { limit, cursor } = args || {};
+  if (limit === undefined && !cursor) {
+    return { sql: '', params: [], limit: null };
+  }
+
+  const size = limit === undefined ? DEFAULT_PAGE_SIZE : limit;
+  if (!Number.isInteger(size) || size < 1 || size > MAX_PAGE_SIZE) {
+    throw new RangeError(`Invalid limit: ${JSON.stringify(limit)} (1-${MAX_PAGE_SIZE})`);
+  }
+  if (!cursor) {
+    return { sql: '', params: [], limit: size };
+  }
+  const [createdAt, mealId] = decodeCursor(cursor);
+  return {
+    sql: ' AND created_at <= ? AND (created_at < ? OR id < ?)',
+    params: [createdAt, createdAt, mealId],
+    limit: size
+  };
+}
+
+// JSON text of a row tool's result in the connection's encoding: an array of
+// row objects, or for 'columnar' an object of one array per column
+function encodeRows(rows, encoding) {
+  if (encoding !== 'columnar') {
+    return JSON.stringify(rows);
+  }
+  const columns = {};
+  for (const name of Object.keys(rows[0] || {})) {
+    columns[name] = rows.map(row => row[name]);
+  }
+  return JSON.stringify(columns);
+}
+
+// Per-bucket sums shared by the rollup tools; TOTAL() counts missing macros
+// as 0, as daily_totals does, so both sources give the same answer
+const TOTALS_COLUMNS = 'SUM(calories) AS calories, ' +
+  'ROUND(TOTAL(protein), 1) AS protein, ROUND(TOTAL(carbs), 1) AS carbs, ROUND(TOTAL(fats), 1) AS fats';
+
+// The message handlers bound to `db`. `logger` is a winston logger and
+// `verifyToken(token)` returns the token's claims, or null if it is invalid.
+export function createHandlers({ db, logger, verifyToken }) {
+  // daily_totals (kept by triggers the app installs) answers totals for whole
+  // UTC days in one row per day; databases without it use the meal rows.
+  //
+  // Per-user data versions (kept by triggers the app installs), bumped on any
+  // change to the user's meals. Results of the meal tools carry the version;
+  // a call whose if_version still matches is answered notModified without
+  // running its query. Databases without the table don't version results.
+  //
+  // The app creates both tables when it starts, which may be after this
+  // server, so they are looked for again whenever the schema changes.
+  const VERSIONED_TOOLS = new Set(['get_user_meals', 'get_daily_totals', 'get_weekly_totals', 'get_meal_macros']);
+  const schemaVersionStmt = db.prepare('PRAGMA schema_version').pluck();
+  const optionalTablesStmt = db.prepare(
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('daily_totals', 'data_versions')"
+  ).pluck();
+  let schemaVersion = null;
+  let hasDailyTotals = false;
+  let versionStmt = null;
+
+  function detectTables() {
+    const current = schemaVersionStmt.get();
+    if (current === schemaVersion) {
+      return;
+    }
+    schemaVersion = current;
+    const tables = new Set(optionalTablesStmt.all());
+    hasDailyTotals = tables.has('daily_totals');
+    versionStmt = tables.has('data_versions') ? db.prepare('SELECT version FROM data_versions WHERE user_id = ?') : null;
+    if (!hasDailyTotals) {
+      logger.warn('daily_totals table not found, totals will be computed from meal rows');
+    }
+    if (!versionStmt) {
+      logger.warn('data_versions table not found, tool results will not be versioned');
+    }
+  }
+  detectTables();
+
+  // The user's current data version (0 before their first meal), or null if
+  // the database has none. User ids are the app's TEXT ids (UUIDs), so they
+  // are bound as strings.
+  function dataVersion(userId) {
+    if (!versionStmt) {
+      return null;
+    }
+    const row = versionStmt.get(String(userId));
+    return row ? row.version : 0;
+  }
+
+  // Where the totals tools read from for these arguments: the daily_totals
+  // rollup when the window covers whole UTC days, otherwise the meal rows.
+  // `meals` and `days` are the aggregates counting meals and distinct days.
+  function totalsSource(args) {
+    const range = dateRangeFilter(args);
+    if (range.rollup && hasDailyTotals) {
+      return { table: 'daily_totals', ...range.rollup, day: 'day', meals: 'SUM(meals)', days: 'COUNT(*)' };
+    }
+    return {
+      table: 'meals', sql: range.sql, params: range.params, day: range.day,
+      meals: 'COUNT(*)', days: `COUNT(DISTINCT ${range.day})`
+    };
+  }
+
+  // JSON-RPC 2.0 batch: handle every request in the array and answer with a
+  // single array line. Handlers are synchronous, so the responses are all
+  // collected by the time the loop finishes.
+  function handleBatch(messages, socket) {
+    logger.info(`[${socket.remoteAddress}:${socket.remotePort}] batch of ${messages.length} requests`);
+
+    if (messages.length === 0) {
+      sendError(socket, null, 'Invalid Request', -32600);
+      return;
+    }
+
+    const responses = [];
+    for (const message of messages) {
+      if (!message || typeof message !== 'object' || Array.isArray(message)) {
+        sendError(responses, null, 'Invalid Request', -32600);
+        continue;
+      }
+      handleMessage(message, socket, responses);
+    }
+    socket.write(JSON.stringify(responses) + '\n');
+  }
+
+  // `channel` is where responses go: the socket itself, or the array a batch
+  // is collecting into
+  function handleMessage(message, socket, channel = socket) {
+    const { id, method, params, headers } = message;
+
+    logger.info(`[${socket.remoteAddress}:${socket.remotePort}] ${method} request id=${id}`);
+
+    switch (method) {
+      case 'initialize':
+        const initResponse = {
+          protocolVersion: '2024-11-05',
+          capabilities: {
+            tools: {}
+          },
+          serverInfo: {
+            name: 'calorie-tracker-mcp',
+            version: '1.0.0'
+          }
+        };
+        // The first encoding the client offers that we support applies to
+        // every later tool call on this connection
+        const offered = params?.capabilities?.experimental?.resultEncodings;
+        socket.resultEncoding = (Array.isArray(offered) ? offered : []).find(name => RESULT_ENCODINGS.includes(name)) || null;
+        if (socket.resultEncoding) {
+          initResponse.capabilities.experimental = { resultEncoding: socket.resultEncoding };
+        }
+        sendResponse(channel, id, initResponse);
+        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] initialize completed (result encoding: ${socket.resultEncoding || 'json'})`);
+        break;
+
+      case 'tools/list':
+        sendResponse(channel, id, { tools });
+        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] tools/list completed`);
+        break;
+
+      case 'tools/call':
+        // Validate authentication for tool calls
+        const authHeader = headers?.authorization || headers?.Authorization;
+        const token = extractTokenFromAuthHeader(authHeader);
+
+        if (!token) {
+          logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tools/call: missing authentication`);
+          sendError(channel, id, 'Authentication required', -32001);
+          break;
+        }
+
+        const decoded = verifyToken(token);
+        if (!decoded) {
+          logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tools/call: invalid token`);
+          sendError(channel, id, 'Invalid authentication token', -32001);
+          break;
+        }
+
+        handleToolCall(socket, id, params, decoded, channel);
+        break;
+
+      default:
+        logger.error(`[${socket.remoteAddress}:${socket.remotePort}] unknown method: ${method}`);
+        sendError(channel, id, 'Method not found', -32601);
+    }
+  }
+
+  function handleToolCall(socket, id, params, decodedToken, channel = socket) {
+    const { name, arguments: args } = params;
+
+    try {
+      detectTables();
+      // Read before the tool's query: a write in between leaves the result
+      // newer than its version, which only costs the client a refetch
+      const version = VERSIONED_TOOLS.has(name) ? dataVersion(decodedToken.userId) : null;
+      if (version !== null && args?.if_version === version) {
+        sendResponse(channel, id, { content: [], notModified: true, version });
+        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] ${name} not modified for user ${decodedToken.userId} (version ${version})`);
+        return;
+      }
+      const reply = result => sendResponse(channel, id, version === null ? result : { ...result, version });
+
+      switch (name) {
+        case 'get_user_meals': {
+          const userId = decodedToken.userId;
+          const range = dateRangeFilter(args);
+          const page = pageFilter(args);
+
+          // One row past the page tells whether there is a next one
+          let sql = `SELECT * FROM meals WHERE user_id = ?${range.sql}${page.sql} ORDER BY created_at DESC, id DESC`;
+          const params = [String(userId), ...range.params, ...page.params];
+          if (page.limit !== null) {
+            sql += ' LIMIT ?';
+            params.push(page.limit + 1);
+          }
+          const meals = db.prepare(sql).all(...params);
+
+          const result = {};
+          if (page.limit !== null && meals.length > page.limit) {
+            meals.length = page.limit;
+            result.nextCursor = encodeCursor(meals[meals.length - 1]);
+          }
+          const responseText = encodeRows(meals, socket.resultEncoding);
+          reply({
+            content: [{ type: 'text', text: responseText }],
+            ...result
+          });
+          logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_user_meals completed for user ${userId} (${meals.length} meals${result.nextCursor ? ', more to come' : ''})`);
+          break;
+        }
+
+        case 'get_user_details': {
+          const userId = decodedToken.userId;
+
+          const sql = 'SELECT id, username, created_at FROM users WHERE id = ?';
+          const stmt = db.prepare(sql);
+          const user = stmt.get(String(userId));
+
+          if (!user) {
+            sendError(channel, id, 'User not found', -32603);
+            break;
+          }
+
+          const responseText = JSON.stringify(user);
+          reply({
+            content: [{ type: 'text', text: responseText }]
+          });
+          logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_user_details completed for user ${userId}`);
+          break;
+        }
+
+        case 'get_daily_totals': {
+          const userId = decodedToken.userId;
+          const source = totalsSource(args);
+
+          const sql = `SELECT ${source.day} AS day, ${source.meals} AS meals, ${TOTALS_COLUMNS} FROM ${source.table} ` +
+            `WHERE user_id = ?${source.sql} GROUP BY day ORDER BY day DESC`;
+          const days = db.prepare(sql).all(String(userId), ...source.params);
+
+          reply({
+            content: [{ type: 'text', text: encodeRows(days, socket.resultEncoding) }]
+          });
+          logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_daily_totals completed for user ${userId} (${days.length} days from ${source.table})`);
+          break;
+        }
+
+        case 'get_weekly_totals': {
+          const userId = decodedToken.userId;
+          const source = totalsSource(args);
+
+          // Weeks start on Monday: the Sunday on or after the meal, minus six days
+          const sql = `SELECT DATE(${source.day}, 'weekday 0', '-6 days') AS week_start, ` +
+            `${source.days} AS days, MIN(${source.day}) AS first_day, MAX(${source.day}) AS last_day, ` +
+            `${source.meals} AS meals, ${TOTALS_COLUMNS} FROM ${source.table} ` +
+            `WHERE user_id = ?${source.sql} GROUP BY week_start ORDER BY week_start DESC`;
+          const weeks = db.prepare(sql).all(String(userId), ...source.params);
+
+          reply({
+            content: [{ type: 'text', text: encodeRows(weeks, socket.resultEncoding) }]
+          });
+          logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_weekly_totals completed for user ${userId} (${weeks.length} weeks from ${source.table})`);
+          break;
+        }
+
+        case 'get_meal_macros': {
+          const userId = decodedToken.userId;
+          const source = totalsSource(args);
+
+          const sql = 'SELECT SUM(calories) as total_calories, SUM(protein) as total_protein, SUM(carbs) as total_carbs, ' +
+            `SUM(fats) as total_fats, ${source.meals} as meal_count FROM ${source.table} WHERE user_id = ?${source.sql}`;
+          const stmt = db.prepare(sql);
+          const macros = stmt.get(String(userId), ...source.params);
+
+          const responseText = JSON.stringify(macros);
+          reply({
+            content: [{ type: 'text', text: responseText }]
+          });
+          logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_meal_macros completed for user ${userId}`);
+          break;
+        }
+
+        default:
+          logger.error(`[${socket.remoteAddress}:${socket.remotePort}] unknown tool: ${name}`);
+          sendError(channel, id, `Unknown tool: ${name}`, -32601);
+      }
+    } catch (error) {
+      logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tool error: ${error.message}`);
+      if (error instanceof RangeError) {
+        sendError(channel, id, `Invalid params: ${error.message}`, -32602);
+      } else {
+        sendError(channel, id, `Database error: ${error.message}`, -32603);
+      }
+    }
+  }
+
+  return { handleBatch, handleMessage, handleToolCall };
+}
+
+export function sendResponse(channel, id, result) {
+  const response = {
+    jsonrpc: '2.0',
+    id,
+    result
+  };
+  deliver(channel, response);
+}
+
+export function sendError(channel, id, message, code = -32000) {
+  const response = {
+    jsonrpc: '2.0',
+    id,
+    error: {
+      code,
+      message
+    }
+  };
+  deliver(channel, response);
+}
+
+// Write a response line to a socket, or append it to a batch being collected
+function deliver(channel, response) {
+  if (Array.isArray(channel)) {
+    channel.push(response);
+  } else {
+    channel.write(JSON.stringify(response) + '\n');
+  }
+}
@@ -6,6 +6,7 @@ import { fileURLToPath } from 'url';
 import net from 'net';
 import jwt from 'jsonwebtoken';
 import winston from 'winston';
+import { createHandlers, sendError } from './handlers.js';
 
 // Get the directory of the current module
 const __filename = fileURLToPath(import.meta.url);
@@ -43,8 +44,9 @@ const logger = winston.createLogger({
 // JWT configuration
 const JWT_SECRET = process.env.JWT_SECRET || 'your-super-secure-jwt-secret-key-change-this-in-production-2024';
 
-// Database connection (read-only)
-const dbPath = path.join(__dirname, '../../calorie_tracker.db');
+// Database connection (read-only); MCP_DB_PATH points it at another
+// database, e.g. a seeded copy for benchmarks and tests
+const dbPath = process.env.MCP_DB_PATH || path.join(__dirname, '../../calorie_tracker.db');
 logger.info('Database path:', dbPath);
 
 let db;
@@ -67,16 +69,11 @@ function verifyToken(token) {
   }
 }
 
-function extractTokenFromAuthHeader(authHeader) {
-  if (!authHeader || !authHeader.startsWith('Bearer ')) {
-    return null;
-  }
-  return authHeader.substring(7);
-}
+const { handleBatch, handleMessage } = createHandlers({ db, logger, verifyToken });
 
 // TCP Server setup
-const PORT = 3001 ;
-const HOST = '127.0.0.1';
+const PORT = Number(process.env.MCP_PORT) || 3001;
+const HOST = process.env.MCP_HOST || '127.0.0.1';
 
 const server = net.createServer((socket) => {
   logger.info(`Connection from ${socket.remoteAddress}:${socket.remotePort}`);
@@ -92,12 +89,19 @@ const server = net.createServer((socket) => {
 
     for (const message of messages) {
       if (message.trim()) {
+        let parsedMessage;
         try {
-          const parsedMessage = JSON.parse(message.trim());
-          handleMessage(parsedMessage, socket);
+          parsedMessage = JSON.parse(message.trim());
         } catch (error) {
           logger.error('Parse error:', error.message);
-          sendError(socket, -32700, 'Parse error');
+          sendError(socket, null, 'Parse error', -32700);
+          continue;
+        }
+
+        if (Array.isArray(parsedMessage)) {
+          handleBatch(parsedMessage, socket);
+        } else {
+          handleMessage(parsedMessage, socket);
         }
       }
     }
@@ -116,199 +120,6 @@ server.listen(PORT, HOST, () => {
   logger.info(`MCP server listening on ${HOST}:${PORT}`);
 });
 
-// Define tools
-const tools = [
-  {
-    name: "get_user_meals",
-    description: "Get meals for the authenticated user, optionally filtered by date range",
-    inputSchema: {
-      type: "object",
-      properties: {
-        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
-        date_to: { type: "string", description: "End date in YYYY-MM-DD format" }
-      },
-      required: []
-    }
-  },
-  {
-    name: "get_user_details",
-    description: "Get details of the authenticated user",
-    inputSchema: {
-      type: "object",
-      properties: {},
-      required: []
-    }
-  },
-  {
-    name: "get_meal_macros",
-    description: "Get aggregated macros (calories, protein, carbs, fats) from user's meals, optionally filtered by date range",
-    inputSchema: {
-      type: "object",
-      properties: {
-        date_from: { type: "string", description: "Start date in YYYY-MM-DD format" },
-        date_to: { type: "string", description: "End date in YYYY-MM-DD format" }
-      },
-      required: []
-    }
-  }
-];
-
-function handleMessage(message, socket) {
-  const { id, method, params, headers } = message;
-
-  logger.info(`[${socket.remoteAddress}:${socket.remotePort}] ${method} request id=${id}`);
-
-  switch (method) {
-    case 'initialize':
-      const initResponse = {
-        protocolVersion: '2024-11-05',
-        capabilities: {
-          tools: {}
-        },
-        serverInfo: {
-          name: 'calorie-tracker-mcp',
-          version: '1.0.0'
-        }
-      };
-      sendResponse(socket, id, initResponse);
-      logger.info(`[${socket.remoteAddress}:${socket.remotePort}] initialize completed`);
-      break;
-
-    case 'tools/list':
-      sendResponse(socket, id, { tools });
-      logger.info(`[${socket.remoteAddress}:${socket.remotePort}] tools/list completed`);
-      break;
-
-    case 'tools/call':
-      // Validate authentication for tool calls
-      const authHeader = headers?.authorization || headers?.Authorization;
-      const token = extractTokenFromAuthHeader(authHeader);
-
-      if (!token) {
-        logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tools/call: missing authentication`);
-        sendError(socket, id, 'Authentication required', -32001);
-        break;
-      }
-
-      const decoded = verifyToken(token);
-      if (!decoded) {
-        logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tools/call: invalid token`);
-        sendError(socket, id, 'Invalid authentication token', -32001);
-        break;
-      }
-
-      handleToolCall(socket, id, params, decoded);
-      break;
-
-    default:
-      logger.error(`[${socket.remoteAddress}:${socket.remotePort}] unknown method: ${method}`);
-      sendError(socket, id, 'Method not found', -32601);
-  }
-}
-
-function handleToolCall(socket, id, params, decodedToken) {
-  const { name, arguments: args } = params;
-
-  try {
-    switch (name) {
-      case 'get_user_meals': {
-        const userId = decodedToken.userId;
-        const { date_from, date_to } = args;
-
-        let sql = 'SELECT * FROM meals WHERE user_id = ?';
-        let params = [parseInt(userId)];
-
-        if (date_from && date_to) {
-          sql += ' AND DATE(created_at) BETWEEN ? AND ?';
-          params.push(date_from, date_to);
-        }
-
-        sql += ' ORDER BY created_at DESC';
-        const stmt = db.prepare(sql);
-        const meals = stmt.all(...params);
-
-        const responseText = JSON.stringify(meals, null, 2);
-        sendResponse(socket, id, {
-          content: [{ type: 'text', text: responseText }]
-        });
-        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_user_meals completed for user ${userId}`);
-        break;
-      }
-
-      case 'get_user_details': {
-        const userId = decodedToken.userId;
-
-        const sql = 'SELECT id, username, created_at FROM users WHERE id = ?';
-        const stmt = db.prepare(sql);
-        const user = stmt.get(parseInt(userId));
-
-        if (!user) {
-          sendError(socket, id, 'User not found', -32603);
-          break;
-        }
-
-        const responseText = JSON.stringify(user, null, 2);
-        sendResponse(socket, id, {
-          content: [{ type: 'text', text: responseText }]
-        });
-        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_user_details completed for user ${userId}`);
-        break;
-      }
-
-      case 'get_meal_macros': {
-        const userId = decodedToken.userId;
-        const { date_from, date_to } = args;
-
-        let sql = 'SELECT SUM(calories) as total_calories, SUM(protein) as total_protein, SUM(carbs) as total_carbs, SUM(fats) as total_fats FROM meals WHERE user_id = ?';
-        let params = [parseInt(userId)];
-
-        if (date_from && date_to) {
-          sql += ' AND DATE(created_at) BETWEEN ? AND ?';
-          params.push(date_from, date_to);
-        }
-
-        const stmt = db.prepare(sql);
-        const macros = stmt.get(...params);
-
-        const responseText = JSON.stringify(macros, null, 2);
-        sendResponse(socket, id, {
-          content: [{ type: 'text', text: responseText }]
-        });
-        logger.info(`[${socket.remoteAddress}:${socket.remotePort}] get_meal_macros completed for user ${userId}`);
-        break;
-      }
-
-      default:
-        logger.error(`[${socket.remoteAddress}:${socket.remotePort}] unknown tool: ${name}`);
-        sendError(socket, id, `Unknown tool: ${name}`, -32601);
-    }
-  } catch (error) {
-    logger.error(`[${socket.remoteAddress}:${socket.remotePort}] tool error: ${error.message}`);
-    sendError(socket, id, `Database error: ${error.message}`, -32603);
-  }
-}
-
-function sendResponse(socket, id, result) {
-  const response = {
-    jsonrpc: '2.0',
-    id,
-    result
-  };
-  socket.write(JSON.stringify(response) + '\n');
-}
-
-function sendError(socket, id, message, code = -32000) {
-  const response = {
-    jsonrpc: '2.0',
-    id,
-    error: {
-      code,
-      message
-    }
-  };
-  socket.write(JSON.stringify(response) + '\n');
-}
-
 // Graceful shutdown
 process.on('SIGINT', () => {
   logger.info('Shutting down MCP server...');
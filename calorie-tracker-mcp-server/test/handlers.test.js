@@ -0,0 +1,277 @@
+/**
+ * Tests of the MCP server's message handlers against an in-memory database
+ * built from the app's schema (src/lib/schema).
+ * Run with: npm run test:unit
+ */
+
+import { test, describe, beforeEach } from 'node:test';
+import assert from 'node:assert/strict';
+import fs from 'fs';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import Database from 'better-sqlite3';
+import { createHandlers } from '../src/handlers.js';
+
+const schemaDir = path.join(path.dirname(fileURLToPath(import.meta.url)), '../../src/lib/schema');
+const SCHEMA = ['tables', 'indexes', 'daily_totals', 'data_versions'];
+
+// App user ids are UUIDs; one starts with digits, which parseInt() would
+// have turned into a number
+const ALICE = '7f3c2a10-5b9e-4d1a-8c6f-2e0b9d4a1c37';
+const BOB = 'c41d8e2b-0a6f-4b3e-9d75-8f1e2a3b4c5d';
+const TOKENS = { alice: { userId: ALICE }, bob: { userId: BOB } };
+
+const logger = { info() {}, warn() {}, error() {} };
+
+function createDb(parts = SCHEMA) {
+  const db = new Database(':memory:');
+  for (const part of parts) {
+    db.exec(fs.readFileSync(path.join(schemaDir, `${part}.sql`), 'utf8'));
+  }
+  const addUser = db.prepare('INSERT INTO users (id, username, password) VALUES (?, ?, ?)');
+  addUser.run(ALICE, 'alice', 'x');
+  addUser.run(BOB, 'bob', 'x');
+  return db;
+}
+
+let mealCount = 0;
+function addMeal(db, userId, createdAt, calories, macros = {}) {
+  const id = `meal-${String(++mealCount).padStart(4, '0')}`;
+  db.prepare('INSERT INTO meals (id, user_id, name, calories, protein, carbs, fats, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+    .run(id, userId, `Meal ${mealCount}`, calories, macros.protein ?? null, macros.carbs ?? null, macros.fats ?? null, createdAt);
+  return id;
+}
+
+// A stand-in socket that keeps every line written to it, parsed
+function connect() {
+  const lines = [];
+  return { remoteAddress: '127.0.0.1', remotePort: 0, lines, write: line => lines.push(JSON.parse(line)) };
+}
+
+function setup(db) {
+  const handlers = createHandlers({ db, logger, verifyToken: token => TOKENS[token] || null });
+  const socket = connect();
+  const send = message => {
+    handlers.handleMessage({ jsonrpc: '2.0', id: 1, ...message }, socket);
+    return socket.lines.pop();
+  };
+  const callTool = (name, args = {}, token = 'alice') => send({
+    method: 'tools/call',
+    params: { name, arguments: args },
+    headers: { authorization: `Bearer ${token}` }
+  });
+  return { handlers, socket, send, callTool };
+}
+
+const rows = response => JSON.parse(response.result.content[0].text);
+
+describe('messages', () => {
+  test('tools/list names every tool', () => {
+    const { send } = setup(createDb());
+    const names = send({ method: 'tools/list' }).result.tools.map(tool => tool.name);
+    assert.deepEqual(names, ['get_user_meals', 'get_user_details', 'get_daily_totals', 'get_weekly_totals', 'get_meal_macros']);
+  });
+
+  test('tool calls need a valid token', () => {
+    const { send, callTool } = setup(createDb());
+    assert.equal(send({ method: 'tools/call', params: { name: 'get_user_meals' } }).error.code, -32001);
+    assert.equal(callTool('get_user_meals', {}, 'mallory').error.code, -32001);
+    assert.equal(send({ method: 'nope' }).error.code, -32601);
+  });
+
+  test('get_user_details finds UUID users', () => {
+    const { callTool } = setup(createDb());
+    assert.equal(rows(callTool('get_user_details')).username, 'alice');
+    assert.equal(rows(callTool('get_user_details', {}, 'bob')).username, 'bob');
+  });
+
+  test('a batch is answered with one array line, in order', () => {
+    const db = createDb();
+    addMeal(db, ALICE, '2025-03-01T12:00:00.000Z', 500);
+    const { handlers, socket } = setup(db);
+    const call = (id, name) => ({
+      jsonrpc: '2.0', id, method: 'tools/call', params: { name, arguments: {} },
+      headers: { authorization: 'Bearer alice' }
+    });
+
+    handlers.handleBatch([call(1, 'get_user_meals'), 5, call(2, 'get_meal_macros'), { jsonrpc: '2.0', id: 3, method: 'nope' }], socket);
+
+    assert.equal(socket.lines.length, 1);
+    const [meals, invalid, macros, unknown] = socket.lines[0];
+    assert.equal(meals.id, 1);
+    assert.equal(rows(meals).length, 1);
+    assert.deepEqual([invalid.id, invalid.error.code], [null, -32600]);
+    assert.equal(rows(macros).total_calories, 500);
+    assert.deepEqual([unknown.id, unknown.error.code], [3, -32601]);
+  });
+
+  test('an empty batch is an invalid request', () => {
+    const { handlers, socket } = setup(createDb());
+    handlers.handleBatch([], socket);
+    assert.equal(socket.lines[0].error.code, -32600);
+  });
+});
+
+describe('daily_totals', () => {
+  let db;
+  beforeEach(() => {
+    db = createDb();
+    addMeal(db, ALICE, '2025-03-01T08:00:00.000Z', 400, { protein: 20, carbs: 50 });
+    addMeal(db, ALICE, '2025-03-01T23:30:00.000Z', 600, { protein: 30, fats: 10 });
+    addMeal(db, ALICE, '2025-03-02T08:00:00.000Z', 700, { protein: 40, carbs: 60, fats: 20 });
+    addMeal(db, BOB, '2025-03-01T12:00:00.000Z', 900);
+  });
+
+  const totals = () => db.prepare('SELECT day, meals, calories, protein, carbs, fats FROM daily_totals WHERE user_id = ? ORDER BY day').all(ALICE);
+  const recomputed = () => db.prepare(
+    'SELECT DATE(created_at) AS day, COUNT(*) AS meals, SUM(calories) AS calories, TOTAL(protein) AS protein, ' +
+    'TOTAL(carbs) AS carbs, TOTAL(fats) AS fats FROM meals WHERE user_id = ? GROUP BY day ORDER BY day'
+  ).all(ALICE);
+
+  test('triggers keep the rollup equal to the meal rows', () => {
+    assert.deepEqual(totals(), recomputed());
+    assert.deepEqual(totals().map(day => [day.day, day.meals, day.calories]), [['2025-03-01', 2, 1000], ['2025-03-02', 1, 700]]);
+
+    db.prepare("UPDATE meals SET created_at = '2025-03-02T09:00:00.000Z', calories = 650 WHERE calories = 600").run();
+    assert.deepEqual(totals(), recomputed());
+    db.prepare('DELETE FROM meals WHERE calories = 400').run();
+    assert.deepEqual(totals(), recomputed());
+    assert.deepEqual(totals().map(day => day.day), ['2025-03-02']);
+  });
+
+  test('whole UTC days are read from the rollup, other zones from the meal rows', () => {
+    const { callTool } = setup(db);
+    // Only the rollup sees this, so it shows which source answered
+    db.prepare("UPDATE daily_totals SET calories = 1 WHERE user_id = ? AND day = '2025-03-01'").run(ALICE);
+
+    const utc = rows(callTool('get_daily_totals', { date_from: '2025-03-01', date_to: '2025-03-02' }));
+    assert.deepEqual(utc.map(day => [day.day, day.meals, day.calories]), [['2025-03-02', 1, 700], ['2025-03-01', 2, 1]]);
+
+    // Tokyo is UTC+9: the 23:30 meal falls on March 2nd there
+    const tokyo = rows(callTool('get_daily_totals', { date_from: '2025-03-01', date_to: '2025-03-02', timezone: 'Asia/Tokyo' }));
+    assert.deepEqual(tokyo.map(day => [day.day, day.meals, day.calories]), [['2025-03-02', 2, 1300], ['2025-03-01', 1, 400]]);
+  });
+
+  test('weekly totals and macros sum the same days', () => {
+    const { callTool } = setup(db);
+    const [week] = rows(callTool('get_weekly_totals', { date_from: '2025-03-01', date_to: '2025-03-02' }));
+    assert.deepEqual([week.week_start, week.days, week.meals, week.calories, week.protein], ['2025-02-24', 2, 3, 1700, 90]);
+
+    const macros = rows(callTool('get_meal_macros', { date_from: '2025-03-01', date_to: '2025-03-01' }));
+    assert.deepEqual(macros, { total_calories: 1000, total_protein: 50, total_carbs: 50, total_fats: 10, meal_count: 2 });
+  });
+
+  test('invalid dates are invalid params', () => {
+    const { callTool } = setup(db);
+    assert.equal(callTool('get_daily_totals', { date_from: '2025-13-45' }).error.code, -32602);
+  });
+});
+
+describe('get_user_meals pages', () => {
+  let db;
+  let ids;
+  beforeEach(() => {
+    db = createDb();
+    ids = [];
+    for (const createdAt of ['2025-03-01T08:00:00.000Z', '2025-03-01T12:00:00.000Z', '2025-03-01T12:00:00.000Z',
+      '2025-03-01T12:00:00.000Z', '2025-03-02T08:00:00.000Z']) {
+      ids.push(addMeal(db, ALICE, createdAt, 100));
+    }
+    addMeal(db, BOB, '2025-03-01T12:00:00.000Z', 100);
+  });
+
+  test('cursors walk every meal once, newest first, ties by id', () => {
+    const { callTool } = setup(db);
+    const seen = [];
+    let cursor;
+    let pages = 0;
+    do {
+      const response = callTool('get_user_meals', cursor ? { limit: 2, cursor } : { limit: 2 });
+      seen.push(...rows(response).map(meal => meal.id));
+      cursor = response.result.nextCursor;
+      pages++;
+    } while (cursor);
+
+    assert.equal(pages, 3);
+    assert.deepEqual(seen, [ids[4], ids[3], ids[2], ids[1], ids[0]]);
+  });
+
+  test('without limit or cursor every meal comes back in one result', () => {
+    const { callTool } = setup(db);
+    const response = callTool('get_user_meals', { date_from: '2025-03-01', date_to: '2025-03-01' });
+    assert.equal(rows(response).length, 4);
+    assert.equal(response.result.nextCursor, undefined);
+  });
+
+  test('bad limits and cursors are invalid params', () => {
+    const { callTool } = setup(db);
+    assert.equal(callTool('get_user_meals', { limit: 0 }).error.code, -32602);
+    assert.equal(callTool('get_user_meals', { limit: 5000 }).error.code, -32602);
+    assert.equal(callTool('get_user_meals', { cursor: 'not-a-cursor' }).error.code, -32602);
+  });
+
+  test('columnar results hold one array per column', () => {
+    const { send, callTool } = setup(db);
+    const init = send({ method: 'initialize', params: { capabilities: { experimental: { resultEncodings: ['arrow', 'columnar'] } } } });
+    assert.deepEqual(init.result.capabilities.experimental, { resultEncoding: 'columnar' });
+
+    const columns = rows(callTool('get_user_meals', { limit: 3 }));
+    assert.deepEqual(columns.id, [ids[4], ids[3], ids[2]]);
+    assert.deepEqual(columns.calories, [100, 100, 100]);
+    assert.deepEqual(columns.user_id, [ALICE, ALICE, ALICE]);
+
+    const days = rows(callTool('get_daily_totals'));
+    assert.deepEqual(days.day, ['2025-03-02', '2025-03-01']);
+  });
+
+  test('connections that offer no known encoding get row objects', () => {
+    const { send, callTool } = setup(db);
+    const init = send({ method: 'initialize', params: { capabilities: { experimental: { resultEncodings: ['arrow'] } } } });
+    assert.equal(init.result.capabilities.experimental, undefined);
+    assert.ok(Array.isArray(rows(callTool('get_user_meals', { limit: 1 }))));
+  });
+});
+
+describe('data versions', () => {
+  test('an unchanged if_version is answered notModified', () => {
+    const db = createDb();
+    addMeal(db, ALICE, '2025-03-01T12:00:00.000Z', 500);
+    const { callTool } = setup(db);
+
+    const first = callTool('get_daily_totals');
+    const { version } = first.result;
+    assert.ok(version > 0);
+
+    const again = callTool('get_daily_totals', { if_version: version });
+    assert.deepEqual(again.result, { content: [], notModified: true, version });
+
+    // Bob's meals leave Alice's version alone
+    addMeal(db, BOB, '2025-03-01T12:00:00.000Z', 900);
+    assert.equal(callTool('get_daily_totals', { if_version: version }).result.notModified, true);
+
+    addMeal(db, ALICE, '2025-03-01T13:00:00.000Z', 300);
+    const changed = callTool('get_daily_totals', { if_version: version });
+    assert.equal(changed.result.notModified, undefined);
+    assert.ok(changed.result.version > version);
+    assert.equal(rows(changed)[0].calories, 800);
+  });
+
+  test('users without meals are at version 0', () => {
+    const { callTool } = setup(createDb());
+    assert.equal(callTool('get_user_meals').result.version, 0);
+    assert.equal(callTool('get_user_details').result.version, undefined);
+  });
+
+  test('tables the app creates after startup are picked up', () => {
+    const db = createDb(['tables', 'indexes']);
+    const { callTool } = setup(db);
+    addMeal(db, ALICE, '2025-03-01T12:00:00.000Z', 500);
+    assert.equal(callTool('get_user_meals').result.version, undefined);
+
+    db.exec(fs.readFileSync(path.join(schemaDir, 'data_versions.sql'), 'utf8'));
+    addMeal(db, ALICE, '2025-03-01T13:00:00.000Z', 300);
+    const response = callTool('get_user_meals');
+    assert.ok(response.result.version > 0);
+    assert.equal(rows(response).length, 2);
+  });
+});
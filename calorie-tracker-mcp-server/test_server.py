@@ -9,10 +9,16 @@ import asyncio
 import sys
 import os
 
+# index.js listens on TCP rather than stdin/stdout
+HOST = '127.0.0.1'
+PORT = 3001
+
 class MCPTester:
     def __init__(self, server_path):
         self.server_path = server_path
         self.process = None
+        self.reader = None
+        self.writer = None
 
     async def start_server(self):
         """Start the MCP server as a subprocess"""
@@ -31,14 +37,25 @@ class MCPTester:
                 stderr=subprocess.PIPE
             )
             print("MCP server process started")
-            return True
         except Exception as e:
             print(f"ERROR: Failed to start server: {e}")
             return False
 
+        # Wait for the server to start listening
+        for _ in range(50):
+            try:
+                self.reader, self.writer = await asyncio.open_connection(HOST, PORT)
+                print(f"Connected to MCP server at {HOST}:{PORT}")
+                return True
+            except OSError:
+                await asyncio.sleep(0.1)
+
+        print(f"ERROR: Could not connect to MCP server at {HOST}:{PORT}")
+        return False
+
     async def send_request(self, request):
         """Send a JSON-RPC request to the server"""
-        if not self.process:
+        if not self.writer:
             print("ERROR: Server not started")
             return None
 
@@ -47,11 +64,11 @@ class MCPTester:
             request_json = json.dumps(request) + '\n'
             print(f"Sending request: {request_json.strip()}")
 
-            self.process.stdin.write(request_json.encode())
-            await self.process.stdin.drain()
+            self.writer.write(request_json.encode())
+            await self.writer.drain()
 
             # Read response
-            response_line = await self.process.stdout.readline()
+            response_line = await self.reader.readline()
             if not response_line:
                 print("ERROR: No response from server")
                 return None
@@ -154,6 +171,9 @@ class MCPTester:
 
     async def stop_server(self):
         """Stop the MCP server"""
+        if self.writer:
+            self.writer.close()
+            self.writer = None
         if self.process:
             print("\nStopping MCP server...")
             self.process.terminate()
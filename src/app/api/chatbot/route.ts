@@ -18,6 +18,66 @@ async function getUserFromJWT() {
   return decoded ? decoded.userId : null;
 }
 
+// Base URL of the agent service started with `python simple_agent.py --serve`
+const AGENT_URL = process.env.AGENT_URL || 'http://127.0.0.1:3003';
+
+// Upper bound on one chatbot answer, slightly above the agent's own
+// AGENT_QUERY_TIMEOUT so the agent's fallback answer normally wins the race
+const AGENT_TIMEOUT_MS = Number(process.env.AGENT_TIMEOUT_MS) || 65000;
+
+// Run the agent as a one-shot Python process (slow path)
+function runAgentProcess(query: string, jwtToken: string): Promise<NextResponse> {
+  // Path to the Python agent script
+  const agentPath = path.join(process.cwd(), 'calorie-tracker-agent', 'simple_agent.py');
+
+  // Spawn Python process with query and JWT token as arguments
+  const pythonProcess = spawn('python', [agentPath, query, '1', jwtToken], {
+    cwd: path.join(process.cwd(), 'calorie-tracker-agent'),
+    stdio: ['pipe', 'pipe', 'pipe'],
+    // Killed with SIGTERM if it runs past the deadline
+    timeout: AGENT_TIMEOUT_MS,
+  });
+
+  let response = '';
+  let errorOutput = '';
+
+  // Collect stdout
+  pythonProcess.stdout.on('data', (data) => {
+    response += data.toString();
+  });
+
+  // Collect stderr
+  pythonProcess.stderr.on('data', (data) => {
+    errorOutput += data.toString();
+  });
+
+  // Wait for process to complete
+  return new Promise((resolve) => {
+    pythonProcess.on('close', (code, signal) => {
+      if (code === 0) {
+        // Success
+        resolve(NextResponse.json({ response: response.trim() }));
+      } else if (signal === 'SIGTERM') {
+        logger.error('Agent process timed out');
+        resolve(NextResponse.json({ error: 'Gateway Timeout' }, { status: 504 }));
+      } else {
+        // Error
+        logger.error('Agent process error:', errorOutput);
+        resolve(NextResponse.json({
+          error: 'Internal server error'
+        }, { status: 500 }));
+      }
+    });
+
+    pythonProcess.on('error', (error) => {
+      logger.error('Failed to start agent process:', error);
+      resolve(NextResponse.json({
+        error: 'Internal server error'
+      }, { status: 500 }));
+    });
+  });
+}
+
 export async function POST(request: NextRequest) {
   try {
     // Get JWT token for authentication
@@ -29,56 +89,51 @@ export async function POST(request: NextRequest) {
     }
 
     // Get query from request body
-    const { query } = await request.json();
+    const { query, stream, sessionId } = await request.json();
     if (!query || typeof query !== 'string') {
       logger.error('Chatbot failed: Query is required');
       return NextResponse.json({ error: 'Bad Request' }, { status: 400 });
     }
 
-    // Path to the Python agent script
-    const agentPath = path.join(process.cwd(), 'calorie-tracker-agent', 'simple_agent.py');
-
-    // Spawn Python process with query and JWT token as arguments
-    const pythonProcess = spawn('python', [agentPath, query, '1', jwtToken], {
-      cwd: path.join(process.cwd(), 'calorie-tracker-agent'),
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-
-    let response = '';
-    let errorOutput = '';
+    // Forward to the long-running agent service, which keeps its MCP and
+    // Ollama connections warm across requests
+    try {
+      const agentResponse = await fetch(`${AGENT_URL}/${stream ? 'query/stream' : 'query'}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query, jwt: jwtToken, session_id: sessionId }),
+        // Covers reading the streamed body too; aborts the agent request
+        signal: AbortSignal.timeout(AGENT_TIMEOUT_MS),
+      });
 
-    // Collect stdout
-    pythonProcess.stdout.on('data', (data) => {
-      response += data.toString();
-    });
+      if (!agentResponse.ok) {
+        logger.error('Agent service error:', agentResponse.status);
+        return NextResponse.json({ error: 'Internal server error' }, { status: 500 });
+      }
 
-    // Collect stderr
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
+      // Pass the answer's chunks through to the browser as they arrive
+      if (stream && agentResponse.body) {
+        return new NextResponse(agentResponse.body, {
+          headers: {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'Cache-Control': 'no-cache',
+          },
+        });
+      }
 
-    // Wait for process to complete
-    return new Promise((resolve) => {
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          // Success
-          resolve(NextResponse.json({ response: response.trim() }));
-        } else {
-          // Error
-          logger.error('Agent process error:', errorOutput);
-          resolve(NextResponse.json({
-            error: 'Internal server error'
-          }, { status: 500 }));
-        }
-      });
+      const data = await agentResponse.json();
+      return NextResponse.json({ response: data.response });
+    } catch (error) {
+      // A slow agent isn't a missing one; don't start a second attempt
+      if (error instanceof Error && (error.name === 'TimeoutError' || error.name === 'AbortError')) {
+        logger.error('Agent service timed out');
+        return NextResponse.json({ error: 'Gateway Timeout' }, { status: 504 });
+      }
 
-      pythonProcess.on('error', (error) => {
-        logger.error('Failed to start agent process:', error);
-        resolve(NextResponse.json({
-          error: 'Internal server error'
-        }, { status: 500 }));
-      });
-    });
+      // Service not running: fall back to a one-shot agent process
+      logger.error('Agent service unavailable, spawning agent process:', error);
+      return runAgentProcess(query, jwtToken);
+    }
 
   } catch (error) {
     logger.error('Chatbot API error:', error);
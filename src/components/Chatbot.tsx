@@ -20,6 +20,8 @@ export default function Chatbot() {
   ]);
   const [inputMessage, setInputMessage] = useState('');
   const [isTyping, setIsTyping] = useState(false);
+  // Lets the agent remember earlier questions in this chat
+  const [sessionId] = useState(() => crypto.randomUUID());
 
   const handleSendMessage = async () => {
     if (!inputMessage.trim()) return;
@@ -45,9 +47,33 @@ export default function Chatbot() {
           'Content-Type': 'application/json',
         },
         credentials: 'include',
-        body: JSON.stringify({ query: currentMessage }),
+        body: JSON.stringify({ query: currentMessage, stream: true, sessionId }),
       });
 
+      // Streamed answer: show the bot message and grow it chunk by chunk
+      if (response.ok && response.body && response.headers.get('content-type')?.startsWith('text/plain')) {
+        const botMessageId = messages.length + 2;
+        setMessages(prev => [...prev, {
+          id: botMessageId,
+          text: '',
+          sender: 'bot',
+          timestamp: new Date()
+        }]);
+        setIsTyping(false);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          const chunk = decoder.decode(value, { stream: true });
+          setMessages(prev => prev.map(message =>
+            message.id === botMessageId ? { ...message, text: message.text + chunk } : message
+          ));
+        }
+        return;
+      }
+
       const data = await response.json();
 
       if (response.ok) {
@@ -0,0 +1,101 @@
+/**
+ * @jest-environment node
+ */
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import Database from 'better-sqlite3';
+
+// db.ts drops and recreates its tables on import, so point it at a scratch
+// file (before requiring it) and inspect that file over a second connection
+const dbFile = path.join(fs.mkdtempSync(path.join(os.tmpdir(), 'calorie-db-')), 'test.db');
+process.env.DATABASE_PATH = dbFile;
+// eslint-disable-next-line @typescript-eslint/no-var-requires
+const { createUser, createMeal, deleteMeal, getMealsByUserAndDateRange } = require('./db');
+
+const inspect = new Database(dbFile);
+
+const insertMeal = (id: string, userId: string, calories: number, createdAt: string) => {
+  inspect.prepare('INSERT INTO meals (id, user_id, name, calories, protein, created_at) VALUES (?, ?, ?, ?, ?, ?)')
+    .run(id, userId, `Meal ${id}`, calories, 10, createdAt);
+};
+
+const dailyTotals = (userId: string) =>
+  inspect.prepare('SELECT day, meals, calories, protein, carbs FROM daily_totals WHERE user_id = ? ORDER BY day')
+    .all(userId);
+
+const dataVersion = (userId: string) =>
+  (inspect.prepare('SELECT version FROM data_versions WHERE user_id = ?').get(userId) as { version: number } | undefined)
+    ?.version;
+
+afterAll(() => {
+  inspect.close();
+});
+
+describe('daily_totals triggers', () => {
+  it('keeps the per-day sums in step with inserts, updates and deletes', () => {
+    const userId = createUser('rollup', 'x');
+    const today = new Date().toISOString().slice(0, 10);
+
+    const first = createMeal(userId, 'Oatmeal', 300, 10, null, 5);
+    const second = createMeal(userId, 'Pasta', 700, 20, 90, 15);
+    expect(dailyTotals(userId)).toEqual([{ day: today, meals: 2, calories: 1000, protein: 30, carbs: 90 }]);
+
+    inspect.prepare('UPDATE meals SET created_at = ?, calories = ? WHERE id = ?').run('2024-01-01T10:00:00.000Z', 350, first);
+    expect(dailyTotals(userId)).toEqual([
+      { day: '2024-01-01', meals: 1, calories: 350, protein: 10, carbs: 0 },
+      { day: today, meals: 1, calories: 700, protein: 20, carbs: 90 },
+    ]);
+
+    deleteMeal(second, userId);
+    expect(dailyTotals(userId)).toEqual([{ day: '2024-01-01', meals: 1, calories: 350, protein: 10, carbs: 0 }]);
+  });
+
+  it('bumps the user\'s data version on every change', () => {
+    const userId = createUser('versions', 'x');
+    expect(dataVersion(userId)).toBeUndefined();
+
+    const mealId = createMeal(userId, 'Soup', 200);
+    const created = dataVersion(userId)!;
+    inspect.prepare('UPDATE meals SET calories = 250 WHERE id = ?').run(mealId);
+    const updated = dataVersion(userId)!;
+    deleteMeal(mealId, userId);
+
+    expect(created).toBeGreaterThan(0);
+    expect(updated).toBeGreaterThan(created);
+    expect(dataVersion(userId)!).toBeGreaterThan(updated);
+  });
+});
+
+describe('getMealsByUserAndDateRange', () => {
+  const userId = 'range-user';
+
+  beforeAll(() => {
+    inspect.prepare('INSERT INTO users (id, username, password) VALUES (?, ?, ?)').run(userId, 'range', 'x');
+    insertMeal('before', userId, 100, '2024-02-29T23:59:59.999Z');
+    insertMeal('start', userId, 200, '2024-03-01T00:00:00.000Z');
+    insertMeal('end', userId, 300, '2024-03-01T23:59:59.999Z');
+    insertMeal('after', userId, 400, '2024-03-02T00:00:00.000Z');
+  });
+
+  it('covers the whole days, end day included, as a half-open range', () => {
+    const meals = getMealsByUserAndDateRange(userId, '2024-03-01', '2024-03-01') as { id: string }[];
+    expect(meals.map(meal => meal.id)).toEqual(['end', 'start']);
+  });
+
+  it('uses the day boundaries of the time zone', () => {
+    // Tokyo is UTC+9: 1 March there runs from 29 Feb 15:00 to 1 March 15:00 UTC
+    const meals = getMealsByUserAndDateRange(userId, '2024-03-01', '2024-03-01', 'Asia/Tokyo') as { id: string }[];
+    expect(meals.map(meal => meal.id)).toEqual(['start', 'before']);
+  });
+
+  it('seeks idx_meals_user_created', () => {
+    const plan = (sql: string) => (inspect.prepare(`EXPLAIN QUERY PLAN ${sql}`).all(userId, 'a', 'b') as { detail: string }[])
+      .map(step => step.detail).join('\n');
+
+    expect(plan('SELECT * FROM meals WHERE user_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC'))
+      .toContain('USING INDEX idx_meals_user_created (user_id=? AND created_at>? AND created_at<?)');
+    expect(plan('SELECT SUM(calories), SUM(protein) FROM meals WHERE user_id = ? AND created_at >= ? AND created_at < ?'))
+      .toContain('USING COVERING INDEX idx_meals_user_created');
+  });
+});
@@ -1,39 +1,27 @@
 import Database from 'better-sqlite3';
+import fs from 'fs';
 import path from 'path';
 import { v4 as uuidv4 } from 'uuid';
 
-// Initialize database
-const dbPath = path.join(process.cwd(), 'calorie_tracker.db');
+// Initialize database (DATABASE_PATH points tests at a scratch file)
+const dbPath = process.env.DATABASE_PATH || path.join(process.cwd(), 'calorie_tracker.db');
 const db = new Database(dbPath);
 
 // Drop tables if they exist to ensure schema is updated
 db.exec(`
+  DROP TABLE IF EXISTS daily_totals;
+  DROP TABLE IF EXISTS data_versions;
   DROP TABLE IF EXISTS meals;
   DROP TABLE IF EXISTS users;
 `);
 
-// Create tables
-db.exec(`
-  CREATE TABLE users (
-    id TEXT PRIMARY KEY,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-  );
-
-  CREATE TABLE meals (
-    id TEXT PRIMARY KEY,
-    user_id TEXT NOT NULL,
-    name TEXT NOT NULL,
-    calories INTEGER NOT NULL,
-    protein REAL,
-    carbs REAL,
-    fats REAL,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    image_url TEXT,
-    FOREIGN KEY (user_id) REFERENCES users (id)
-  );
-`);
+// Create tables, the meal index, and the daily_totals and data_versions
+// rollups with their triggers. The SQL lives in src/lib/schema so the
+// agent's tools and tests build the same schema (calorie-tracker-agent/schema.py).
+const schemaDir = path.join(process.cwd(), 'src', 'lib', 'schema');
+for (const part of ['tables', 'indexes', 'daily_totals', 'data_versions']) {
+  db.exec(fs.readFileSync(path.join(schemaDir, `${part}.sql`), 'utf8'));
+}
 
 // Add image_url column to existing meals table if it doesn't exist
 try {
@@ -97,7 +85,34 @@ export const deleteMeal = (mealId: string, userId: string) => {
   return stmt.run(mealId, userId);
 };
 
-export const getMealsByUserAndDateRange = (userId: string, startDate: string, endDate: string) => {
-  const stmt = db.prepare('SELECT * FROM meals WHERE user_id = ? AND DATE(created_at) BETWEEN ? AND ? ORDER BY created_at DESC');
-  return stmt.all(userId, startDate, endDate);
+// Minutes `timeZone` (IANA name) is ahead of UTC at `instant`
+const utcOffsetMinutes = (timeZone: string, instant: Date) => {
+  const parts = new Intl.DateTimeFormat('en-US', {
+    timeZone, hourCycle: 'h23', year: 'numeric', month: '2-digit', day: '2-digit',
+    hour: '2-digit', minute: '2-digit', second: '2-digit'
+  }).formatToParts(instant);
+  const field = Object.fromEntries(parts.map(part => [part.type, Number(part.value)]));
+  const wallClock = Date.UTC(field.year, field.month - 1, field.day, field.hour, field.minute, field.second);
+  return Math.round((wallClock - Math.floor(instant.getTime() / 1000) * 1000) / 60000);
+};
+
+// The instant `day` (YYYY-MM-DD) starts in `timeZone` (UTC if omitted), in
+// the toISOString format created_at is stored in
+const startOfDay = (day: string, timeZone?: string) => {
+  const midnight = Date.parse(`${day}T00:00:00.000Z`);
+  if (!timeZone) {
+    return new Date(midnight).toISOString();
+  }
+  const guess = midnight - utcOffsetMinutes(timeZone, new Date(midnight)) * 60000;
+  return new Date(midnight - utcOffsetMinutes(timeZone, new Date(guess)) * 60000).toISOString();
+};
+
+// startDate and endDate are inclusive calendar dates in timeZone. They are
+// compared as a half-open created_at range so the query can use
+// idx_meals_user_created.
+export const getMealsByUserAndDateRange = (userId: string, startDate: string, endDate: string, timeZone?: string) => {
+  const end = new Date(`${endDate}T00:00:00.000Z`);
+  end.setUTCDate(end.getUTCDate() + 1);
+  const stmt = db.prepare('SELECT * FROM meals WHERE user_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC');
+  return stmt.all(userId, startOfDay(startDate, timeZone), startOfDay(end.toISOString().slice(0, 10), timeZone));
 };
\ No newline at end of file
@@ -0,0 +1,47 @@
+-- Per-user, per-UTC-day sums of meals, kept current by triggers on every
+-- insert, delete and update, so totals over long periods read one row per
+-- day instead of every meal. Missing macros count as 0. The MCP server's
+-- totals tools read it; the app's own chart buckets by the browser's local
+-- day, so it sums meal rows instead.
+CREATE TABLE IF NOT EXISTS daily_totals (
+  user_id TEXT NOT NULL,
+  day TEXT NOT NULL,
+  meals INTEGER NOT NULL,
+  calories INTEGER NOT NULL,
+  protein REAL NOT NULL,
+  carbs REAL NOT NULL,
+  fats REAL NOT NULL,
+  PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS daily_totals_insert AFTER INSERT ON meals BEGIN
+  INSERT INTO daily_totals (user_id, day, meals, calories, protein, carbs, fats)
+  VALUES (NEW.user_id, DATE(NEW.created_at), 1, NEW.calories,
+          COALESCE(NEW.protein, 0), COALESCE(NEW.carbs, 0), COALESCE(NEW.fats, 0))
+  ON CONFLICT (user_id, day) DO UPDATE SET
+    meals = meals + 1, calories = calories + excluded.calories, protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs, fats = fats + excluded.fats;
+END;
+
+CREATE TRIGGER IF NOT EXISTS daily_totals_delete AFTER DELETE ON meals BEGIN
+  UPDATE daily_totals SET
+    meals = meals - 1, calories = calories - OLD.calories, protein = protein - COALESCE(OLD.protein, 0),
+    carbs = carbs - COALESCE(OLD.carbs, 0), fats = fats - COALESCE(OLD.fats, 0)
+  WHERE user_id = OLD.user_id AND day = DATE(OLD.created_at);
+  DELETE FROM daily_totals WHERE user_id = OLD.user_id AND day = DATE(OLD.created_at) AND meals <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS daily_totals_update
+AFTER UPDATE OF user_id, calories, protein, carbs, fats, created_at ON meals BEGIN
+  UPDATE daily_totals SET
+    meals = meals - 1, calories = calories - OLD.calories, protein = protein - COALESCE(OLD.protein, 0),
+    carbs = carbs - COALESCE(OLD.carbs, 0), fats = fats - COALESCE(OLD.fats, 0)
+  WHERE user_id = OLD.user_id AND day = DATE(OLD.created_at);
+  DELETE FROM daily_totals WHERE user_id = OLD.user_id AND day = DATE(OLD.created_at) AND meals <= 0;
+  INSERT INTO daily_totals (user_id, day, meals, calories, protein, carbs, fats)
+  VALUES (NEW.user_id, DATE(NEW.created_at), 1, NEW.calories,
+          COALESCE(NEW.protein, 0), COALESCE(NEW.carbs, 0), COALESCE(NEW.fats, 0))
+  ON CONFLICT (user_id, day) DO UPDATE SET
+    meals = meals + 1, calories = calories + excluded.calories, protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs, fats = fats + excluded.fats;
+END;
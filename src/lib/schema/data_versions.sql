@@ -0,0 +1,28 @@
+-- Per-user data version, bumped by triggers on every change to the user's
+-- meals; the MCP server hands it out with tool results so clients can ask
+-- whether anything changed instead of re-fetching. A bump moves it to the
+-- current time in milliseconds, or one past its old value if that is later,
+-- so versions keep increasing even after the tables are recreated.
+CREATE TABLE IF NOT EXISTS data_versions (
+  user_id TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS data_versions_insert AFTER INSERT ON meals BEGIN
+  INSERT INTO data_versions (user_id, version)
+  VALUES (NEW.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))
+  ON CONFLICT (user_id) DO UPDATE SET version = MAX(version + 1, excluded.version);
+END;
+
+CREATE TRIGGER IF NOT EXISTS data_versions_delete AFTER DELETE ON meals BEGIN
+  INSERT INTO data_versions (user_id, version)
+  VALUES (OLD.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))
+  ON CONFLICT (user_id) DO UPDATE SET version = MAX(version + 1, excluded.version);
+END;
+
+CREATE TRIGGER IF NOT EXISTS data_versions_update AFTER UPDATE ON meals BEGIN
+  INSERT INTO data_versions (user_id, version)
+  VALUES (OLD.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
+         (NEW.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))
+  ON CONFLICT (user_id) DO UPDATE SET version = MAX(version + 1, excluded.version);
+END;
@@ -0,0 +1,4 @@
+-- Per-user date-range lookups seek this index (range on created_at within
+-- one user_id) and the totals queries are answered from it alone
+CREATE INDEX IF NOT EXISTS idx_meals_user_created
+  ON meals (user_id, created_at, calories, protein, carbs, fats);
@@ -0,0 +1,23 @@
+-- Tables of the calorie tracker database. Loaded by src/lib/db.ts (after
+-- dropping the old tables) and by the agent's tools and tests
+-- (calorie-tracker-agent/schema.py).
+
+CREATE TABLE users (
+  id TEXT PRIMARY KEY,
+  username TEXT UNIQUE NOT NULL,
+  password TEXT NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE meals (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  name TEXT NOT NULL,
+  calories INTEGER NOT NULL,
+  protein REAL,
+  carbs REAL,
+  fats REAL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  image_url TEXT,
+  FOREIGN KEY (user_id) REFERENCES users (id)
+);